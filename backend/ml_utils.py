@@ -1,18 +1,620 @@
+import atexit
+import base64
+import bisect
+import hashlib
+import importlib.util
+import io
+import json
+import mmap
+import multiprocessing
 import os
+import queue
+import random
+import re
+import socket
+import struct
+import tempfile
+import threading
+import time
+import weakref
 import numpy as np
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial, wraps
 from pathlib import Path
 
-try:
-    import tflite_runtime.interpreter as tflite
-    TFLITE_AVAILABLE = True
-except ImportError:
+import text_normalization
+
+# The TFLite runtime is only imported on first use (see load_runtime), so
+# processes that never predict don't pay for importing TensorFlow
+tflite = None
+RUNTIME_IMPORT_SECONDS = None
+_runtime_lock = threading.Lock()
+
+TFLITE_AVAILABLE = any(importlib.util.find_spec(name) is not None for name in ("tflite_runtime", "tensorflow"))
+if not TFLITE_AVAILABLE:
+    print("Warning: Neither tflite-runtime nor tensorflow is installed. Only the NumPy engine (best_model.npz) can be used.")
+
+
+def load_runtime():
+    """
+    Import tflite-runtime, falling back to TensorFlow's tf.lite
+    
+    Returns:
+        bool: True if a runtime is available
+    """
+    global tflite, TFLITE_AVAILABLE, RUNTIME_IMPORT_SECONDS
+    
+    with _runtime_lock:
+        if tflite is not None or not TFLITE_AVAILABLE:
+            return TFLITE_AVAILABLE
+        
+        started = time.perf_counter()
+        try:
+            import tflite_runtime.interpreter as runtime
+        except ImportError:
+            try:
+                import tensorflow as tf
+                runtime = tf.lite
+            except ImportError:
+                runtime = None
+        RUNTIME_IMPORT_SECONDS = time.perf_counter() - started
+        
+        if runtime is None:
+            TFLITE_AVAILABLE = False
+            print("Warning: Neither tflite-runtime nor tensorflow could be imported. Only the NumPy engine (best_model.npz) can be used.")
+        else:
+            tflite = runtime
+        
+        return TFLITE_AVAILABLE
+
+
+# Maximum number of interpreters kept per batch size
+INTERPRETER_POOL_SIZE = int(os.environ.get("ML_INTERPRETER_POOL_SIZE", min(4, os.cpu_count() or 1)))
+
+# Number of CPU threads each interpreter may use
+INTERPRETER_NUM_THREADS = int(os.environ.get("ML_INTERPRETER_NUM_THREADS", 1))
+
+# Seconds to wait for a free interpreter before giving up
+INTERPRETER_POOL_TIMEOUT = float(os.environ.get("ML_INTERPRETER_POOL_TIMEOUT", 30))
+
+# Map model files instead of copying them into each worker. Interpreters are
+# built from /proc/self/fd/<fd>, so this needs Linux; elsewhere the bytes are read.
+MODEL_MMAP = os.environ.get("ML_MODEL_MMAP", "1").lower() not in ("0", "false") and os.path.isdir("/proc/self/fd")
+
+# Use TFLite's default delegates (XNNPACK). XNNPACK repacks the weights into
+# private memory per interpreter, undoing the sharing MODEL_MMAP gives, so it
+# defaults to off when models are mapped; without it the kernels read the
+# weights from the shared mapping.
+INTERPRETER_XNNPACK = os.environ.get(
+    "ML_INTERPRETER_XNNPACK", "0" if MODEL_MMAP else "1"
+).lower() not in ("0", "false")
+
+# Coalesce concurrent predictions into batches (see PredictionCoalescer)
+COALESCE_PREDICTIONS = os.environ.get("ML_COALESCE", "1").lower() not in ("0", "false")
+
+# Seconds a batch waits for more concurrent callers, and rows that end the wait early
+COALESCE_WINDOW = float(os.environ.get("ML_COALESCE_WINDOW_MS", 5)) / 1000
+COALESCE_MAX_BATCH = int(os.environ.get("ML_COALESCE_MAX_BATCH", 256))
+
+# Inference engine: "tflite", "numpy" (a model converted with manage.py
+# convert_ml_model) or "auto" (TFLite if installed, else NumPy)
+INFERENCE_ENGINE = os.environ.get("ML_INFERENCE_ENGINE", "auto").lower()
+
+# Seconds between checks of the model file for a new version (0 disables hot reload)
+MODEL_CHECK_INTERVAL = float(os.environ.get("ML_MODEL_CHECK_INTERVAL", 30))
+
+# Number of reloads remembered for the reload status
+MODEL_RELOAD_HISTORY = 10
+
+# Unix socket of the inference server (manage.py run_inference_server). When
+# set, predictions go to the server and fall back to in-process inference.
+INFERENCE_SOCKET = os.environ.get("ML_INFERENCE_SOCKET", "")
+
+# Seconds to wait for an inference server response
+INFERENCE_TIMEOUT = float(os.environ.get("ML_INFERENCE_TIMEOUT", 10))
+
+# Seconds to predict in-process after the inference server failed
+INFERENCE_RETRY_SECONDS = float(os.environ.get("ML_INFERENCE_RETRY_SECONDS", 5))
+
+# Directory with the model registry manifest (manifest.json) and model files
+MODEL_REGISTRY_DIR = Path(os.environ.get("ML_MODEL_REGISTRY_DIR", Path(__file__).parent / 'models'))
+
+# Memory budget for loaded models; least recently used models are unloaded beyond it
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("ML_MODEL_MEMORY_BUDGET_MB", 512))
+
+# Name of the bundled best_model.tflite when there is no registry manifest
+DEFAULT_MODEL_NAME = "default"
+
+# Candidate .tflite run in shadow beside the default model ("" disables it).
+# Models in a registry manifest name their candidate with a "shadow" path.
+SHADOW_MODEL_PATH = os.environ.get("ML_SHADOW_MODEL", "")
+
+# Fraction of prediction batches also run through the shadow candidate
+SHADOW_SAMPLE_RATE = float(os.environ.get("ML_SHADOW_SAMPLE_RATE", 1.0))
+
+# Batches waiting for the shadow candidate; more are dropped, never waited for
+SHADOW_QUEUE_SIZE = int(os.environ.get("ML_SHADOW_QUEUE_SIZE", 64))
+
+
+class InterpreterPool:
+    """
+    Bounded pool of interpreters that share the same input shape
+    
+    An interpreter is not safe to use from several threads at once, so each
+    prediction checks one out, runs set_tensor/invoke/get_tensor on it and
+    checks it back in. Interpreters are created lazily, up to max_size.
+    """
+    
+    def __init__(self, factory, max_size):
+        self._factory = factory
+        self.max_size = max(1, max_size)
+        self._idle = []
+        self._created = 0
+        self._condition = threading.Condition()
+        
+        # Wait-time metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+    
+    def add(self, interpreter):
+        """Seed the pool with an interpreter that was created elsewhere"""
+        with self._condition:
+            self._created += 1
+            self._idle.append(interpreter)
+            self._condition.notify()
+    
+    def checkout(self, timeout=None):
+        """Take an idle interpreter, creating one if the pool is not full yet"""
+        started = time.perf_counter()
+        waited = False
+        
+        with self._condition:
+            while not self._idle and self._created >= self.max_size:
+                waited = True
+                remaining = None if timeout is None else timeout - (time.perf_counter() - started)
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No interpreter became available within {timeout}s")
+                self._condition.wait(remaining)
+            
+            interpreter = self._idle.pop() if self._idle else None
+            if interpreter is None:
+                self._created += 1
+            
+            wait = time.perf_counter() - started
+            self._checkouts += 1
+            self._waits += int(waited)
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        
+        if interpreter is None:
+            # Build outside the lock so other threads can keep checking in/out
+            try:
+                interpreter = self._factory()
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._condition.notify()
+                raise
+        
+        return interpreter
+    
+    def checkin(self, interpreter):
+        """Return an interpreter to the pool"""
+        with self._condition:
+            self._idle.append(interpreter)
+            self._condition.notify()
+    
+    @contextmanager
+    def lease(self, timeout=None):
+        """Context manager that checks an interpreter out and back in"""
+        interpreter = self.checkout(timeout)
+        try:
+            yield interpreter
+        finally:
+            self.checkin(interpreter)
+    
+    def get_stats(self):
+        """Get pool size and wait-time metrics"""
+        with self._condition:
+            return {
+                "max_size": self.max_size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "avg_wait_ms": self._total_wait / self._checkouts * 1000 if self._checkouts else 0.0,
+                "max_wait_ms": self._max_wait * 1000,
+            }
+
+
+class ModelSource:
+    """
+    The content of one model file, shared by every interpreter built from it
+    
+    When mapped, the file stays open and interpreters are built from
+    /proc/self/fd/<fd>: TFLite maps exactly the file that was hashed (even if
+    it is replaced later) and all workers share the same page-cache pages.
+    Otherwise the bytes are read into memory and passed as model_content.
+    """
+    
+    def __init__(self, path, use_mmap=None):
+        self.path = Path(path)
+        self.mapped = MODEL_MMAP if use_mmap is None else use_mmap
+        self.content = None
+        self.fd = os.open(self.path, os.O_RDONLY)
+        
+        try:
+            before = os.fstat(self.fd)
+            with mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ) as mapped:
+                self.version = hashlib.sha256(mapped).hexdigest()[:16]
+                if not self.mapped:
+                    self.content = mapped[:]
+            after = os.fstat(self.fd)
+            
+            # Refuse a file that is being written in place
+            if (before.st_mtime_ns, before.st_size) != (after.st_mtime_ns, after.st_size):
+                raise ValueError("Model file changed while it was being read")
+        except Exception:
+            os.close(self.fd)
+            raise
+        
+        self.mtime = after.st_mtime
+        self.size = after.st_size
+        self.file_id = (after.st_dev, after.st_ino)
+        
+        if self.mapped:
+            weakref.finalize(self, os.close, self.fd)
+        else:
+            os.close(self.fd)
+            self.fd = None
+    
+    def matches(self, stat):
+        """Check whether a stat result describes the same, unmodified file"""
+        return (stat.st_dev, stat.st_ino) == self.file_id and stat.st_mtime == self.mtime and stat.st_size == self.size
+    
+    def create_interpreter(self, num_threads):
+        """Create an (unallocated) interpreter for this model"""
+        kwargs = {"num_threads": num_threads}
+        if self.mapped:
+            kwargs["model_path"] = f"/proc/self/fd/{self.fd}"
+        else:
+            kwargs["model_content"] = self.content
+        
+        if not INTERPRETER_XNNPACK:
+            kwargs["experimental_op_resolver_type"] = _op_resolver_types().BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        
+        return tflite.Interpreter(**kwargs)
+    
+    def get_memory_stats(self, smaps=None):
+        """
+        Get how much of the model file is resident in this process
+        
+        Args:
+            smaps: Output of read_smaps_by_file(), to avoid re-reading it per model
+        """
+        stats = {"mapped": self.mapped, "file_mb": self.size / (1024 * 1024)}
+        if self.mapped:
+            smaps = read_smaps_by_file() if smaps is None else smaps
+            resident = smaps.get(self.file_id, {})
+            for field in ("rss", "pss", "shared", "private"):
+                stats[f"{field}_mb"] = resident.get(field, 0) / 1024
+        else:
+            # The bytes live on this worker's heap (shared only if read before fork)
+            stats["heap_mb"] = self.size / (1024 * 1024)
+        return stats
+
+
+def _op_resolver_types():
+    """Get OpResolverType from tflite-runtime or tf.lite"""
+    return getattr(tflite, 'OpResolverType', None) or tflite.experimental.OpResolverType
+
+
+def read_smaps_by_file():
+    """
+    Sum this process's resident memory per mapped file from /proc/self/smaps
+    
+    Returns:
+        dict: (st_dev, st_ino) -> {'rss', 'pss', 'shared', 'private'} in kB
+        (empty where /proc is not available)
+    """
+    totals = {}
+    current = None
     try:
-        import tensorflow as tf
-        tflite = tf.lite
-        TFLITE_AVAILABLE = True
-    except ImportError:
-        TFLITE_AVAILABLE = False
-        print("Warning: Neither tflite-runtime nor tensorflow is installed. ML functionality will be disabled.")
+        with open('/proc/self/smaps', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                if not fields[0].endswith(':'):
+                    # Mapping header: address perms offset dev inode [path]
+                    major, minor = (int(part, 16) for part in fields[3].split(':'))
+                    inode = int(fields[4])
+                    current = totals.setdefault((os.makedev(major, minor), inode), {"rss": 0, "pss": 0, "shared": 0, "private": 0}) if inode else None
+                elif current is not None:
+                    key = fields[0][:-1]
+                    if key == 'Rss':
+                        current["rss"] += int(fields[1])
+                    elif key == 'Pss':
+                        current["pss"] += int(fields[1])
+                    elif key.startswith('Shared_'):
+                        current["shared"] += int(fields[1])
+                    elif key.startswith('Private_'):
+                        current["private"] += int(fields[1])
+    except (OSError, ValueError, IndexError):
+        return {}
+    return totals
+
+
+def get_process_memory():
+    """Get this worker's resident memory from /proc/self/status, in MB"""
+    memory = {"pid": os.getpid()}
+    fields = {"VmRSS": "rss_mb", "RssAnon": "rss_anon_mb", "RssFile": "rss_file_mb", "RssShmem": "rss_shmem_mb"}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in fields:
+                    memory[fields[key]] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+        # Peak rather than current RSS; kB on Linux, bytes on macOS
+        memory["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return memory
+
+
+class LoadedModel:
+    """
+    One loaded version of the model: its source file, tensor details and interpreter pools
+    
+    A hot reload builds a new LoadedModel next to the active one and swaps the
+    reference, so predictions that are already running finish on the old version.
+    """
+    
+    engine = "tflite"
+    
+    # Interpreters have a fixed batch size, so smaller batches are padded
+    pads_batches = True
+    
+    def __init__(self, source, pool_size, num_threads):
+        self.source = source
+        self.version = source.version
+        self.loaded_at = datetime.now(timezone.utc)
+        self.pool_size = pool_size
+        self.num_threads = num_threads
+        self.xnnpack = INTERPRETER_XNNPACK
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        self._interpreter_bytes = {}
+        
+        # Create interpreter
+        self.interpreter = source.create_interpreter(num_threads)
+        self.interpreter.allocate_tensors()
+        
+        # Get input and output details
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+        
+        # The default interpreter seeds the pool for single-row predictions
+        batch_size = int(self.input_details[0]['shape'][0])
+        self._interpreter_bytes[batch_size] = self._tensor_bytes(self.interpreter)
+        self._get_pool(batch_size).add(self.interpreter)
+    
+    @staticmethod
+    def _tensor_bytes(interpreter):
+        """Estimate the memory held by an interpreter's tensors"""
+        return int(sum(
+            np.prod(tensor['shape']) * np.dtype(tensor['dtype']).itemsize
+            for tensor in interpreter.get_tensor_details()
+        ))
+    
+    @property
+    def mtime(self):
+        return self.source.mtime
+    
+    def _created_interpreters(self):
+        """Get the number of interpreters created per batch size"""
+        with self._pools_lock:
+            pools = dict(self._pools)
+        return {batch_size: pool.get_stats()['created'] for batch_size, pool in pools.items()}
+    
+    def tensor_bytes(self):
+        """Estimate the memory held by the tensors of every pooled interpreter"""
+        return sum(
+            created * self._interpreter_bytes.get(batch_size, 0)
+            for batch_size, created in self._created_interpreters().items()
+        )
+    
+    def xnnpack_bytes(self):
+        """Estimate the private copies of the weights XNNPACK makes, one per interpreter"""
+        if not self.xnnpack:
+            return 0
+        return sum(self._created_interpreters().values()) * self.source.size
+    
+    def memory_bytes(self):
+        """Estimate the memory used by this version: model file plus every pooled interpreter"""
+        return self.source.size + self.tensor_bytes() + self.xnnpack_bytes()
+    
+    def get_memory_stats(self, smaps=None):
+        """Get the resident size of the model file and the estimated interpreter memory in this worker"""
+        stats = self.source.get_memory_stats(smaps)
+        stats["estimated_tensor_mb"] = self.tensor_bytes() / (1024 * 1024)
+        stats["xnnpack"] = self.xnnpack
+        stats["estimated_xnnpack_mb"] = self.xnnpack_bytes() / (1024 * 1024)
+        return stats
+    
+    def _create_interpreter(self, batch_size):
+        """Create an interpreter whose input tensor is resized to batch_size"""
+        interpreter = self.source.create_interpreter(self.num_threads)
+        input_shape = list(self.input_details[0]['shape'])
+        input_shape[0] = batch_size
+        interpreter.resize_tensor_input(self.input_details[0]['index'], input_shape)
+        interpreter.allocate_tensors()
+        self._interpreter_bytes.setdefault(batch_size, self._tensor_bytes(interpreter))
+        return interpreter
+    
+    def _get_pool(self, batch_size):
+        """Get (or create) the interpreter pool for batch_size"""
+        with self._pools_lock:
+            pool = self._pools.get(batch_size)
+            if pool is None:
+                pool = InterpreterPool(partial(self._create_interpreter, batch_size), self.pool_size)
+                self._pools[batch_size] = pool
+            return pool
+    
+    def get_pool_stats(self):
+        """Get wait-time metrics for every interpreter pool, keyed by batch size"""
+        with self._pools_lock:
+            pools = dict(self._pools)
+        return {str(batch_size): pool.get_stats() for batch_size, pool in sorted(pools.items())}
+    
+    def invoke(self, batch):
+        """Run a batch whose size matches one of the interpreter pools"""
+        with self._get_pool(batch.shape[0]).lease(INTERPRETER_POOL_TIMEOUT) as interpreter:
+            interpreter.set_tensor(self.input_details[0]['index'], batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(self.output_details[0]['index'])
+
+
+# Version of the .npz layout written by convert_tflite_to_numpy
+NUMPY_MODEL_FORMAT = 1
+
+# Fused activations of FULLY_CONNECTED ops, and standalone activation ops
+NUMPY_ACTIVATIONS = {
+    "NONE": lambda x: x,
+    "RELU": lambda x: np.maximum(x, 0),
+    "RELU6": lambda x: np.clip(x, 0, 6),
+    "RELU_N1_TO_1": lambda x: np.clip(x, -1, 1),
+    "TANH": np.tanh,
+    "LOGISTIC": lambda x: 1 / (1 + np.exp(-x)),
+}
+
+
+def _numpy_fully_connected(op, inputs):
+    x, weights, bias = (inputs + [None])[:3]
+    output = x.reshape(-1, weights.shape[1]) @ weights.T
+    if bias is not None:
+        output += bias
+    return NUMPY_ACTIVATIONS[op.get("activation", "NONE")](output)
+
+
+def _numpy_softmax(op, inputs):
+    x = inputs[0] * op.get("beta", 1.0)
+    exp_x = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return exp_x / np.sum(exp_x, axis=-1, keepdims=True)
+
+
+def _numpy_reshape(op, inputs):
+    # Keep the batch dimension, which the converted graph only knows as 1
+    return inputs[0].reshape((inputs[0].shape[0],) + tuple(op["shape"][1:]))
+
+
+# Op implementations of the NumPy engine: (op, input arrays) -> output array
+NUMPY_OPS = {
+    "FULLY_CONNECTED": _numpy_fully_connected,
+    "SOFTMAX": _numpy_softmax,
+    "RESHAPE": _numpy_reshape,
+    "ADD": lambda op, inputs: NUMPY_ACTIVATIONS[op.get("activation", "NONE")](inputs[0] + inputs[1]),
+    "MUL": lambda op, inputs: NUMPY_ACTIVATIONS[op.get("activation", "NONE")](inputs[0] * inputs[1]),
+    **{name: (lambda activation: lambda op, inputs: activation(inputs[0]))(activation)
+       for name, activation in NUMPY_ACTIVATIONS.items() if name != "NONE"},
+}
+
+
+class NumpyModel:
+    """
+    One loaded version of a model converted to .npz, run as a vectorized NumPy forward pass
+    
+    Used when neither tflite-runtime nor tensorflow is installed; exposes the
+    same interface as LoadedModel. Any batch size runs in one call, so
+    batches are not padded.
+    
+    The version is that of the .tflite model it was converted from, so both
+    engines label predictions of the same model alike.
+    """
+    
+    engine = "numpy"
+    pads_batches = False
+    interpreter = None
+    
+    def __init__(self, source, tflite_path=None):
+        """
+        Args:
+            source: ModelSource of the .npz file
+            tflite_path: The .tflite model it should have been converted from; if
+                that file exists and has other content, the .npz is refused as stale
+        """
+        self.source = source
+        self.loaded_at = datetime.now(timezone.utc)
+        
+        with np.load(io.BytesIO(source.content), allow_pickle=False) as archive:
+            graph = json.loads(str(archive['graph']))
+            self.constants = {
+                int(name[1:]): archive[name]
+                for name in archive.files if name.startswith('t')
+            }
+        
+        if graph.get('format_version') != NUMPY_MODEL_FORMAT:
+            raise ValueError(f"Unsupported NumPy model format: {graph.get('format_version')}")
+        
+        self.version = graph['source_version']
+        if tflite_path is not None and Path(tflite_path).exists():
+            current = ModelSource(tflite_path, use_mmap=False).version
+            if current != self.version:
+                raise ValueError(
+                    f"{source.path.name} was converted from version {self.version} of the model, "
+                    f"but {Path(tflite_path).name} is version {current}: run convert_ml_model again"
+                )
+        unsupported = sorted({op['op'] for op in graph['ops']} - set(NUMPY_OPS))
+        if unsupported:
+            raise ValueError(f"Ops not supported by the NumPy engine: {', '.join(unsupported)}")
+        
+        self.ops = graph['ops']
+        self.input_details = [self._tensor_details(graph['input'])]
+        self.output_details = [self._tensor_details(graph['output'])]
+    
+    @staticmethod
+    def _tensor_details(tensor):
+        return {
+            "name": tensor['name'],
+            "index": tensor['index'],
+            "shape": np.array(tensor['shape'], dtype=np.int32),
+            "dtype": np.dtype(tensor['dtype']).type,
+        }
+    
+    @property
+    def mtime(self):
+        return self.source.mtime
+    
+    def invoke(self, batch):
+        """Run the forward pass over a whole batch"""
+        values = dict(self.constants)
+        values[self.input_details[0]['index']] = batch
+        for op in self.ops:
+            inputs = [values[index] if index >= 0 else None for index in op['inputs']]
+            values[op['outputs'][0]] = NUMPY_OPS[op['op']](op, inputs)
+        output = values[self.output_details[0]['index']]
+        return output.astype(self.output_details[0]['dtype'], copy=False)
+    
+    def get_pool_stats(self):
+        return {}
+    
+    def tensor_bytes(self):
+        return sum(array.nbytes for array in self.constants.values())
+    
+    def memory_bytes(self):
+        return self.source.size + self.tensor_bytes()
+    
+    def get_memory_stats(self, smaps=None):
+        stats = self.source.get_memory_stats(smaps)
+        stats["estimated_tensor_mb"] = self.tensor_bytes() / (1024 * 1024)
+        return stats
 
 
 class MLModelManager:
@@ -37,37 +639,119 @@ class MLModelManager:
         "Others"
     ]
     
-    def __init__(self):
+    # Batch sizes for which a resized interpreter is cached. Smaller batches
+    # are padded up to the nearest size, larger ones are split into chunks
+    # of the biggest size.
+    BATCH_SIZES = (1, 8, 32, 128, 512)
+    
+    def __init__(self, pool_size=None, num_threads=None, model_path=None):
         self.model = None
-        self.interpreter = None
-        self.input_details = None
-        self.output_details = None
-        self.model_loaded = False
+        self.load_seconds = None
+        self._active = None
+        self._load_attempted = False
+        self._load_lock = threading.Lock()
+        
+        # Hot reload state
+        self.reloading = False
+        self.reload_history = deque(maxlen=MODEL_RELOAD_HISTORY)
+        self._reload_lock = threading.Lock()
+        self._next_update_check = 0.0
+        
+        # Interpreter pool settings, applied to every model version
+        self.pool_size = pool_size or INTERPRETER_POOL_SIZE
+        self.num_threads = num_threads or INTERPRETER_NUM_THREADS
         
-        # Get the path to the model file
-        self.model_path = Path(__file__).parent / 'best_model.tflite'
+        # Get the path to the model file, and its conversion for the NumPy engine
+        self.model_path = Path(model_path) if model_path else Path(__file__).parent / 'best_model.tflite'
+        self.numpy_model_path = self.model_path.with_suffix('.npz')
         
-        # Load the model on initialization
-        if TFLITE_AVAILABLE:
-            self.load_model()
+        # Candidate model compared against this one in the background (see set_shadow_model)
+        self.shadow = None
+    
+    # Attributes of the active model version
+    
+    @property
+    def model_loaded(self):
+        return self._active is not None
+    
+    @property
+    def interpreter(self):
+        return self._active.interpreter if self._active else None
+    
+    @property
+    def input_details(self):
+        return self._active.input_details if self._active else None
+    
+    @property
+    def output_details(self):
+        return self._active.output_details if self._active else None
+    
+    @property
+    def model_version(self):
+        return self._active.version if self._active else None
+    
+    def ensure_loaded(self):
+        """
+        Load the model on first use
+        
+        Only the first call attempts the load; call load_model() directly to retry.
+        Once loaded, the model file is periodically checked for a new version.
+        
+        Returns:
+            bool: True if the model is loaded
+        """
+        if not self._load_attempted:
+            with self._load_lock:
+                if not self._load_attempted:
+                    self.load_model()
+                    self._load_attempted = True
+        elif self._active is not None:
+            self._maybe_check_for_update()
+        return self.model_loaded
+    
+    def _select_engine(self):
+        """
+        Pick the inference engine: TFLite, or NumPy when a converted .npz model exists
+        
+        Returns:
+            str: "tflite", "numpy", or None if neither can be used
+        """
+        if INFERENCE_ENGINE in ("auto", "tflite") and load_runtime():
+            return "tflite"
+        if INFERENCE_ENGINE in ("auto", "numpy") and self.numpy_model_path.exists():
+            return "numpy"
+        return None
+    
+    def _open_source(self, engine):
+        """Open the model file used by an engine"""
+        if engine == "numpy":
+            return ModelSource(self.numpy_model_path, use_mmap=False)
+        return ModelSource(self.model_path)
+    
+    def _create_model(self, engine, source):
+        """Build a loaded model version for an engine"""
+        if engine == "numpy":
+            return NumpyModel(source, self.model_path)
+        return LoadedModel(source, self.pool_size, self.num_threads)
     
     def load_model(self):
-        """Load the TensorFlow Lite model"""
+        """Load the TensorFlow Lite model (or its NumPy conversion)"""
         try:
-            if not self.model_path.exists():
-                print(f"Model file not found at: {self.model_path}")
+            engine = self._select_engine()
+            if engine is None:
                 return False
             
-            # Create interpreter
-            self.interpreter = tflite.Interpreter(model_path=str(self.model_path))
-            self.interpreter.allocate_tensors()
+            started = time.perf_counter()
+            
+            source_path = self.numpy_model_path if engine == "numpy" else self.model_path
+            if not source_path.exists():
+                print(f"Model file not found at: {source_path}")
+                return False
             
-            # Get input and output details
-            self.input_details = self.interpreter.get_input_details()
-            self.output_details = self.interpreter.get_output_details()
+            self._active = self._create_model(engine, self._open_source(engine))
             
-            self.model_loaded = True
-            print(f"Model loaded successfully from: {self.model_path}")
+            self.load_seconds = time.perf_counter() - started
+            print(f"Model loaded successfully from: {source_path} ({engine} engine)")
             print(f"Input shape: {self.input_details[0]['shape']}")
             print(f"Output shape: {self.output_details[0]['shape']}")
             
@@ -75,56 +759,245 @@ class MLModelManager:
             
         except Exception as e:
             print(f"Error loading model: {e}")
-            self.model_loaded = False
             return False
     
+    def unload(self):
+        """
+        Drop the active model version; the next prediction loads it again
+        
+        Predictions already running keep their reference and finish normally.
+        """
+        with self._load_lock:
+            self._active = None
+            self._load_attempted = False
+        if self.shadow is not None:
+            self.shadow.candidate.unload()
+    
+    def memory_bytes(self):
+        """Estimate the memory used by the active model version (and its shadow candidate)"""
+        model = self._active
+        total = model.memory_bytes() if model else 0
+        if self.shadow is not None:
+            total += self.shadow.candidate.memory_bytes()
+        return total
+    
+    def set_shadow_model(self, model_path, sample_rate=None):
+        """
+        Run a candidate model in shadow on the batches this model predicts
+        
+        The candidate is loaded and run by a background thread; its results
+        are only compared with this model's (see get_shadow_stats), never
+        returned to callers.
+        
+        Args:
+            model_path: Candidate .tflite file, or None to stop shadowing
+            sample_rate: Fraction of batches to compare (defaults to ML_SHADOW_SAMPLE_RATE)
+        """
+        previous = self.shadow
+        self.shadow = ShadowEvaluator(model_path, sample_rate) if model_path else None
+        if previous is not None:
+            previous.close()
+    
+    def get_shadow_stats(self):
+        """Get the agreement, confidence and latency comparison with the shadow candidate"""
+        return self.shadow.get_stats() if self.shadow is not None else None
+    
+    def reload_model(self, wait=True):
+        """
+        Load the model file again and swap it in if its content changed
+        
+        The new version is built and warmed up while the active one keeps
+        serving, then swapped in atomically. If the new file cannot be loaded
+        the active version stays in place.
+        
+        Args:
+            wait: If False, reload in a background thread and return immediately
+            
+        Returns:
+            dict: Outcome of the reload ('reloaded', 'unchanged', 'failed'), or
+            'started'/'in_progress' when not waiting
+        """
+        if not wait:
+            if self.reloading:
+                return {"status": "in_progress"}
+            threading.Thread(target=self.reload_model, name='ml-model-reload', daemon=True).start()
+            return {"status": "started"}
+        
+        if not self._reload_lock.acquire(blocking=False):
+            return {"status": "in_progress"}
+        
+        self.reloading = True
+        started = time.perf_counter()
+        previous = self._active
+        entry = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "previous_version": previous.version if previous else None,
+        }
+        
+        try:
+            engine = self._select_engine()
+            if engine is None:
+                raise ValueError("No inference engine available: install tflite-runtime or run convert_ml_model")
+            
+            source = self._open_source(engine)
+            
+            if previous is not None and source.version == previous.source.version:
+                # Same content (e.g. touched or copied back): keep the loaded
+                # version but track the new file so it is not checked again
+                previous.source = source
+                entry.update(status="unchanged", version=source.version)
+            else:
+                model = self._create_model(engine, source)
+                self._warm_up_model(model)
+                self._active = model
+                self._load_attempted = True
+                entry.update(status="reloaded", version=model.version)
+                print(f"Model reloaded from: {self.model_path} (version {model.version})")
+        
+        except Exception as e:
+            entry.update(status="failed", error=str(e))
+            print(f"Error reloading model: {e}")
+        
+        finally:
+            entry["duration_seconds"] = time.perf_counter() - started
+            self.reload_history.append(entry)
+            self.reloading = False
+            self._reload_lock.release()
+        
+        return entry
+    
+    def check_for_update(self):
+        """
+        Start a background reload if the model file was replaced or modified
+        
+        Returns:
+            bool: True if a reload was started
+        """
+        model = self._active
+        try:
+            stat = (model.source.path if model else self.model_path).stat()
+        except OSError:
+            return False
+        
+        if model is not None and model.source.matches(stat):
+            return False
+        
+        self.reload_model(wait=False)
+        return True
+    
+    def _maybe_check_for_update(self):
+        """Check the model file at most once every MODEL_CHECK_INTERVAL seconds"""
+        now = time.monotonic()
+        if MODEL_CHECK_INTERVAL > 0 and now >= self._next_update_check:
+            self._next_update_check = now + MODEL_CHECK_INTERVAL
+            self.check_for_update()
+    
+    def get_memory_stats(self, smaps=None):
+        """Get this worker's memory attributable to the active model version"""
+        model = self._active
+        return model.get_memory_stats(smaps) if model else None
+    
+    def get_reload_status(self):
+        """Get the active model version and recent reloads"""
+        model = self._active
+        return {
+            "model_version": model.version if model else None,
+            "model_mtime": datetime.fromtimestamp(model.mtime, timezone.utc).isoformat() if model else None,
+            "loaded_at": model.loaded_at.isoformat() if model else None,
+            "reloading": self.reloading,
+            "check_interval_seconds": MODEL_CHECK_INTERVAL,
+            "history": list(reversed(self.reload_history)),
+        }
+    
     def get_model_info(self):
         """Get information about the loaded model"""
-        if not self.model_loaded:
+        if not self.ensure_loaded():
             return {"error": "Model not loaded"}
         
+        model = self._active
+        return {
+            "model_path": str(model.source.path),
+            "engine": model.engine,
+            "model_version": model.version,
+            "loaded_at": model.loaded_at.isoformat(),
+            "input_details": model.input_details,
+            "output_details": model.output_details,
+            "input_shape": model.input_details[0]['shape'].tolist(),
+            "output_shape": model.output_details[0]['shape'].tolist(),
+            "input_dtype": str(model.input_details[0]['dtype']),
+            "output_dtype": str(model.output_details[0]['dtype'])
+        }
+    
+    def get_pool_stats(self):
+        """Get wait-time metrics for every interpreter pool of the active model, keyed by batch size"""
         return {
-            "model_path": str(self.model_path),
-            "input_details": self.input_details,
-            "output_details": self.output_details,
-            "input_shape": self.input_details[0]['shape'].tolist(),
-            "output_shape": self.output_details[0]['shape'].tolist(),
-            "input_dtype": str(self.input_details[0]['dtype']),
-            "output_dtype": str(self.output_details[0]['dtype'])
+            "pool_size": self.pool_size,
+            "num_threads": self.num_threads,
+            "pools": self._active.get_pool_stats() if self._active else {},
         }
     
+    def _batch_size_for(self, rows):
+        """Pick the smallest cached batch size that fits the given number of rows"""
+        for batch_size in self.BATCH_SIZES:
+            if rows <= batch_size:
+                return batch_size
+        return self.BATCH_SIZES[-1]
+    
+    def _invoke_batch(self, model, batch):
+        """Run one batch (at most the largest batch size) through the model"""
+        rows = batch.shape[0]
+        batch_size = self._batch_size_for(rows)
+        
+        # Pad up to the interpreter's batch size; padded rows are discarded
+        if model.pads_batches and rows < batch_size:
+            padded = np.zeros((batch_size,) + batch.shape[1:], dtype=batch.dtype)
+            padded[:rows] = batch
+            batch = padded
+        
+        return model.invoke(batch)[:rows]
+    
+    def _predict_with(self, model, input_data):
+        """Run input_data through one specific model version"""
+        input_data = np.asarray(input_data)
+        
+        # Handle a single row without the batch dimension
+        if input_data.ndim == len(model.input_details[0]['shape']) - 1:
+            input_data = np.expand_dims(input_data, axis=0)
+        input_data = np.ascontiguousarray(input_data, dtype=model.input_details[0]['dtype'])
+        
+        max_batch = self.BATCH_SIZES[-1]
+        outputs = [
+            self._invoke_batch(model, input_data[start:start + max_batch])
+            for start in range(0, input_data.shape[0], max_batch)
+        ]
+        
+        if not outputs:
+            output_width = model.output_details[0]['shape'][-1]
+            return np.zeros((0, output_width), dtype=model.output_details[0]['dtype'])
+        
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs, axis=0)
+    
+    def _warm_up_model(self, model):
+        """Run a prediction through every cached batch size of a model version"""
+        feature_count = model.input_details[0]['shape'][-1]
+        for batch_size in self.BATCH_SIZES:
+            self._predict_with(model, np.zeros((batch_size, feature_count), dtype=np.float32))
+    
     def predict(self, input_data):
-        """Make predictions using the loaded model"""
-        if not self.model_loaded:
+        """
+        Make predictions using the loaded model
+        
+        Args:
+            input_data: A single feature row (544,) or a feature matrix (N, 544)
+            
+        Returns:
+            np.ndarray: Raw model output of shape (N, 15)
+        """
+        if not self.ensure_loaded():
             raise ValueError("Model not loaded. Cannot make predictions.")
         
         try:
-            # Convert input data to numpy array if needed
-            if not isinstance(input_data, np.ndarray):
-                input_data = np.array(input_data)
-            
-            # Ensure input data matches expected shape and dtype
-            expected_shape = self.input_details[0]['shape']
-            expected_dtype = self.input_details[0]['dtype']
-            
-            # Reshape if needed (handle batch dimension)
-            if len(input_data.shape) == len(expected_shape) - 1:
-                input_data = np.expand_dims(input_data, axis=0)
-            
-            # Convert dtype if needed
-            input_data = input_data.astype(expected_dtype)
-            
-            # Set input tensor
-            self.interpreter.set_tensor(self.input_details[0]['index'], input_data)
-            
-            # Run inference
-            self.interpreter.invoke()
-            
-            # Get output
-            output_data = self.interpreter.get_tensor(self.output_details[0]['index'])
-            
-            return output_data
-            
+            return self._predict_with(self._active, input_data)
         except Exception as e:
             raise ValueError(f"Error during prediction: {e}")
     
@@ -133,107 +1006,1655 @@ class MLModelManager:
         Predict incident category with human-readable output
         
         Args:
-            input_data: Input features (544 features expected)
+            input_data: Input features, either a single row (544,) or a batch (N, 544)
             return_probabilities: If True, returns all probabilities for each category
             
         Returns:
-            dict: Contains predicted category, confidence, and optionally all probabilities
+            dict for a single row, list of dicts for a batch: Contains predicted
+            category, confidence, the model version, and optionally all probabilities
         """
-        if not self.model_loaded:
+        if not self.ensure_loaded():
             raise ValueError("Model not loaded. Cannot make predictions.")
         
-        # Get raw predictions
-        raw_output = self.predict(input_data)
+        # Use one model version for the whole batch, even if a reload swaps it meanwhile
+        model = self._active
+        input_data = np.asarray(input_data)
+        is_batch = input_data.ndim == len(model.input_details[0]['shape'])
+        
+        # Get raw predictions and apply softmax across the whole batch
+        started = time.perf_counter()
+        try:
+            raw_output = self._predict_with(model, input_data)
+        except Exception as e:
+            raise ValueError(f"Error during prediction: {e}")
+        probabilities = self._softmax(raw_output)
         
-        # Apply softmax to get probabilities
-        probabilities = self._softmax(raw_output[0])
+        # Get predicted class indices
+        predicted_indices = np.argmax(probabilities, axis=1)
+        confidences = probabilities[np.arange(len(predicted_indices)), predicted_indices]
         
-        # Get predicted class index
-        predicted_index = np.argmax(probabilities)
-        predicted_category = self.INCIDENT_CATEGORIES[predicted_index]
-        confidence = probabilities[predicted_index]
+        # Hand the batch to the shadow candidate; this only queues it
+        if self.shadow is not None:
+            self.shadow.submit(input_data, predicted_indices, confidences, time.perf_counter() - started, model.version)
         
-        result = {
-            'predicted_category': predicted_category,
-            'predicted_index': int(predicted_index),
-            'confidence': float(confidence),
-            'confidence_percentage': f"{confidence * 100:.2f}%"
-        }
+        # Sort by probability for easier reading (stable, so ties keep category order)
+        top_indices = np.argsort(-probabilities, axis=1, kind='stable')[:, :5] if return_probabilities else None
         
-        if return_probabilities:
-            result['all_probabilities'] = {
-                category: float(prob) 
-                for category, prob in zip(self.INCIDENT_CATEGORIES, probabilities)
+        results = []
+        for row, (predicted_index, confidence) in enumerate(zip(predicted_indices, confidences)):
+            result = {
+                'predicted_category': self.INCIDENT_CATEGORIES[predicted_index],
+                'predicted_index': int(predicted_index),
+                'confidence': float(confidence),
+                'confidence_percentage': f"{confidence * 100:.2f}%",
+                'model_version': model.version
             }
-            # Sort by probability for easier reading
-            result['top_5_predictions'] = sorted(
-                [(cat, float(prob)) for cat, prob in zip(self.INCIDENT_CATEGORIES, probabilities)],
-                key=lambda x: x[1], 
-                reverse=True
-            )[:5]
+            
+            if return_probabilities:
+                result['all_probabilities'] = {
+                    category: float(prob)
+                    for category, prob in zip(self.INCIDENT_CATEGORIES, probabilities[row])
+                }
+                result['top_5_predictions'] = [
+                    (self.INCIDENT_CATEGORIES[index], float(probabilities[row, index]))
+                    for index in top_indices[row]
+                ]
+            
+            results.append(result)
         
-        return result
+        return results if is_batch else results[0]
     
     def _softmax(self, x):
-        """Apply softmax activation function"""
-        exp_x = np.exp(x - np.max(x))  # Subtract max for numerical stability
-        return exp_x / np.sum(exp_x)
+        """Apply softmax activation function along the last axis"""
+        exp_x = np.exp(x - np.max(x, axis=-1, keepdims=True))  # Subtract max for numerical stability
+        return exp_x / np.sum(exp_x, axis=-1, keepdims=True)
     
     def get_categories_list(self):
         """Get the list of all possible incident categories"""
         return self.INCIDENT_CATEGORIES.copy()
     
     def is_ready(self):
-        """Check if the model is loaded and ready for predictions"""
-        return self.model_loaded and TFLITE_AVAILABLE
+        """Check if the model is loaded and ready for predictions (loads it if needed)"""
+        return self.ensure_loaded()
+    
+    def warm_up(self):
+        """Load the model and run a prediction through every cached batch size"""
+        if not self.ensure_loaded():
+            return False
+        
+        self._warm_up_model(self._active)
+        return True
 
 
-# Global model manager instance
-ml_model = MLModelManager()
+# Pipeline metrics
 
+# Directory where each worker writes its metrics so any worker can report
+# totals for the whole host (like Prometheus' multiprocess mode)
+METRICS_DIR = Path(os.environ.get("ML_METRICS_DIR", Path(tempfile.gettempdir()) / "reportit-ml-metrics"))
 
-def get_model_manager():
-    """Get the global model manager instance"""
-    return ml_model
+# Seconds between writes of a worker's metrics file
+METRICS_FLUSH_SECONDS = float(os.environ.get("ML_METRICS_FLUSH_SECONDS", 10))
 
+# Metrics files not updated for this many seconds (exited workers) are ignored
+METRICS_MAX_AGE = float(os.environ.get("ML_METRICS_MAX_AGE", 24 * 3600))
 
-def make_prediction(input_data):
-    """Convenience function to make predictions (returns raw output)"""
-    return ml_model.predict(input_data)
+# Upper bounds (seconds) of the latency buckets: 10us to ~70s in steps of 1.5x
+LATENCY_BUCKETS = tuple(1e-5 * 1.5 ** k for k in range(39))
 
 
-def predict_incident_category(input_data, return_probabilities=False):
+def latency_percentile(counts, total, quantile):
     """
-    Convenience function to predict incident category with human-readable output
+    Estimate a latency percentile from bucket counts, interpolating within the bucket
     
-    Args:
-        input_data: Input features (544 features expected)
-        return_probabilities: If True, returns all probabilities for each category
-        
     Returns:
-        dict: Contains predicted category, confidence, and optionally all probabilities
+        float: Seconds (0.0 when nothing was observed)
     """
-    return ml_model.predict_incident_category(input_data, return_probabilities)
+    if not total:
+        return 0.0
+    rank = quantile * total
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+            upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return LATENCY_BUCKETS[-1]
 
 
-def get_incident_categories():
-    """Get list of all possible incident categories"""
+class PipelineMetrics:
+    """
+    Per-stage latency histograms and event counters for the ML pipeline
+    
+    Recording is an in-memory bucket increment. Every flush_seconds the worker
+    writes its totals to <directory>/<host>-<pid>.json; collect() merges the
+    files of all workers on the host.
+    """
+    
+    def __init__(self, directory=None, flush_seconds=None):
+        self.directory = Path(directory or METRICS_DIR)
+        self.flush_seconds = METRICS_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self._lock = threading.Lock()
+        self._reset()
+    
+    def _reset(self):
+        self._pid = os.getpid()
+        self._stages = {}
+        self._counters = Counter()
+        self._next_flush = time.monotonic() + self.flush_seconds
+    
+    def _check_fork(self):
+        # A forked worker starts from zero; the parent's totals are in the parent's file
+        if os.getpid() != self._pid:
+            self._reset()
+    
+    def observe(self, stage, seconds):
+        """Record how long one run of a stage took"""
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self._check_fork()
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = {"counts": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+            histogram["counts"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+            flush = time.monotonic() >= self._next_flush
+        if flush:
+            self.flush()
+    
+    def increment(self, name, amount=1):
+        """Add to an event counter"""
+        with self._lock:
+            self._check_fork()
+            self._counters[name] += amount
+    
+    @contextmanager
+    def time(self, stage):
+        """Context manager recording the duration of a stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+    
+    def timed(self, stage):
+        """Decorator recording the duration of every call as a stage"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def snapshot(self):
+        """Get this worker's totals"""
+        with self._lock:
+            self._check_fork()
+            return {
+                "stages": {
+                    stage: {"counts": list(histogram["counts"]), "sum": histogram["sum"], "count": histogram["count"]}
+                    for stage, histogram in self._stages.items()
+                },
+                "counters": dict(self._counters),
+            }
+    
+    def _path(self):
+        return self.directory / f"{socket.gethostname()}-{os.getpid()}.json"
+    
+    def flush(self):
+        """Write this worker's totals to its metrics file"""
+        with self._lock:
+            self._next_flush = time.monotonic() + self.flush_seconds
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._path()
+            temp_path = path.with_name(path.name + '.tmp')
+            temp_path.write_text(json.dumps(self.snapshot()))
+            temp_path.replace(path)
+        except OSError as e:
+            print(f"Could not write ML metrics: {e}")
+    
+    def collect(self):
+        """
+        Merge the totals of every worker on the host
+        
+        Returns:
+            dict: {'workers', 'stages': {stage: {counts, sum, count}}, 'counters'}
+        """
+        self.flush()
+        snapshots = []
+        cutoff = time.time() - METRICS_MAX_AGE
+        try:
+            paths = [path for path in self.directory.glob('*.json') if path.stat().st_mtime >= cutoff]
+        except OSError:
+            paths = []
+        for path in paths:
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        if not paths:
+            snapshots.append(self.snapshot())
+        
+        stages = {}
+        counters = Counter()
+        for snapshot in snapshots:
+            for stage, histogram in snapshot.get('stages', {}).items():
+                merged = stages.setdefault(stage, {"counts": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0})
+                merged["counts"] = [a + b for a, b in zip(merged["counts"], histogram["counts"])]
+                merged["sum"] += histogram["sum"]
+                merged["count"] += histogram["count"]
+            counters.update(snapshot.get('counters', {}))
+        
+        return {"workers": len(snapshots), "stages": stages, "counters": dict(counters)}
+    
+    def summarize(self, collected=None):
+        """Get p50/p95/p99 and mean latency per stage (in ms) and the counters"""
+        collected = collected or self.collect()
+        stages = {}
+        for stage, histogram in sorted(collected["stages"].items()):
+            count = histogram["count"]
+            stages[stage] = {
+                "count": count,
+                "mean_ms": histogram["sum"] / count * 1000 if count else 0.0,
+                "p50_ms": latency_percentile(histogram["counts"], count, 0.50) * 1000,
+                "p95_ms": latency_percentile(histogram["counts"], count, 0.95) * 1000,
+                "p99_ms": latency_percentile(histogram["counts"], count, 0.99) * 1000,
+            }
+        return {"workers": collected["workers"], "stages": stages, "counters": collected["counters"]}
+    
+    def render_prometheus(self, collected=None):
+        """Render the merged metrics in the Prometheus text exposition format"""
+        collected = collected or self.collect()
+        lines = [
+            "# HELP reportit_ml_stage_seconds Latency of ML pipeline stages",
+            "# TYPE reportit_ml_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(collected["stages"].items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram["counts"]):
+                cumulative += count
+                lines.append(f'reportit_ml_stage_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'reportit_ml_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'reportit_ml_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.9g}')
+            lines.append(f'reportit_ml_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        
+        lines += [
+            "# HELP reportit_ml_events_total ML pipeline event counters",
+            "# TYPE reportit_ml_events_total counter",
+        ]
+        for name, value in sorted(collected["counters"].items()):
+            lines.append(f'reportit_ml_events_total{{event="{name}"}} {value}')
+        
+        lines += [
+            "# HELP reportit_ml_workers Worker metrics files merged into these totals",
+            "# TYPE reportit_ml_workers gauge",
+            f"reportit_ml_workers {collected['workers']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+pipeline_metrics = PipelineMetrics()
+atexit.register(pipeline_metrics.flush)
+
+
+def get_pipeline_metrics():
+    """Get the pipeline metrics of this process"""
+    return pipeline_metrics
+
+
+class CountHistogram:
+    """Thread-safe histogram of non-negative counts in power-of-two buckets"""
+    
+    def __init__(self, max_bound=512):
+        self.bounds = [1]
+        while self.bounds[-1] < max_bound:
+            self.bounds.append(self.bounds[-1] * 2)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._total = 0
+        self._observations = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        with self._lock:
+            self._counts[index] += 1
+            self._total += value
+            self._observations += 1
+    
+    def get_stats(self):
+        """Get bucket counts keyed by upper bound ("le_N", plus "gt_<max>") and the mean"""
+        with self._lock:
+            counts = list(self._counts)
+            mean = self._total / self._observations if self._observations else 0.0
+        buckets = {f"le_{bound}": count for bound, count in zip(self.bounds, counts)}
+        buckets[f"gt_{self.bounds[-1]}"] = counts[-1]
+        return {"count": sum(counts), "mean": mean, "buckets": buckets}
+
+
+class PredictionCoalescer:
+    """
+    Merge predictions requested concurrently by many threads into one batched call
+    
+    The first caller to arrive leads the next batch. If other requests are
+    already pending or a batch is running (i.e. there is concurrency), it waits
+    up to the window, or until max_batch rows are pending, for more callers to
+    join; a lone request is not delayed. The leader then runs every pending
+    request as one batch and resolves the other callers' futures.
+    
+    Rows must have input_width columns (when given): a malformed request is
+    rejected before it is queued, so it cannot fail the batch it would join.
+    """
+    
+    def __init__(self, predict, window=None, max_batch=None, input_width=None):
+        self._predict = predict
+        self.window = COALESCE_WINDOW if window is None else window
+        self.max_batch = max_batch or COALESCE_MAX_BATCH
+        self.input_width = input_width
+        
+        self._condition = threading.Condition()
+        self._pending = []
+        self._pending_rows = 0
+        self._leading = False
+        self._running = 0
+        
+        self.requests = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = CountHistogram(self.max_batch)
+        self.queue_depths = CountHistogram(self.max_batch)
+    
+    def predict(self, rows, return_probabilities=False):
+        """
+        Predict a 2-D block of feature rows, possibly batched with other callers
+        
+        Returns:
+            list: One prediction dict per row
+        
+        Raises:
+            ValueError: If rows is not 2-D or has the wrong number of columns
+        """
+        rows = np.asarray(rows)
+        if rows.ndim != 2 or (self.input_width is not None and rows.shape[1] != self.input_width):
+            raise ValueError(f"Expected rows of {self.input_width or 'N'} features, got an array of shape {rows.shape}")
+        
+        # Large requests are already batches; run them directly
+        if rows.shape[0] >= self.max_batch:
+            return self._predict(rows, return_probabilities)
+        
+        with self._condition:
+            # Idle: run directly, skipping the future hand-off
+            idle = not (self._leading or self._running or self._pending)
+            if idle:
+                self._running += 1
+                self.requests += 1
+                self.batches += 1
+                self.queue_depths.observe(1)
+                self.batch_sizes.observe(rows.shape[0])
+        if idle:
+            try:
+                return self._predict(rows, return_probabilities)
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._condition.notify_all()
+        
+        future = Future()
+        with self._condition:
+            self._pending.append((rows, return_probabilities, future))
+            self._pending_rows += rows.shape[0]
+            self.requests += 1
+            depth = len(self._pending)
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            self.queue_depths.observe(depth)
+            
+            lead = not self._leading
+            if lead:
+                self._leading = True
+            else:
+                self._condition.notify_all()
+        
+        if lead:
+            self._run_batch()
+        return future.result()
+    
+    def _run_batch(self):
+        """Collect the pending requests (waiting up to the window) and run them as one batch"""
+        with self._condition:
+            if self.window > 0 and (self._running or len(self._pending) > 1):
+                # While a batch is running, keep collecting until it finishes;
+                # otherwise stop once callers stop arriving (none within a
+                # fifth of the window)
+                deadline = time.monotonic() + self.window
+                idle_gap = self.window / 5
+                while self._pending_rows < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    running, waiting = self._running, len(self._pending)
+                    self._condition.wait(remaining if running else min(remaining, idle_gap))
+                    if not running and len(self._pending) == waiting:
+                        break
+            
+            batch, self._pending, self._pending_rows = self._pending, [], 0
+            self._leading = False
+            self._running += 1
+            self.batches += 1
+            self.batch_sizes.observe(sum(rows.shape[0] for rows, _, _ in batch))
+        
+        try:
+            # Any error fails every caller of the batch, so none is left waiting
+            try:
+                features = np.concatenate([rows for rows, _, _ in batch]) if len(batch) > 1 else batch[0][0]
+                return_probabilities = any(wants for _, wants, _ in batch)
+                predictions = self._predict(features, return_probabilities)
+                
+                batch_results = []
+                start = 0
+                for rows, wants_probabilities, _ in batch:
+                    results = predictions[start:start + rows.shape[0]]
+                    start += rows.shape[0]
+                    if return_probabilities and not wants_probabilities:
+                        results = [
+                            {key: value for key, value in result.items()
+                             if key not in ('all_probabilities', 'top_5_predictions')}
+                            for result in results
+                        ]
+                    batch_results.append(results)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                return
+            
+            for (_, _, future), results in zip(batch, batch_results):
+                future.set_result(results)
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._condition.notify_all()
+    
+    def get_stats(self):
+        """Get queue depth and batch-size histograms"""
+        with self._condition:
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "requests": self.requests,
+                "batches": self.batches,
+                "queue_depth": len(self._pending),
+                "max_queue_depth": self.max_queue_depth,
+                "queue_depth_histogram": self.queue_depths.get_stats(),
+                "batch_size_histogram": self.batch_sizes.get_stats(),
+            }
+
+
+class ShadowEvaluator:
+    """
+    Compare a candidate model with the model serving predictions, off the request path
+    
+    The serving model passes every batch it predicts to submit(), which only
+    copies the features onto a bounded queue (or drops the batch when the
+    queue is full). A background thread loads the candidate, runs it on the
+    same features and records how often the two agree, how their confidences
+    differ and how long each took.
+    """
+    
+    # Most frequent (serving, candidate) category disagreements kept in the stats
+    TOP_DISAGREEMENTS = 10
+    
+    def __init__(self, model_path, sample_rate=None, queue_size=None):
+        self.model_path = Path(model_path)
+        self.sample_rate = SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.queue_size = queue_size or SHADOW_QUEUE_SIZE
+        
+        # A single one-threaded interpreter keeps the candidate's CPU use small
+        self.candidate = MLModelManager(pool_size=1, num_threads=1, model_path=self.model_path)
+        
+        self._lock = threading.Lock()
+        self._closed = False
+        self._reset()
+    
+    def _reset(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._thread = None
+        
+        self.batches = 0
+        self.rows = 0
+        self.agreements = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.serving_version = None
+        self._delta_sum = 0.0
+        self._abs_delta_sum = 0.0
+        self._max_abs_delta = 0.0
+        self._disagreements = Counter()
+        self._latency = {
+            name: {"counts": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+            for name in ("serving", "candidate")
+        }
+    
+    def _ensure_worker(self):
+        # A forked worker has the parent's queue but not its thread, so it starts over
+        if os.getpid() != self._pid:
+            self._reset()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name='ml-shadow', daemon=True)
+            self._thread.start()
+    
+    def submit(self, features, predicted_indices, confidences, serving_seconds, serving_version):
+        """
+        Queue a predicted batch for comparison; never blocks
+        
+        Returns:
+            bool: True if the batch was queued (False if sampled out or dropped)
+        """
+        if self._closed:
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            with self._lock:
+                self.sampled_out += 1
+            return False
+        
+        # Copy the features: the caller may reuse its array once the prediction returns
+        item = (np.array(features, dtype=np.float32), predicted_indices, confidences, serving_seconds, serving_version)
+        with self._lock:
+            # Closed meanwhile: don't start a new worker
+            if self._closed:
+                return False
+            self._ensure_worker()
+            work_queue = self._queue
+        try:
+            work_queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            pipeline_metrics.increment('shadow_dropped_batches')
+            return False
+        return True
+    
+    def _run(self, work_queue):
+        while True:
+            item = work_queue.get()
+            if item is None or self._closed:
+                break
+            try:
+                self._compare(*item)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                    self.last_error = str(e)
+    
+    def _compare(self, features, predicted_indices, confidences, serving_seconds, serving_version):
+        """Run the candidate on one batch and record the comparison"""
+        # Load before timing, so the first batch doesn't count the load as latency
+        if not self.candidate.ensure_loaded():
+            raise ValueError(f"Shadow model could not be loaded from {self.model_path}")
+        
+        started = time.perf_counter()
+        probabilities = self.candidate._softmax(self.candidate.predict(features))
+        candidate_seconds = time.perf_counter() - started
+        
+        candidate_indices = np.argmax(probabilities, axis=1)
+        candidate_confidences = probabilities[np.arange(len(candidate_indices)), candidate_indices]
+        agree = candidate_indices == predicted_indices
+        deltas = candidate_confidences - confidences
+        agreements = int(agree.sum())
+        
+        categories = self.candidate.INCIDENT_CATEGORIES
+        disagreements = Counter(
+            (categories[serving], categories[candidate])
+            for serving, candidate in zip(predicted_indices[~agree], candidate_indices[~agree])
+        )
+        buckets = [bisect.bisect_left(LATENCY_BUCKETS, seconds) for seconds in (serving_seconds, candidate_seconds)]
+        
+        # Every counter and histogram of a batch is updated in one locked
+        # section, so get_stats never sees a half-recorded batch
+        with self._lock:
+            if self._closed:
+                return
+            self.batches += 1
+            self.rows += len(agree)
+            self.agreements += agreements
+            self.serving_version = serving_version
+            self._delta_sum += float(deltas.sum())
+            self._abs_delta_sum += float(np.abs(deltas).sum())
+            if len(deltas):
+                self._max_abs_delta = max(self._max_abs_delta, float(np.abs(deltas).max()))
+            self._disagreements.update(disagreements)
+            for name, seconds, bucket in zip(("serving", "candidate"), (serving_seconds, candidate_seconds), buckets):
+                histogram = self._latency[name]
+                histogram["counts"][bucket] += 1
+                histogram["sum"] += seconds
+                histogram["count"] += 1
+        
+        pipeline_metrics.observe('shadow_inference', candidate_seconds)
+        pipeline_metrics.increment('shadow_rows', len(agree))
+        pipeline_metrics.increment('shadow_agreements', agreements)
+    
+    def get_stats(self):
+        """Get the agreement rate, confidence deltas and per-batch latency of both models"""
+        with self._lock:
+            rows = self.rows
+            latency = {}
+            for name, histogram in self._latency.items():
+                count = histogram["count"]
+                latency[name] = {
+                    "mean_ms": histogram["sum"] / count * 1000 if count else 0.0,
+                    "p50_ms": latency_percentile(histogram["counts"], count, 0.50) * 1000,
+                    "p95_ms": latency_percentile(histogram["counts"], count, 0.95) * 1000,
+                    "p99_ms": latency_percentile(histogram["counts"], count, 0.99) * 1000,
+                }
+            return {
+                "candidate_path": str(self.model_path),
+                "candidate_version": self.candidate.model_version,
+                "serving_version": self.serving_version,
+                "sample_rate": self.sample_rate,
+                "batches": self.batches,
+                "rows": rows,
+                "agreement_rate": self.agreements / rows if rows else None,
+                "confidence_delta": {
+                    "mean": self._delta_sum / rows if rows else 0.0,
+                    "mean_abs": self._abs_delta_sum / rows if rows else 0.0,
+                    "max_abs": self._max_abs_delta,
+                },
+                "latency": latency,
+                "top_disagreements": [
+                    {"serving": serving, "candidate": candidate, "count": count}
+                    for (serving, candidate), count in self._disagreements.most_common(self.TOP_DISAGREEMENTS)
+                ],
+                "queue_depth": self._queue.qsize(),
+                "sampled_out": self.sampled_out,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+    
+    def close(self):
+        """Stop the background thread and unload the candidate"""
+        with self._lock:
+            self._closed = True
+            if self._thread is not None and os.getpid() == self._pid:
+                try:
+                    self._queue.put_nowait(None)
+                except queue.Full:
+                    pass
+        self.candidate.unload()
+
+
+class ModelRegistry:
+    """
+    Named models from a registry directory, loaded lazily and evicted LRU under a memory budget
+    
+    The registry directory holds the model files and a manifest.json:
+    
+        {
+            "default": "general",
+            "models": {
+                "general": {"path": "general.tflite"},
+                "tagalog": {"path": "tagalog.tflite", "languages": ["tagalog"]}
+            }
+        }
+    
+    Paths are relative to the registry directory. A model may also name a
+    candidate to run in shadow with "shadow": "general-v2.tflite" (see
+    ShadowEvaluator). Without a manifest the registry holds one model,
+    best_model.tflite next to this module, under the name "default".
+    """
+    
+    MANIFEST_NAME = 'manifest.json'
+    
+    def __init__(self, directory=None, memory_budget_mb=None):
+        self.directory = Path(directory or MODEL_REGISTRY_DIR)
+        budget_mb = MODEL_MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+        self.memory_budget = int(budget_mb * 1024 * 1024)
+        self.evictions = 0
+        
+        self._lock = threading.Lock()
+        self._managers = {}
+        self._coalescers = {}
+        self._last_used = {}
+        self._stats = {}
+        
+        self.default_name, self.entries = self._read_manifest()
+    
+    def _read_manifest(self):
+        """Read the manifest, falling back to the single bundled model"""
+        manifest_path = self.directory / self.MANIFEST_NAME
+        if not manifest_path.exists():
+            bundled = {"path": Path(__file__).parent / 'best_model.tflite', "languages": [], "shadow": None}
+            if SHADOW_MODEL_PATH:
+                bundled["shadow"] = Path(__file__).parent / SHADOW_MODEL_PATH
+            return DEFAULT_MODEL_NAME, {DEFAULT_MODEL_NAME: bundled}
+        
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        
+        entries = {}
+        for name, entry in manifest.get('models', {}).items():
+            entries[name] = {
+                "path": self.directory / entry['path'],
+                "languages": list(entry.get('languages', [])),
+                "description": entry.get('description', ''),
+                "shadow": self.directory / entry['shadow'] if entry.get('shadow') else None,
+            }
+        
+        if not entries:
+            raise ValueError(f"No models listed in {manifest_path}")
+        
+        default_name = manifest.get('default') or next(iter(entries))
+        if default_name not in entries:
+            raise ValueError(f"Default model '{default_name}' is not listed in {manifest_path}")
+        if SHADOW_MODEL_PATH and entries[default_name]["shadow"] is None:
+            entries[default_name]["shadow"] = self.directory / SHADOW_MODEL_PATH
+        
+        return default_name, entries
+    
+    def names(self):
+        """Get the names of all registered models"""
+        return list(self.entries)
+    
+    def model_for_language(self, language):
+        """Get the name of the model specialised for a language, or the default model"""
+        for name, entry in self.entries.items():
+            if language in entry['languages']:
+                return name
+        return self.default_name
+    
+    def get_manager(self, name=None):
+        """Get the (possibly unloaded) manager for a model"""
+        name = name or self.default_name
+        if name not in self.entries:
+            raise ValueError(f"Unknown model: {name}")
+        
+        with self._lock:
+            manager = self._managers.get(name)
+            if manager is None:
+                manager = MLModelManager(model_path=self.entries[name]['path'])
+                if self.entries[name]['shadow'] is not None:
+                    manager.set_shadow_model(self.entries[name]['shadow'])
+                self._managers[name] = manager
+                self._stats[name] = {"requests": 0, "rows": 0, "total_seconds": 0.0, "max_seconds": 0.0, "loads": 0, "evictions": 0}
+            return manager
+    
+    def acquire(self, name=None):
+        """
+        Get a model's manager, loading it if needed and unloading least
+        recently used models that no longer fit in the memory budget
+        
+        Returns:
+            MLModelManager: The manager (check model_loaded; loading may fail)
+        """
+        name = name or self.default_name
+        manager = self.get_manager(name)
+        
+        was_loaded = manager.model_loaded
+        if not manager.ensure_loaded():
+            return manager
+        
+        with self._lock:
+            self._last_used[name] = time.monotonic()
+            if not was_loaded:
+                self._stats[name]["loads"] += 1
+            self._evict(keep=name)
+        
+        return manager
+    
+    def _evict(self, keep):
+        """Unload least recently used models until the loaded ones fit the budget"""
+        loaded = [name for name, manager in self._managers.items() if manager.model_loaded]
+        used = sum(self._managers[name].memory_bytes() for name in loaded)
+        
+        for name in sorted(loaded, key=lambda name: self._last_used.get(name, 0.0)):
+            if used <= self.memory_budget:
+                break
+            if name == keep:
+                continue
+            manager = self._managers[name]
+            used -= manager.memory_bytes()
+            manager.unload()
+            self.evictions += 1
+            self._stats[name]["evictions"] += 1
+    
+    def predict_incident_category(self, input_data, return_probabilities=False, name=None):
+        """Predict incident categories with a named model, recording its latency"""
+        name = name or self.default_name
+        manager = self.acquire(name)
+        
+        started = time.perf_counter()
+        input_details = manager.input_details if COALESCE_PREDICTIONS else None
+        coalescer = self._get_coalescer(name, int(input_details[0]['shape'][-1])) if input_details else None
+        if coalescer is not None:
+            input_data = np.asarray(input_data)
+            is_batch = input_data.ndim == len(input_details[0]['shape'])
+            result = coalescer.predict(input_data if is_batch else input_data[np.newaxis], return_probabilities)
+            result = result if is_batch else result[0]
+        else:
+            result = manager.predict_incident_category(input_data, return_probabilities)
+        elapsed = time.perf_counter() - started
+        
+        with self._lock:
+            stats = self._stats[name]
+            stats["requests"] += 1
+            stats["rows"] += len(result) if isinstance(result, list) else 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        
+        return result
+    
+    def _get_coalescer(self, name, input_width):
+        """Get the request coalescer of a model"""
+        with self._lock:
+            coalescer = self._coalescers.get(name)
+            if coalescer is None:
+                coalescer = PredictionCoalescer(partial(self._predict_batch, name), input_width=input_width)
+                self._coalescers[name] = coalescer
+            # A reloaded model may take a different input
+            coalescer.input_width = input_width
+            return coalescer
+    
+    def _predict_batch(self, name, rows, return_probabilities):
+        """Run a coalesced batch on the current version of a model"""
+        return self.acquire(name).predict_incident_category(rows, return_probabilities)
+    
+    def get_coalescing_stats(self):
+        """Get queue depth and batch-size histograms per model"""
+        with self._lock:
+            coalescers = dict(self._coalescers)
+        return {name: coalescer.get_stats() for name, coalescer in coalescers.items()}
+    
+    def get_shadow_stats(self):
+        """Get the shadow candidate comparison per model that has one"""
+        with self._lock:
+            managers = dict(self._managers)
+        return {name: manager.get_shadow_stats() for name, manager in managers.items() if manager.shadow is not None}
+    
+    def get_memory_stats(self):
+        """Get this worker's RSS and the memory attributable to each loaded model"""
+        smaps = read_smaps_by_file() if MODEL_MMAP else {}
+        with self._lock:
+            managers = dict(self._managers)
+        return {
+            "process": get_process_memory(),
+            "models": {
+                name: manager.get_memory_stats(smaps)
+                for name, manager in managers.items()
+                if manager.model_loaded
+            },
+        }
+    
+    def get_stats(self):
+        """Get memory use and per-model hit, latency and memory stats"""
+        models = {}
+        for name, entry in self.entries.items():
+            manager = self._managers.get(name)
+            stats = dict(self._stats.get(name, {}))
+            requests = stats.get("requests", 0)
+            models[name] = {
+                "path": str(entry['path']),
+                "languages": entry['languages'],
+                "loaded": bool(manager and manager.model_loaded),
+                "model_version": manager.model_version if manager else None,
+                "memory_mb": (manager.memory_bytes() if manager else 0) / (1024 * 1024),
+                "requests": requests,
+                "rows": stats.get("rows", 0),
+                "avg_latency_ms": stats["total_seconds"] / requests * 1000 if requests else 0.0,
+                "max_latency_ms": stats.get("max_seconds", 0.0) * 1000,
+                "loads": stats.get("loads", 0),
+                "evictions": stats.get("evictions", 0),
+            }
+        
+        return {
+            "directory": str(self.directory),
+            "default_model": self.default_name,
+            "memory_budget_mb": self.memory_budget / (1024 * 1024),
+            "memory_used_mb": sum(model["memory_mb"] for model in models.values()),
+            "evictions": self.evictions,
+            "models": models,
+        }
+
+
+# Inference server protocol: each frame is two big-endian uint32 lengths
+# followed by a JSON header and a binary payload (float32 feature rows)
+FRAME_HEADER = struct.Struct("!II")
+
+
+def encode_frame(header, payload=b""):
+    """Encode a protocol frame"""
+    body = json.dumps(header).encode('utf-8')
+    return FRAME_HEADER.pack(len(body), len(payload)) + body + payload
+
+
+def decode_frame_header(data):
+    """Get the (header length, payload length) of a frame"""
+    return FRAME_HEADER.unpack(data)
+
+
+def _recv_exact(sock, size):
+    """Read exactly size bytes from a blocking socket"""
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Inference server closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class InferenceClient:
+    """
+    Client for the inference server (manage.py run_inference_server)
+    
+    Keeps one connection per thread. After a failure the server is skipped for
+    retry_seconds, during which callers predict in-process. The model version
+    seen in the last response is trusted for version_seconds (the server's
+    hot reload interval), then asked for again.
+    """
+    
+    def __init__(self, socket_path, timeout=None, retry_seconds=None, version_seconds=None):
+        self.socket_path = socket_path
+        self.timeout = INFERENCE_TIMEOUT if timeout is None else timeout
+        self.retry_seconds = INFERENCE_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self.version_seconds = MODEL_CHECK_INTERVAL if version_seconds is None else version_seconds
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+        self._local = threading.local()
+        self._unavailable_until = 0.0
+        self._versions = {}
+    
+    def available(self):
+        """Check whether the server is worth trying (it has not failed recently)"""
+        return time.monotonic() >= self._unavailable_until
+    
+    def mark_unavailable(self, error):
+        """Skip the server for retry_seconds after a failure"""
+        self.failures += 1
+        self.last_error = str(error)
+        self._unavailable_until = time.monotonic() + self.retry_seconds
+    
+    def _connect(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+    
+    def _disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+    
+    def call(self, header, payload=b""):
+        """
+        Send one request and wait for its response
+        
+        A request on a reused connection is retried once on a fresh one, in
+        case the server restarted in between.
+        
+        Returns:
+            dict: Response header
+        """
+        for attempt in range(2):
+            reused = getattr(self._local, 'sock', None) is not None
+            sock = self._connect()
+            try:
+                sock.sendall(encode_frame(header, payload))
+                header_length, payload_length = decode_frame_header(_recv_exact(sock, FRAME_HEADER.size))
+                response = json.loads(_recv_exact(sock, header_length))
+                _recv_exact(sock, payload_length)
+                break
+            except OSError:
+                self._disconnect()
+                if attempt or not reused:
+                    raise
+        
+        if 'error' in response:
+            raise ValueError(f"Inference server error: {response['error']}")
+        return response
+    
+    def predict_incident_category(self, input_data, return_probabilities=False, model_name=None):
+        """Same contract as MLModelManager.predict_incident_category, served by the inference server"""
+        features = np.ascontiguousarray(input_data, dtype=np.float32)
+        is_batch = features.ndim == 2
+        rows = features.reshape(-1, features.shape[-1])
+        
+        self.requests += 1
+        response = self.call({
+            "op": "predict",
+            "rows": rows.shape[0],
+            "cols": rows.shape[1],
+            "model": model_name,
+            "return_probabilities": bool(return_probabilities),
+        }, rows.tobytes())
+        
+        predictions = response['predictions']
+        for prediction in predictions:
+            if 'top_5_predictions' in prediction:
+                prediction['top_5_predictions'] = [tuple(pair) for pair in prediction['top_5_predictions']]
+        if predictions:
+            self._versions[model_name] = (predictions[-1]['model_version'], time.monotonic())
+        
+        return predictions if is_batch else predictions[0]
+    
+    def get_model_version(self, model_name=None):
+        """Get the version the server predicts with (as of its last response, if recent)"""
+        version, seen_at = self._versions.get(model_name, (None, None))
+        if seen_at is None or time.monotonic() - seen_at >= self.version_seconds:
+            response = self.call({"op": "status", "model": model_name})
+            version = response['model_version']
+            self._versions[model_name] = (version, time.monotonic())
+        return version
+    
+    def get_stats(self):
+        """Get request and failure counts"""
+        return {
+            "socket": self.socket_path,
+            "available": self.available(),
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+# Global model registry; ml_model is its default model
+model_registry = ModelRegistry()
+ml_model = model_registry.get_manager()
+
+# Client for the inference server, if one is configured
+inference_client = InferenceClient(INFERENCE_SOCKET) if INFERENCE_SOCKET else None
+
+
+def get_model_registry():
+    """Get the global model registry"""
+    return model_registry
+
+
+def get_model_manager(name=None):
+    """Get the manager of a registered model (the default model if no name is given)"""
+    return model_registry.get_manager(name)
+
+
+def make_prediction(input_data, model_name=None):
+    """Convenience function to make predictions (returns raw output)"""
+    return model_registry.acquire(model_name).predict(input_data)
+
+
+@pipeline_metrics.timed('inference')
+def predict_incident_category(input_data, return_probabilities=False, model_name=None):
+    """
+    Convenience function to predict incident category with human-readable output
+    
+    Args:
+        input_data: Input features, either a single row (544,) or a batch (N, 544)
+        return_probabilities: If True, returns all probabilities for each category
+        model_name: Registered model to use (defaults to the registry's default model)
+        
+    Returns:
+        dict for a single row, list of dicts for a batch: Contains predicted
+        category, confidence, and optionally all probabilities
+    """
+    if inference_client is not None and inference_client.available():
+        try:
+            return inference_client.predict_incident_category(input_data, return_probabilities, model_name)
+        except Exception as e:
+            print(f"Inference server unavailable, predicting in-process: {e}")
+            inference_client.mark_unavailable(e)
+            pipeline_metrics.increment('inference_server_fallbacks')
+    
+    return model_registry.predict_incident_category(input_data, return_probabilities, model_name)
+
+
+def get_model_version(model_name=None):
+    """
+    Get the version of the model that will serve predictions
+    
+    Returns:
+        str: Model version, or None if no model could be loaded
+    """
+    if inference_client is not None and inference_client.available():
+        try:
+            return inference_client.get_model_version(model_name)
+        except Exception as e:
+            print(f"Inference server unavailable, predicting in-process: {e}")
+            inference_client.mark_unavailable(e)
+    
+    return model_registry.acquire(model_name).model_version
+
+
+def is_model_ready(model_name=None):
+    """Check whether predictions can be served, by the inference server or in-process"""
+    return get_model_version(model_name) is not None
+
+
+def get_incident_categories():
+    """Get list of all possible incident categories"""
     return ml_model.get_categories_list()
 
 
+def warm_up_model():
+    """Load the model ahead of the first request (used by workers that want to preload)"""
+    return ml_model.warm_up()
+
+
 def get_model_status():
     """Get the current status of the ML model"""
+    model_ready = ml_model.is_ready()
     return {
         "tflite_available": TFLITE_AVAILABLE,
         "model_loaded": ml_model.model_loaded,
-        "model_ready": ml_model.is_ready(),
+        "model_ready": model_ready,
         "model_info": ml_model.get_model_info() if ml_model.model_loaded else None,
+        "runtime_import_seconds": RUNTIME_IMPORT_SECONDS,
+        "model_load_seconds": ml_model.load_seconds,
+        "prediction_cache": prediction_cache.get_stats(),
         "categories_count": len(ml_model.INCIDENT_CATEGORIES),
-        "categories": ml_model.get_categories_list()
+        "categories": ml_model.get_categories_list(),
+        "interpreter_pool": ml_model.get_pool_stats(),
+        "reload": ml_model.get_reload_status(),
+        "registry": model_registry.get_stats(),
+        "memory": model_registry.get_memory_stats(),
+        "coalescing": model_registry.get_coalescing_stats(),
+        "shadow": model_registry.get_shadow_stats(),
+        "inference_server": inference_client.get_stats() if inference_client else None
     }
 
 
+def reload_model(wait=True):
+    """Reload the model file, swapping in a new version without downtime"""
+    return ml_model.reload_model(wait)
+
+
 # Text preprocessing utilities for incident reports
+
+# Size of the feature vector expected by the model
+FEATURE_VECTOR_SIZE = 544
+
+# Incident type one-hot encoding (features 20-34) - 15 categories
+INCIDENT_TYPE_KEYS = [
+    "theft", "reports/agreement", "accident", "debt / unpaid wages report",
+    "defamation complaint", "assault/harassment", "property damage/incident",
+    "animal incident", "verbal abuse and threats", "alarm and scandal",
+    "lost items", "scam/fraud", "drugs addiction", "missing person", "others"
+]
+
+# Crime-related keywords (features 35-134) - only the first 100 are used
+CRIME_KEYWORDS = [
+    # Violence keywords
+    "nakaw", "ninakaw", "theft", "steal", "stolen", "rob", "robbery",
+    "assault", "attack", "hit", "punch", "violence", "fight", "beat",
+    
+    # Drugs keywords  
+    "drugs", "droga", "shabu", "marijuana", "cocaine", "addict", "pusher",
+    "drug dealer", "substance", "illegal drugs", "narcotic",
+    
+    # Harassment keywords
+    "harass", "harassment", "abuse", "threat", "threaten", "intimidate",
+    "bully", "verbal abuse", "sexual harassment", "catcall",
+    
+    # Fraud keywords
+    "scam", "fraud", "fake", "counterfeit", "forgery", "swindle", 
+    "deceive", "cheat", "embezzle", "identity theft",
+    
+    # Missing person keywords
+    "missing", "lost person", "disappear", "vanish", "abduct", "kidnap",
+    "runaway", "last seen", "whereabouts unknown",
+    
+    # Property damage keywords
+    "damage", "vandalism", "destroy", "break", "smash", "graffiti",
+    "fire", "arson", "explosion", "sabotage",
+    
+    # Location keywords
+    "street", "kalye", "road", "highway", "bridge", "park", "school",
+    "hospital", "church", "market", "mall", "home", "house", "barangay",
+    
+    # Time keywords
+    "morning", "afternoon", "evening", "night", "dawn", "midnight",
+    "today", "yesterday", "last week", "umaga", "gabi", "tanghali",
+    
+    # Emergency keywords
+    "emergency", "urgent", "help", "police", "ambulance", "fire truck",
+    "rescue", "hospital", "clinic", "emergency room",
+    
+    # Emotional keywords
+    "scared", "afraid", "worried", "angry", "upset", "traumatized",
+    "shocked", "panic", "stress", "anxiety", "depression",
+    
+    # Action keywords
+    "report", "complaint", "incident", "crime", "violation", "illegal",
+    "witness", "suspect", "victim", "perpetrator", "evidence"
+][:100]
+
+# Language-specific features (features 335-384) - only the first 50 are used
+TAGALOG_WORDS = [
+    "ako", "ikaw", "siya", "kami", "kayo", "sila", "ang", "ng", "sa", "si",
+    "mga", "ay", "at", "na", "pa", "po", "opo", "hindi", "oo", "wala",
+    "may", "meron", "kung", "kapag", "para", "dahil", "kasi", "pero",
+    "nakita", "narinig", "nangyari", "ginawa", "sinabi", "pumunta",
+    "dumating", "umalis", "kumuha", "binigay", "tinanong", "sumagot",
+    "pera", "kotse", "bahay", "tao", "bata", "lalaki", "babae", "matanda",
+    "gabi", "umaga", "hapon", "araw"
+][:50]
+
+# Severity indicators (features 385-390)
+SEVERITY_WORDS = ["urgent", "emergency", "serious", "critical", "help", "asap"]
+
+# Bump whenever a change to the extractor changes the feature values. The
+# character cap and time budget change them too when enabled; they are part of
+# feature_extractor_tag() rather than this version.
+FEATURE_EXTRACTOR_VERSION = 1
+
+# Rows per chunk when spreading batch extraction across a process pool
+FEATURE_CHUNK_SIZE = 256
+
+# Characters of a report's combined text used for features; longer texts are
+# truncated to their start (0 disables the cap). Off by default: the model was
+# trained on whole texts, so capped features change the longest reports'
+# predictions.
+FEATURE_MAX_CHARS = int(os.environ.get("ML_FEATURE_MAX_CHARS", 0))
+
+# Milliseconds of extraction per report after which the character n-gram
+# features stop counting and use the text counted so far (0 disables the
+# budget). Off by default: an over-budget vector depends on CPU load, so it
+# is never cached or stored (see extract_text_features_batch).
+FEATURE_TIME_BUDGET_MS = float(os.environ.get("ML_FEATURE_TIME_BUDGET_MS", 0))
+
+# Characters counted per step of the character n-gram features
+NGRAM_CHUNK_CHARS = 4096
+
+_NON_ALPHANUMERIC_RE = re.compile(r'[^a-zA-Z0-9\s]')
+
+
+class KeywordMatcher:
+    """
+    Count occurrences of many keywords in a single pass over a text
+    
+    The keywords are compiled into one trie-shaped regular expression, so the
+    regex engine walks the text once and only follows the branch matching
+    the current characters, instead of rescanning the text once per keyword.
+    
+    By default counts match str.count (substrings, non-overlapping per
+    keyword), which is what the model features were trained with. With
+    word_boundary=True only whole-word (or whole-phrase) occurrences count.
+    """
+    
+    def __init__(self, keywords, word_boundary=False):
+        self.keywords = list(dict.fromkeys(keywords))
+        self.word_boundary = word_boundary
+        
+        trie = {}
+        for keyword in self.keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+        
+        # At every position the regex reports the longest keyword starting there
+        boundary = r'\b' if word_boundary else ''
+        self._pattern = re.compile(f"(?={boundary}({self._trie_pattern(trie)}){boundary})")
+        
+        # A match also counts for every shorter keyword that is a prefix of it
+        # (in word boundary mode only when the prefix ends a word)
+        index = {keyword: i for i, keyword in enumerate(self.keywords)}
+        self._credits = {
+            keyword: [
+                index[prefix] for prefix in self.keywords
+                if keyword.startswith(prefix) and (
+                    prefix == keyword or not word_boundary or not keyword[len(prefix)].isalnum()
+                )
+            ]
+            for keyword in self.keywords
+        }
+        
+        # Keywords that can overlap themselves (e.g. "oo" in "ooo") need
+        # str.count to keep its non-overlapping semantics
+        self._self_overlapping = [] if word_boundary else [
+            (i, keyword) for i, keyword in enumerate(self.keywords)
+            if any(keyword[:size] == keyword[-size:] for size in range(1, len(keyword)))
+        ]
+    
+    @classmethod
+    def _trie_pattern(cls, node):
+        """Build a regex for a trie node, trying longer keywords first"""
+        branches = [re.escape(char) + cls._trie_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{pattern})?" if '' in node else pattern
+    
+    def count(self, text):
+        """
+        Count every keyword in text
+        
+        Returns:
+            np.ndarray: int64 counts aligned with self.keywords
+        """
+        counts = [0] * len(self.keywords)
+        for keyword, hits in Counter(self._pattern.findall(text)).items():
+            for i in self._credits[keyword]:
+                counts[i] += hits
+        
+        for i, keyword in self._self_overlapping:
+            if counts[i] > 1:
+                counts[i] = text.count(keyword)
+        
+        return np.array(counts, dtype=np.int64)
+
+
+# All keywords counted by the feature extractor, matched in one pass
+FEATURE_KEYWORDS = list(dict.fromkeys(CRIME_KEYWORDS + TAGALOG_WORDS + SEVERITY_WORDS))
+
+_FEATURE_MATCHERS = {
+    False: KeywordMatcher(FEATURE_KEYWORDS),
+    True: KeywordMatcher(FEATURE_KEYWORDS, word_boundary=True),
+}
+
+_KEYWORD_POSITIONS = {keyword: i for i, keyword in enumerate(FEATURE_KEYWORDS)}
+_CRIME_KEYWORD_COLUMNS = [_KEYWORD_POSITIONS[keyword] for keyword in CRIME_KEYWORDS]
+_TAGALOG_WORD_COLUMNS = [_KEYWORD_POSITIONS[word] for word in TAGALOG_WORDS]
+_SEVERITY_WORD_COLUMNS = [_KEYWORD_POSITIONS[word] for word in SEVERITY_WORDS]
+
+
+def _stable_text_hash(text):
+    """Hash text the same way in every process (unlike the salted built-in hash())"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+_DIGEST_FEATURE_OFFSETS = np.arange(488, FEATURE_VECTOR_SIZE)
+
+
+def feature_extractor_tag(max_chars=None, time_budget_ms=None):
+    """
+    Identify the extractor version and the settings feature values depend on
+    
+    Cached predictions and stored vectors are tagged with this, so workers
+    configured with a different ML_FEATURE_MAX_CHARS never share vectors.
+    """
+    max_chars = FEATURE_MAX_CHARS if max_chars is None else max_chars
+    time_budget_ms = FEATURE_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    return f"v{FEATURE_EXTRACTOR_VERSION}-chars{max_chars}-budget{time_budget_ms:g}"
+
+
+def _combine_report_text(title, description, translated_text):
+    """Combine all text sources the way the model was trained on"""
+    return f"{title} {description} {translated_text}".lower().strip()
+
+
+def _truncate_report_text(title, description, translated_text, max_chars):
+    """
+    Cut the report's text sources so the combined text has at most max_chars characters
+    
+    Returns:
+        tuple: (title, description, translated_text, combined text, characters dropped)
+    """
+    total = sum(len(part) for part in (title, description, translated_text) if part) + 2
+    if not max_chars or total <= max_chars:
+        return title, description, translated_text, _combine_report_text(title, description, translated_text), 0
+    
+    # No part can contribute more than max_chars, so never lower-case more than that
+    title, description, translated_text = (part[:max_chars] if part else part for part in (title, description, translated_text))
+    combined_text = _combine_report_text(title, description, translated_text)[:max_chars]
+    return title, description, translated_text, combined_text, total - len(combined_text)
+
+
+def _char_ngram_counts(clean_text, deadline=None, chunk_chars=NGRAM_CHUNK_CHARS):
+    """
+    Count character bigrams and trigrams of clean_text
+    
+    The text is counted chunk_chars characters at a time, so memory does not
+    grow with the text length. If the deadline (a time.perf_counter() value)
+    passes between chunks, counting stops and the n-grams of the text counted
+    so far are used.
+    
+    Returns:
+        tuple: (counts of every distinct bigram/trigram, total number of
+        n-grams counted, True if the deadline cut counting short)
+    """
+    length = len(clean_text)
+    if length < 2:
+        return np.zeros(0, dtype=np.int64), 0, False
+    
+    # Map characters to a dense alphabet shared by all chunks, so n-grams can be encoded as integers
+    alphabet = np.array(sorted(map(ord, set(clean_text))), dtype=np.uint32)
+    size = len(alphabet)
+    
+    bigram_counts = Counter()
+    trigram_counts = Counter()
+    total = 0
+    cut_short = False
+    for start in range(0, length - 1, chunk_chars):
+        if start and deadline is not None and time.perf_counter() > deadline:
+            cut_short = True
+            break
+        
+        # Overlap the next chunk by two characters to count n-grams spanning the boundary
+        end = min(start + chunk_chars, length)
+        segment = clean_text[start:end + 2]
+        chars = np.searchsorted(alphabet, np.frombuffer(segment.encode('utf-32-le'), dtype=np.uint32)).astype(np.int64)
+        
+        bigrams = chars[:-1] * size + chars[1:]
+        trigrams = bigrams[:-1] * size + chars[2:]
+        bigrams = bigrams[:end - start]
+        trigrams = trigrams[:max(min(end, length - 2) - start, 0)]
+        total += len(bigrams) + len(trigrams)
+        
+        for counter, ngrams in ((bigram_counts, bigrams), (trigram_counts, trigrams)):
+            codes, counts = np.unique(ngrams, return_counts=True)
+            counter.update(dict(zip(codes.tolist(), counts.tolist())))
+    
+    counts = np.array(list(bigram_counts.values()) + list(trigram_counts.values()), dtype=np.int64)
+    return counts, total, cut_short
+
+
+def _extract_feature_rows(rows, word_boundary=False, max_chars=0, time_budget=0):
+    """
+    Extract the feature matrix for a chunk of reports
+    
+    This function runs inside pool workers when batch extraction is
+    parallelised, so every feature must be deterministic across processes
+    (except when the time budget runs out).
+    
+    Args:
+        rows (list): (title, description, incident_type, translated_text) tuples
+        word_boundary (bool): Count only whole-word keyword occurrences
+        max_chars (int): Truncate each report's combined text to this many characters (0 = no cap)
+        time_budget (float): Seconds per report before n-gram counting stops early (0 = no budget)
+        
+    Returns:
+        tuple: (len(rows), 544) float32 feature matrix, a Counter of
+        truncated_rows, truncated_chars and over_budget_rows, and a boolean
+        array marking the rows whose n-gram counting ran over the budget
+    """
+    row_count = len(rows)
+    features = np.zeros((row_count, FEATURE_VECTOR_SIZE), dtype=np.float32)
+    over_budget_rows = np.zeros(row_count, dtype=bool)
+    word_counts = np.zeros(row_count, dtype=np.int64)
+    keyword_counts = np.zeros((row_count, len(FEATURE_KEYWORDS)), dtype=np.int64)
+    matcher = _FEATURE_MATCHERS[word_boundary]
+    stats = Counter()
+    
+    for row, (title, description, incident_type, translated_text) in enumerate(rows):
+        started = time.perf_counter()
+        title, description, translated_text, combined_text, truncated_chars = _truncate_report_text(
+            title, description, translated_text, max_chars
+        )
+        if truncated_chars:
+            stats['truncated_rows'] += 1
+            stats['truncated_chars'] += truncated_chars
+        
+        text_words = combined_text.split()
+        word_count = len(text_words)
+        text_length = len(combined_text)
+        word_counts[row] = word_count
+        
+        # 1. Basic text statistics (features 0-19)
+        features[row, 0] = text_length  # Total character count
+        features[row, 1] = word_count  # Word count
+        features[row, 2] = len(set(text_words))  # Unique word count
+        features[row, 3] = combined_text.count('.')  # Sentence count (approx)
+        features[row, 4] = combined_text.count('!')  # Exclamation count
+        features[row, 5] = combined_text.count('?')  # Question count
+        features[row, 6] = sum(map(str.isupper, combined_text)) / max(text_length, 1)  # Uppercase ratio
+        features[row, 7] = sum(map(str.isdigit, combined_text)) / max(text_length, 1)  # Digit ratio
+        features[row, 8] = len(title.split()) if title else 0  # Title word count
+        features[row, 9] = len(description.split()) if description else 0  # Description word count
+        
+        # 2. Incident type one-hot encoding (features 20-34)
+        incident_lower = incident_type.lower() if incident_type else "others"
+        for i, category in enumerate(INCIDENT_TYPE_KEYS):
+            if category in incident_lower or incident_lower in category:
+                features[row, 20 + i] = 1.0
+                break
+        else:
+            features[row, 34] = 1.0  # Others category
+        
+        # 3, 5, 6. Keyword, Tagalog word and severity word occurrences
+        keyword_counts[row] = matcher.count(combined_text)
+        
+        # 4. Character n-gram features (features 135-334)
+        # Only the counts of the 200 most common patterns are used
+        deadline = started + time_budget if time_budget else None
+        pattern_counts, pattern_total, over_budget = _char_ngram_counts(
+            _NON_ALPHANUMERIC_RE.sub('', combined_text), deadline
+        )
+        if over_budget:
+            stats['over_budget_rows'] += 1
+            over_budget_rows[row] = True
+        if pattern_total:
+            top_counts = np.sort(pattern_counts)[::-1][:200]
+            features[row, 135:135 + len(top_counts)] = top_counts / pattern_total
+        
+        # 7. Statistical features (features 485-487)
+        if word_count > 0:
+            word_lengths = np.fromiter(map(len, text_words), dtype=np.int64, count=word_count)
+            features[row, 485] = np.count_nonzero(word_lengths > 6) / word_count  # Long words ratio
+            features[row, 486] = np.count_nonzero(word_lengths <= 3) / word_count  # Short words ratio
+            features[row, 487] = np.mean(word_lengths)  # Average word length
+        
+        # Fill any remaining features with normalized text digest (features 488-543)
+        text_hash = _stable_text_hash(combined_text) % 100000
+        features[row, 488:] = ((text_hash + _DIGEST_FEATURE_OFFSETS) % 1000) / 1000.0
+    
+    # Normalize keyword counts by word count across the whole chunk
+    normalizer = np.maximum(word_counts, 1)[:, np.newaxis]
+    features[:, 35:35 + len(CRIME_KEYWORDS)] = keyword_counts[:, _CRIME_KEYWORD_COLUMNS] / normalizer
+    features[:, 335:335 + len(TAGALOG_WORDS)] = keyword_counts[:, _TAGALOG_WORD_COLUMNS] / normalizer
+    features[:, 385:385 + len(SEVERITY_WORDS)] = keyword_counts[:, _SEVERITY_WORD_COLUMNS] / normalizer
+    
+    return features, stats, over_budget_rows
+
+
+_extraction_pool = None
+_extraction_pool_pid = None
+_extraction_pool_lock = threading.Lock()
+
+
+def _get_extraction_pool(workers):
+    """
+    Get the process pool used for batch extraction, starting it on first use
+    
+    Workers are started with "spawn": forking a process whose other threads
+    (queue worker, interpreter pools, ingest stages) may hold locks can
+    deadlock the child. The pool is kept for the life of the process, so the
+    start-up cost is paid once; its size is the workers of the first call.
+    """
+    global _extraction_pool, _extraction_pool_pid
+    with _extraction_pool_lock:
+        if _extraction_pool is None or _extraction_pool_pid != os.getpid():
+            # A pool inherited through a fork belongs to the parent process
+            _extraction_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _extraction_pool_pid = os.getpid()
+        return _extraction_pool
+
+
+def _discard_extraction_pool(pool):
+    """Drop a broken pool so the next call starts a new one"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is pool:
+            _extraction_pool = None
+    pool.shutdown(wait=False)
+
+
+@pipeline_metrics.timed('feature_extraction')
+def extract_text_features_batch(rows, workers=None, chunk_size=FEATURE_CHUNK_SIZE, word_boundary=False,
+                                max_chars=None, time_budget_ms=None, return_over_budget=False):
+    """
+    Extract feature vectors for many incident reports at once
+    
+    Produces exactly the same values as extract_text_features, row by row.
+    The cost per report is bounded: text beyond max_chars is ignored, and
+    with a time budget, a report that uses it up gets n-gram features
+    computed from the part of its text counted in time. How often either
+    happens is counted in the pipeline metrics (feature_truncated_rows,
+    feature_truncated_chars, feature_over_budget_rows).
+    
+    Over-budget vectors depend on how busy the machine was, so callers that
+    cache or store vectors must skip those rows (return_over_budget=True).
+    
+    Args:
+        rows (iterable): (title, description, incident_type, translated_text) tuples
+        workers (int): If greater than 1, spread chunks across the shared
+            process pool (see _get_extraction_pool)
+        chunk_size (int): Number of rows handed to each pool task
+        word_boundary (bool): Count only whole-word keyword occurrences. The
+            model was trained on substring counts, so leave this off for
+            predictions.
+        max_chars (int): Characters of each report's text used (defaults to
+            ML_FEATURE_MAX_CHARS, 0 disables the cap)
+        time_budget_ms (float): Milliseconds per report (defaults to
+            ML_FEATURE_TIME_BUDGET_MS, 0 disables the budget)
+        return_over_budget (bool): Also return which rows ran over the budget
+        
+    Returns:
+        np.ndarray: Contiguous (N, 544) float32 feature matrix, and with
+        return_over_budget a boolean array of the over-budget rows
+    """
+    rows = [tuple(row) for row in rows]
+    pipeline_metrics.increment('feature_rows', len(rows))
+    
+    max_chars = FEATURE_MAX_CHARS if max_chars is None else max_chars
+    time_budget_ms = FEATURE_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    extract = partial(_extract_feature_rows, word_boundary=word_boundary, max_chars=max_chars, time_budget=time_budget_ms / 1000)
+    
+    results = None
+    if workers and workers > 1 and len(rows) > chunk_size:
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        pool = _get_extraction_pool(workers)
+        try:
+            results = list(pool.map(extract, chunks))
+        except BrokenProcessPool as e:
+            print(f"Feature extraction pool failed, extracting in-process: {e}")
+            _discard_extraction_pool(pool)
+    
+    if results is not None:
+        features = np.concatenate([chunk_features for chunk_features, _, _ in results], axis=0)
+        stats = sum((chunk_stats for _, chunk_stats, _ in results), Counter())
+        over_budget = np.concatenate([chunk_over_budget for _, _, chunk_over_budget in results])
+    else:
+        features, stats, over_budget = extract(rows)
+    
+    for name, count in stats.items():
+        pipeline_metrics.increment(f'feature_{name}', count)
+    
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    if return_over_budget:
+        return features, over_budget
+    return features
+
+
 def extract_text_features(title, description, incident_type, translated_text):
     """
     Extract meaningful features from incident report text
@@ -245,6 +2666,8 @@ def extract_text_features(title, description, incident_type, translated_text):
     - Language patterns
     - Incident type encoding
     
+    It is a thin wrapper around extract_text_features_batch.
+    
     Args:
         title (str): Report title
         description (str): Report description
@@ -254,152 +2677,298 @@ def extract_text_features(title, description, incident_type, translated_text):
     Returns:
         np.ndarray: 544-dimensional feature vector
     """
-    import re
-    from collections import Counter
-    
-    # Combine all text sources
-    combined_text = f"{title} {description} {translated_text}".lower().strip()
-    
-    # Initialize feature vector
-    features = np.zeros(544, dtype=np.float32)
-    
-    # 1. Basic text statistics (features 0-19)
-    features[0] = len(combined_text)  # Total character count
-    features[1] = len(combined_text.split())  # Word count
-    features[2] = len(set(combined_text.split()))  # Unique word count
-    features[3] = combined_text.count('.')  # Sentence count (approx)
-    features[4] = combined_text.count('!')  # Exclamation count
-    features[5] = combined_text.count('?')  # Question count
-    features[6] = sum(1 for c in combined_text if c.isupper()) / max(len(combined_text), 1)  # Uppercase ratio
-    features[7] = sum(1 for c in combined_text if c.isdigit()) / max(len(combined_text), 1)  # Digit ratio
-    features[8] = len(title.split()) if title else 0  # Title word count
-    features[9] = len(description.split()) if description else 0  # Description word count
-    
-    # 2. Incident type one-hot encoding (features 20-34) - 15 categories
-    incident_categories = [
-        "theft", "reports/agreement", "accident", "debt / unpaid wages report",
-        "defamation complaint", "assault/harassment", "property damage/incident",
-        "animal incident", "verbal abuse and threats", "alarm and scandal",
-        "lost items", "scam/fraud", "drugs addiction", "missing person", "others"
-    ]
+    return extract_text_features_batch([(title, description, incident_type, translated_text)])[0]
+
+
+# Element types a feature vector can be encoded with in API responses
+FEATURE_VECTOR_DTYPES = ('float32', 'float16')
+
+
+def encode_feature_vector(features, dtype='float32'):
+    """
+    Encode a feature vector compactly for a JSON response
     
-    incident_lower = incident_type.lower() if incident_type else "others"
-    for i, category in enumerate(incident_categories):
-        if category in incident_lower or incident_lower in category:
-            features[20 + i] = 1.0
-            break
-    else:
-        features[34] = 1.0  # Others category
+    544 float32 values take 2.9 KB as base64 (1.5 KB as float16) instead of
+    roughly 10 KB as a JSON list of numbers.
     
-    # 3. Crime-related keywords (features 35-134) - 100 features
-    crime_keywords = [
-        # Violence keywords
-        "nakaw", "ninakaw", "theft", "steal", "stolen", "rob", "robbery",
-        "assault", "attack", "hit", "punch", "violence", "fight", "beat",
-        
-        # Drugs keywords  
-        "drugs", "droga", "shabu", "marijuana", "cocaine", "addict", "pusher",
-        "drug dealer", "substance", "illegal drugs", "narcotic",
-        
-        # Harassment keywords
-        "harass", "harassment", "abuse", "threat", "threaten", "intimidate",
-        "bully", "verbal abuse", "sexual harassment", "catcall",
-        
-        # Fraud keywords
-        "scam", "fraud", "fake", "counterfeit", "forgery", "swindle", 
-        "deceive", "cheat", "embezzle", "identity theft",
-        
-        # Missing person keywords
-        "missing", "lost person", "disappear", "vanish", "abduct", "kidnap",
-        "runaway", "last seen", "whereabouts unknown",
-        
-        # Property damage keywords
-        "damage", "vandalism", "destroy", "break", "smash", "graffiti",
-        "fire", "arson", "explosion", "sabotage",
-        
-        # Location keywords
-        "street", "kalye", "road", "highway", "bridge", "park", "school",
-        "hospital", "church", "market", "mall", "home", "house", "barangay",
-        
-        # Time keywords
-        "morning", "afternoon", "evening", "night", "dawn", "midnight",
-        "today", "yesterday", "last week", "umaga", "gabi", "tanghali",
-        
-        # Emergency keywords
-        "emergency", "urgent", "help", "police", "ambulance", "fire truck",
-        "rescue", "hospital", "clinic", "emergency room",
+    Args:
+        features (np.ndarray): Feature vector (or matrix)
+        dtype (str): 'float32', or 'float16' to halve the size at reduced precision
         
-        # Emotional keywords
-        "scared", "afraid", "worried", "angry", "upset", "traumatized",
-        "shocked", "panic", "stress", "anxiety", "depression",
+    Returns:
+        dict: dtype, shape, byte order and the base64-encoded raw values
+    """
+    if dtype not in FEATURE_VECTOR_DTYPES:
+        raise ValueError(f"Unsupported feature vector dtype: {dtype}")
+    
+    values = np.ascontiguousarray(features, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {
+        'encoding': 'base64',
+        'dtype': dtype,
+        'byte_order': 'little',
+        'shape': list(values.shape),
+        'data': base64.b64encode(values.tobytes()).decode('ascii'),
+    }
+
+# Categories that are always treated as high priority / high risk
+HIGH_PRIORITY_CATEGORIES = ['Assault/Harassment', 'Missing Person', 'Drugs Addiction']
+HIGH_RISK_CATEGORIES = ['Assault/Harassment', 'Missing Person', 'Drugs Addiction', 'Theft']
+
+
+def assess_priority_and_risk(predicted_category, confidence):
+    """
+    Determine priority and risk level from a prediction
+    
+    Returns:
+        tuple: (priority, risk_level), each 'high', 'medium' or 'low'
+    """
+    if predicted_category in HIGH_PRIORITY_CATEGORIES or confidence > 0.8:
+        priority = 'high'
+    elif confidence > 0.6:
+        priority = 'medium'
+    else:
+        priority = 'low'
+    
+    if predicted_category in HIGH_RISK_CATEGORIES or confidence > 0.8:
+        risk_level = 'high'
+    elif confidence > 0.6:
+        risk_level = 'medium'
+    else:
+        risk_level = 'low'
+    
+    return priority, risk_level
+
+
+# Language detection and Tagalog translation
+@pipeline_metrics.timed('translation')
+def translate_report_text(title, description):
+    """
+    Detect Tagalog in a report and translate known words to English
+    
+    See text_normalization for the detection and lexicon, and
+    reports.translation_memory for the cached version used by the web app.
+    
+    Returns:
+        tuple: (translated_text, is_tagalog)
+    """
+    return text_normalization.translate_report(title, description)
+
+
+# Prediction cache
+
+# Backend used to cache predictions: "local", "django" or "none"
+PREDICTION_CACHE_BACKEND = os.environ.get("ML_PREDICTION_CACHE", "local")
+
+# Maximum number of entries kept by the in-process cache
+PREDICTION_CACHE_SIZE = int(os.environ.get("ML_PREDICTION_CACHE_SIZE", 10000))
+
+# Seconds a cached prediction stays valid
+PREDICTION_CACHE_TTL = int(os.environ.get("ML_PREDICTION_CACHE_TTL", 3600))
+
+
+class LocalCacheBackend:
+    """In-process LRU cache whose entries expire after ttl seconds"""
+    
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found
+    
+    def set_many(self, values):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """Stores predictions in one of Django's configured caches, shared by all workers"""
+    
+    def __init__(self, alias='default', ttl=PREDICTION_CACHE_TTL):
+        self.alias = alias
+        self.ttl = ttl
+    
+    @property
+    def _cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+    
+    def get_many(self, keys):
+        return self._cache.get_many(keys)
+    
+    def set_many(self, values):
+        self._cache.set_many(values, timeout=self.ttl)
+    
+    def clear(self):
+        self._cache.clear()
+
+
+class PredictionCache:
+    """
+    Cache of (features, prediction) pairs keyed by report content and model version
+    
+    The backend is pluggable: any object with get_many(keys) and
+    set_many(mapping) can be used. Passing None disables caching.
+    """
+    
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(title, description, incident_type, translated_text, model_version):
+        """
+        Build the cache key for a report
         
-        # Action keywords
-        "report", "complaint", "incident", "crime", "violation", "illegal",
-        "witness", "suspect", "victim", "perpetrator", "evidence"
-    ]
+        Inputs are lowercased because the extracted features do not depend on
+        case. The extractor tag is part of the key, so workers with different
+        feature settings never share entries.
+        """
+        fields = [value.lower() if isinstance(value, str) else value
+                  for value in (title, description, incident_type, translated_text)]
+        payload = json.dumps([feature_extractor_tag(), model_version] + fields, default=str)
+        return "ml-prediction:" + hashlib.sha256(payload.encode('utf-8')).hexdigest()
     
-    # Count keyword occurrences (normalized)
-    text_words = combined_text.split()
-    word_count = len(text_words)
-    
-    for i, keyword in enumerate(crime_keywords[:100]):  # Limit to 100 keywords
-        count = combined_text.count(keyword.lower())
-        features[35 + i] = count / max(word_count, 1)  # Normalize by word count
-    
-    # 4. Character n-gram features (features 135-334) - 200 features
-    # Extract character bigrams and trigrams
-    clean_text = re.sub(r'[^a-zA-Z0-9\s]', '', combined_text)
-    
-    # Common character patterns in Filipino/English crime reports
-    char_patterns = []
-    for i in range(len(clean_text) - 1):
-        char_patterns.append(clean_text[i:i+2])  # Bigrams
-    
-    for i in range(len(clean_text) - 2):
-        char_patterns.append(clean_text[i:i+3])  # Trigrams
-    
-    # Get top character patterns
-    pattern_counts = Counter(char_patterns) if char_patterns else Counter()
-    top_patterns = pattern_counts.most_common(200)
-    
-    for i, (pattern, count) in enumerate(top_patterns):
-        if i < 200:
-            features[135 + i] = count / max(len(char_patterns), 1)
-    
-    # 5. Language-specific features (features 335-384) - 50 features
-    tagalog_words = [
-        "ako", "ikaw", "siya", "kami", "kayo", "sila", "ang", "ng", "sa", "si",
-        "mga", "ay", "at", "na", "pa", "po", "opo", "hindi", "oo", "wala",
-        "may", "meron", "kung", "kapag", "para", "dahil", "kasi", "pero",
-        "nakita", "narinig", "nangyari", "ginawa", "sinabi", "pumunta",
-        "dumating", "umalis", "kumuha", "binigay", "tinanong", "sumagot",
-        "pera", "kotse", "bahay", "tao", "bata", "lalaki", "babae", "matanda",
-        "gabi", "umaga", "hapon", "araw"
-    ]
+    def get_many(self, keys):
+        found = self.backend.get_many(keys) if self.backend is not None else {}
+        with self._lock:
+            self._hits += len(found)
+            self._misses += len(keys) - len(found)
+        return found
+    
+    def set_many(self, values):
+        if self.backend is not None and values:
+            self.backend.set_many(values)
+    
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+    
+    def get_stats(self):
+        """Get hit/miss counters for the ML metrics"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "backend": type(self.backend).__name__ if self.backend is not None else None,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+        if isinstance(self.backend, LocalCacheBackend):
+            stats["entries"] = len(self.backend)
+        return stats
+
+
+def _create_cache_backend(name):
+    """Create the prediction cache backend configured by name"""
+    if name == "django":
+        return DjangoCacheBackend()
+    if name == "local":
+        return LocalCacheBackend()
+    return None
+
+
+prediction_cache = PredictionCache(_create_cache_backend(PREDICTION_CACHE_BACKEND))
+
+
+def configure_prediction_cache(backend):
+    """Swap the prediction cache backend ("local", "django", "none" or a backend object)"""
+    prediction_cache.backend = _create_cache_backend(backend) if isinstance(backend, str) else backend
+
+
+@pipeline_metrics.timed('classify')
+def classify_reports(rows, return_probabilities=False, workers=None, model_name=None):
+    """
+    Extract features and predict categories for many reports, using the prediction cache
+    
+    Only reports missing from the cache go through feature extraction and
+    (batched) inference.
+    
+    Args:
+        rows (iterable): (title, description, incident_type, translated_text) tuples
+        return_probabilities: If True, include all probabilities in each prediction
+        workers (int): Process pool size for feature extraction
+        model_name: Registered model to use (defaults to the registry's default model)
+        
+    Returns:
+        list: (features, prediction) tuples in the order of rows
+    """
+    model_version = get_model_version(model_name)
+    if model_version is None:
+        raise ValueError("Model not loaded. Cannot make predictions.")
     
-    for i, word in enumerate(tagalog_words[:50]):
-        count = combined_text.count(word)
-        features[335 + i] = count / max(word_count, 1)
+    rows = [tuple(row) for row in rows]
+    keys = [PredictionCache.make_key(*row, model_version) for row in rows]
+    with pipeline_metrics.time('cache_lookup'):
+        entries = prediction_cache.get_many(list(dict.fromkeys(keys)))
+    pipeline_metrics.increment('reports_classified', len(rows))
     
-    # Fill remaining features with meaningful text analysis
-    # 6. Severity indicators (features 385-484)
-    severity_words = ["urgent", "emergency", "serious", "critical", "help", "asap"]
-    for i, word in enumerate(severity_words):
-        if i + 385 < 544:
-            features[385 + i] = combined_text.count(word) / max(word_count, 1)
+    missing = list(dict.fromkeys(key for key in keys if key not in entries))
+    if missing:
+        first_row = {}
+        for key, row in zip(keys, rows):
+            first_row.setdefault(key, row)
+        
+        features, over_budget = extract_text_features_batch(
+            [first_row[key] for key in missing], workers=workers, return_over_budget=True
+        )
+        predictions = predict_incident_category(features, True, model_name)
+        computed = {key: (features[i].copy(), predictions[i]) for i, key in enumerate(missing)}
+        # Over-budget vectors depend on load at the time, so they are not cached
+        prediction_cache.set_many({key: computed[key] for i, key in enumerate(missing) if not over_budget[i]})
+        entries.update(computed)
     
-    # 7. Statistical features (features 485-543)
-    if word_count > 0:
-        features[485] = len([w for w in text_words if len(w) > 6]) / word_count  # Long words ratio
-        features[486] = len([w for w in text_words if len(w) <= 3]) / word_count  # Short words ratio
-        features[487] = np.mean([len(w) for w in text_words]) if text_words else 0  # Average word length
+    results = []
+    for key in keys:
+        features, prediction = entries[key]
+        prediction = dict(prediction)
+        if not return_probabilities:
+            prediction.pop('all_probabilities', None)
+            prediction.pop('top_5_predictions', None)
+        results.append((features.copy(), prediction))
     
-    # Fill any remaining features with normalized text hash
-    text_hash = abs(hash(combined_text)) % 100000
-    for i in range(488, 544):
-        features[i] = ((text_hash + i) % 1000) / 1000.0  # Normalized hash features
+    return results
+
+
+def classify_report(title, description, incident_type, translated_text, return_probabilities=False, model_name=None):
+    """
+    Extract features and predict the category of one report, using the prediction cache
     
-    return features.astype(np.float32)
+    Returns:
+        tuple: (features, prediction)
+    """
+    row = (title, description, incident_type, translated_text)
+    return classify_reports([row], return_probabilities, model_name=model_name)[0]
+
 
 def preprocess_text_for_prediction(text):
     """
@@ -424,4 +2993,140 @@ def classify_incident_text(text, return_probabilities=False):
     features = preprocess_text_for_prediction(text)
     
     # Make prediction
-    return predict_incident_category(features, return_probabilities)
\ No newline at end of file
+    return predict_incident_category(features, return_probabilities)
+
+
+def _converter_interpreter(source, preserve_all_tensors=False):
+    """Create an interpreter without delegates, so every op and constant tensor stays visible"""
+    return tflite.Interpreter(
+        model_content=source.content,
+        experimental_op_resolver_type=_op_resolver_types().BUILTIN_WITHOUT_DEFAULT_DELEGATES,
+        experimental_preserve_all_tensors=preserve_all_tensors,
+    )
+
+
+def convert_tflite_to_numpy(tflite_path, npz_path=None):
+    """
+    Extract the weights and ops of a float TFLite model into an .npz for the NumPy engine
+    
+    TFLite does not expose an op's fused activation, so each FULLY_CONNECTED
+    op is run once on random input and the activation that reproduces its
+    output is recorded. Needs tflite-runtime or tensorflow (once, at conversion).
+    
+    Args:
+        tflite_path: Path of the .tflite model
+        npz_path: Output path (defaults to the .tflite path with an .npz suffix)
+        
+    Returns:
+        Path: The written .npz file
+    """
+    if not load_runtime():
+        raise ValueError("Converting a model needs tflite-runtime or tensorflow")
+    
+    tflite_path = Path(tflite_path)
+    npz_path = Path(npz_path) if npz_path else tflite_path.with_suffix('.npz')
+    source = ModelSource(tflite_path, use_mmap=False)
+    
+    interpreter = _converter_interpreter(source, preserve_all_tensors=True)
+    interpreter.allocate_tensors()
+    input_detail = interpreter.get_input_details()[0]
+    output_detail = interpreter.get_output_details()[0]
+    # There is no public API listing ops; _get_ops_details is what the TFLite analyzer uses
+    ops = interpreter._get_ops_details()
+    tensors = {tensor['index']: tensor for tensor in interpreter.get_tensor_details()}
+    
+    if len(interpreter.get_input_details()) != 1 or len(interpreter.get_output_details()) != 1:
+        raise ValueError("Only models with one input and one output can be converted")
+    for tensor in tensors.values():
+        if tensor['quantization'][0] != 0:
+            raise ValueError(f"Quantized tensor {tensor['name']} is not supported by the NumPy engine")
+    
+    unsupported = sorted({op['op_name'] for op in ops} - set(NUMPY_OPS))
+    if unsupported:
+        raise ValueError(f"Ops not supported by the NumPy engine: {', '.join(unsupported)}")
+    
+    # Constants are the tensors that neither the input nor any op produces
+    produced = {input_detail['index']} | {int(index) for op in ops for index in op['outputs']}
+    constants = {
+        int(index): interpreter.get_tensor(int(index)).copy()
+        for op in ops for index in op['inputs']
+        if index >= 0 and int(index) not in produced
+    }
+    
+    # Run random input through the model to identify fused activations
+    probe = np.random.default_rng(0).normal(size=input_detail['shape']).astype(input_detail['dtype'])
+    interpreter.set_tensor(input_detail['index'], probe)
+    interpreter.invoke()
+    
+    graph_ops = []
+    for op in ops:
+        graph_op = {
+            "op": op['op_name'],
+            "inputs": [int(index) for index in op['inputs']],
+            "outputs": [int(index) for index in op['outputs']],
+        }
+        if op['op_name'] == 'RESHAPE':
+            graph_op["shape"] = tensors[int(op['outputs'][0])]['shape'].tolist()
+        if op['op_name'] in ('FULLY_CONNECTED', 'ADD', 'MUL'):
+            values = {index: interpreter.get_tensor(index) for index in graph_op['inputs'] if index >= 0}
+            expected = interpreter.get_tensor(graph_op['outputs'][0])
+            inputs = [values.get(index) for index in graph_op['inputs']]
+            for activation in ("NONE", "RELU", "RELU6", "RELU_N1_TO_1", "TANH", "LOGISTIC"):
+                graph_op["activation"] = activation
+                output = NUMPY_OPS[op['op_name']](graph_op, inputs)
+                if np.allclose(output.reshape(expected.shape), expected, rtol=1e-4, atol=1e-5):
+                    break
+            else:
+                raise ValueError(f"Could not identify the fused activation of op {op['index']} ({op['op_name']})")
+        graph_ops.append(graph_op)
+    
+    def describe(detail):
+        return {
+            "name": detail['name'],
+            "index": int(detail['index']),
+            "shape": detail['shape'].tolist(),
+            "dtype": np.dtype(detail['dtype']).name,
+        }
+    
+    graph = {
+        "format_version": NUMPY_MODEL_FORMAT,
+        "source_version": source.version,
+        "input": describe(input_detail),
+        "output": describe(output_detail),
+        "ops": graph_ops,
+    }
+    
+    # Write then rename so a running process never loads a torn file
+    temp_path = npz_path.with_name(npz_path.name + '.tmp')
+    with open(temp_path, 'wb') as f:
+        np.savez(f, graph=np.array(json.dumps(graph)), **{f"t{index}": array for index, array in constants.items()})
+    temp_path.replace(npz_path)
+    return npz_path
+
+
+def check_numpy_parity(tflite_path, npz_path, rows=256, seed=0):
+    """
+    Compare the NumPy engine's output with TFLite's on random feature rows
+    
+    Returns:
+        dict: rows compared, max absolute difference and argmax agreement
+    """
+    if not load_runtime():
+        raise ValueError("Checking parity needs tflite-runtime or tensorflow")
+    
+    manager = MLModelManager(pool_size=1, num_threads=1)
+    reference = LoadedModel(ModelSource(tflite_path, use_mmap=False), 1, 1)
+    candidate = NumpyModel(ModelSource(npz_path, use_mmap=False))
+    
+    # Feature vectors are non-negative counts and ratios; include an all-zero row
+    shape = (rows,) + tuple(reference.input_details[0]['shape'][1:])
+    features = np.random.default_rng(seed).exponential(size=shape).astype(np.float32)
+    features[0] = 0
+    
+    expected = manager._predict_with(reference, features)
+    actual = manager._predict_with(candidate, features)
+    return {
+        "rows": rows,
+        "max_abs_diff": float(np.max(np.abs(expected - actual))) if rows else 0.0,
+        "argmax_agreement": float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1))) if rows else 1.0,
+    }
@@ -103,3 +103,37 @@ DEFAULT_FROM_EMAIL = 'noreply@reportit.com'
 
 # Frontend URL (for password reset links)
 FRONTEND_URL = 'http://localhost:3000'
+
+# ML Configuration
+# Load the TFLite model when the app starts instead of on the first prediction
+ML_PRELOAD_MODEL = os.environ.get("ML_PRELOAD_MODEL", "false").lower() == "true"
+
+# Classify new reports in a background thread of each web process. Set to
+# false when running `manage.py process_ml_queue` as a separate worker.
+ML_QUEUE_IN_PROCESS = os.environ.get("ML_QUEUE_IN_PROCESS", "true").lower() == "true"
+ML_QUEUE_BATCH_SIZE = int(os.environ.get("ML_QUEUE_BATCH_SIZE", 32))
+ML_QUEUE_POLL_SECONDS = float(os.environ.get("ML_QUEUE_POLL_SECONDS", 2))
+
+# Ingest pipeline (reports.ingest_pipeline): records per chunk, and chunks
+# buffered between two stages of a threaded pipeline before the earlier
+# stage waits
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", 200))
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 2))
+
+# Near-duplicate detection: reports count as duplicates when their text is
+# similar (shingle Jaccard or cosine) and they were reported within the
+# radius and time window of each other
+DUPLICATE_RADIUS_KM = float(os.environ.get("DUPLICATE_RADIUS_KM", 1.0))
+DUPLICATE_WINDOW_HOURS = float(os.environ.get("DUPLICATE_WINDOW_HOURS", 72))
+DUPLICATE_MIN_SIMILARITY = float(os.environ.get("DUPLICATE_MIN_SIMILARITY", 0.3))
+
+# Minimum cosine similarity of reports returned by the similar reports endpoint
+SIMILAR_REPORTS_MIN_SIMILARITY = float(os.environ.get("SIMILAR_REPORTS_MIN_SIMILARITY", 0.3))
+
+# Build the in-memory report indexes in the background when the app starts,
+# instead of on the first request that needs them
+PRELOAD_REPORT_INDEXES = os.environ.get("PRELOAD_REPORT_INDEXES", "false").lower() == "true"
+
+# Token required by the ml/metrics/scrape/ endpoint (X-Metrics-Token header).
+# Without a token, only scrapes from localhost are allowed.
+ML_METRICS_SCRAPE_TOKEN = os.environ.get("ML_METRICS_SCRAPE_TOKEN", "")
@@ -1,5 +1,25 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
+
+    def ready(self):
+        # Keep the in-memory duplicate and similarity indexes current as reports change
+        from django.db.models.signals import post_delete, post_save
+        from . import duplicate_index, similarity_index
+        from .models import Report
+        post_save.connect(duplicate_index.report_saved, sender=Report, dispatch_uid='duplicate_index_saved')
+        post_delete.connect(duplicate_index.report_deleted, sender=Report, dispatch_uid='duplicate_index_deleted')
+        post_save.connect(similarity_index.report_saved, sender=Report, dispatch_uid='similarity_index_saved')
+        post_delete.connect(similarity_index.report_deleted, sender=Report, dispatch_uid='similarity_index_deleted')
+        
+        if getattr(settings, 'PRELOAD_REPORT_INDEXES', False):
+            duplicate_index.get_duplicate_index().start_build()
+            similarity_index.get_similarity_index().start_build()
+        
+        # The model is loaded lazily on first use unless preloading is enabled
+        if getattr(settings, 'ML_PRELOAD_MODEL', False):
+            import ml_utils
+            ml_utils.warm_up_model()
@@ -0,0 +1,393 @@
+"""
+Near-duplicate detection for reports with MinHash LSH and a space-time window
+
+Every report's normalized title and description is split into character
+shingles and summarized by a MinHash signature. The signatures are banded
+into an LSH table, so finding candidates costs one dictionary lookup per
+band instead of a comparison with every report. Candidates are then kept
+only if they were reported close by (haversine distance) and close in time,
+and are scored with their exact shingle Jaccard and cosine similarity.
+
+The index lives in memory in each web process. It is updated by the Report
+post_save/post_delete signals and catches up with reports saved by other
+processes before answering a query; candidates deleted by other processes
+are found missing from the database and dropped.
+
+Requests never build the index themselves: they start a build in a background
+thread and get IndexNotReady until it is done. Set PRELOAD_REPORT_INDEXES to
+start the build when the app starts.
+"""
+import hashlib
+import re
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+import text_normalization
+from .models import Report
+
+# MinHash permutations, split into LSH bands of rows. Pairs with a shingle
+# Jaccard similarity of about (1 / bands) ** (1 / rows) = 0.42 and above are
+# likely to share a band.
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+# Characters per shingle
+SHINGLE_SIZE = 5
+
+# Characters of a report's text that are shingled
+MAX_SHINGLE_CHARS = 10000
+
+# Seconds between checks for reports saved by other processes
+SYNC_SECONDS = 5
+
+# Fields needed to index a report
+INDEX_FIELDS = ['id', 'title', 'description', 'latitude', 'longitude', 'created_at', 'updated_at']
+
+EARTH_RADIUS_KM = 6371.0088
+
+_rng = np.random.default_rng(20240611)
+# Multiply-shift hashing: odd 64-bit multipliers, top 32 bits of the product
+_HASH_MULTIPLIERS = _rng.integers(1, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_HASH_OFFSETS = _rng.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64)
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def get_radius_km():
+    return getattr(settings, 'DUPLICATE_RADIUS_KM', 1.0)
+
+
+def get_window_hours():
+    return getattr(settings, 'DUPLICATE_WINDOW_HOURS', 72)
+
+
+def get_min_similarity():
+    return getattr(settings, 'DUPLICATE_MIN_SIMILARITY', 0.3)
+
+
+class IndexNotReady(Exception):
+    """The index is being built in the background"""
+
+
+def normalize_report_text(title, description):
+    """Lower-case the report text and reduce it to words separated by single spaces"""
+    text = text_normalization.normalize_text(f"{title or ''} {description or ''}").lower()
+    return _NON_WORD_RE.sub(' ', text).strip()[:MAX_SHINGLE_CHARS]
+
+
+def shingle_counts(text):
+    """
+    Hash the character shingles of normalized text
+    
+    Returns:
+        tuple: (sorted unique 32-bit shingle hashes as uint64, their counts)
+    """
+    if not text:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+    
+    codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    size = min(SHINGLE_SIZE, len(codepoints))
+    count = len(codepoints) - size + 1
+    
+    # Polynomial rolling hash of each window (wrapping uint64 arithmetic), folded to 32 bits
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * np.uint64(1000003) + codepoints[offset:offset + count]
+    hashes = (hashes >> np.uint64(32)) ^ (hashes & np.uint64(0xFFFFFFFF))
+    
+    return np.unique(hashes, return_counts=True)
+
+
+def minhash_signature(shingles):
+    """Get the MinHash signature (NUM_PERMUTATIONS uint32 values) of a set of shingle hashes"""
+    if not len(shingles):
+        return np.full(NUM_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint32)
+    products = _HASH_MULTIPLIERS[:, np.newaxis] * shingles[np.newaxis, :] + _HASH_OFFSETS[:, np.newaxis]
+    return (products >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def similarity_scores(a, b):
+    """
+    Exact similarity of two shingle_counts() results
+    
+    Returns:
+        tuple: (Jaccard similarity of the shingle sets, cosine similarity of the shingle counts)
+    """
+    shingles_a, counts_a = a
+    shingles_b, counts_b = b
+    if not len(shingles_a) or not len(shingles_b):
+        return 0.0, 0.0
+    
+    common, index_a, index_b = np.intersect1d(shingles_a, shingles_b, assume_unique=True, return_indices=True)
+    jaccard = len(common) / (len(shingles_a) + len(shingles_b) - len(common))
+    dot = float(np.dot(counts_a[index_a], counts_b[index_b]))
+    cosine = dot / (np.linalg.norm(counts_a) * np.linalg.norm(counts_b))
+    return jaccard, cosine
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres (vectorized over numpy arrays)"""
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _text_digest(title, description):
+    return hashlib.blake2b(f"{title}\0{description}".encode('utf-8'), digest_size=8).digest()
+
+
+class DuplicateIndex:
+    """
+    In-memory MinHash LSH index of all reports
+    
+    Only signatures, locations and timestamps are kept in memory; exact
+    scores are computed from the candidates' text, read from the database.
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._entries = {}
+        self._bands = [{} for _ in range(LSH_BANDS)]
+        self._synced_until = None
+        self._next_sync = 0.0
+        self._build_thread = None
+        self._build_lock = threading.Lock()
+        self.build_seconds = None
+        self.queries = 0
+        self.candidates = 0
+        self.pruned = 0
+    
+    def _band_keys(self, signature):
+        return [signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes() for band in range(LSH_BANDS)]
+    
+    def _remove(self, report_id):
+        entry = self._entries.pop(report_id, None)
+        if entry is None:
+            return
+        for band, key in zip(self._bands, entry['band_keys']):
+            members = band.get(key)
+            if members is not None:
+                members.discard(report_id)
+                if not members:
+                    del band[key]
+    
+    def _add(self, report):
+        digest = _text_digest(report.title, report.description)
+        entry = self._entries.get(report.pk)
+        if entry is not None and entry['digest'] == digest:
+            # Text unchanged (e.g. a status update): only refresh the location
+            entry['latitude'] = report.latitude
+            entry['longitude'] = report.longitude
+            return
+        
+        self._remove(report.pk)
+        shingles, _ = shingle_counts(normalize_report_text(report.title, report.description))
+        band_keys = self._band_keys(minhash_signature(shingles)) if len(shingles) else []
+        self._entries[report.pk] = {
+            'digest': digest,
+            'band_keys': band_keys,
+            'latitude': report.latitude,
+            'longitude': report.longitude,
+            'created_at': report.created_at,
+        }
+        for band, key in zip(self._bands, band_keys):
+            band.setdefault(key, set()).add(report.pk)
+    
+    def _track_sync(self, report):
+        if report.updated_at and (self._synced_until is None or report.updated_at > self._synced_until):
+            self._synced_until = report.updated_at
+    
+    def ensure_built(self, wait=True):
+        """
+        Index every report on first use
+        
+        With wait=False, a missing index is built in a background thread and
+        IndexNotReady is raised instead.
+        """
+        if self._built:
+            return
+        if not wait:
+            self.start_build()
+            raise IndexNotReady()
+        with self._lock:
+            if self._built:
+                return
+            started = time.perf_counter()
+            for report in Report.objects.only(*INDEX_FIELDS).iterator(chunk_size=500):
+                self._add(report)
+                self._track_sync(report)
+            self.build_seconds = time.perf_counter() - started
+            self._next_sync = time.monotonic() + SYNC_SECONDS
+            self._built = True
+    
+    def _build_in_background(self):
+        try:
+            self.ensure_built()
+        except Exception as e:
+            print(f"Duplicate index build failed: {e}")
+        finally:
+            close_old_connections()
+    
+    def start_build(self):
+        """Build the index in a background thread, unless it is built or being built"""
+        with self._build_lock:
+            if self._built or (self._build_thread is not None and self._build_thread.is_alive()):
+                return
+            self._build_thread = threading.Thread(
+                target=self._build_in_background, name='duplicate-index-build', daemon=True
+            )
+            self._build_thread.start()
+    
+    def sync(self, force=False, wait=True):
+        """Index reports created or updated by other processes since the last sync"""
+        self.ensure_built(wait)
+        if not force and time.monotonic() < self._next_sync:
+            return
+        with self._lock:
+            queryset = Report.objects.only(*INDEX_FIELDS)
+            if self._synced_until is not None:
+                queryset = queryset.filter(updated_at__gte=self._synced_until)
+            for report in queryset.iterator(chunk_size=500):
+                self._add(report)
+                self._track_sync(report)
+            self._next_sync = time.monotonic() + SYNC_SECONDS
+    
+    def update(self, report):
+        """Index a created or updated report (no-op until the index is built)"""
+        if not self._built:
+            return
+        with self._lock:
+            self._add(report)
+            self._track_sync(report)
+    
+    def remove(self, report_id):
+        """Remove a deleted report from the index"""
+        with self._lock:
+            self._remove(report_id)
+    
+    def find_duplicates(self, title, description, latitude=None, longitude=None, reported_at=None,
+                        exclude_id=None, radius_km=None, window_hours=None, min_similarity=None,
+                        limit=10, queryset=None, wait=True):
+        """
+        Find reports that are likely duplicates of the given report text
+        
+        Args:
+            title, description: Text of the report to check
+            latitude, longitude: Location of the report; without it, distance is not checked
+            reported_at: Time of the report (defaults to now)
+            exclude_id: Report to leave out (the report itself)
+            radius_km: Maximum distance (defaults to DUPLICATE_RADIUS_KM)
+            window_hours: Maximum time between the reports (defaults to DUPLICATE_WINDOW_HOURS)
+            min_similarity: Minimum Jaccard or cosine similarity (defaults to DUPLICATE_MIN_SIMILARITY)
+            limit: Maximum number of results
+            queryset: Reports the caller may see (defaults to all reports)
+            wait: If False, raise IndexNotReady while the index is being built
+        
+        Returns:
+            list: Dicts with the report and its jaccard, cosine, distance_km and
+            hours_apart, most similar first
+        """
+        self.sync(wait=wait)
+        radius_km = get_radius_km() if radius_km is None else radius_km
+        window_hours = get_window_hours() if window_hours is None else window_hours
+        min_similarity = get_min_similarity() if min_similarity is None else min_similarity
+        reported_at = reported_at or timezone.now()
+        
+        query = shingle_counts(normalize_report_text(title, description))
+        if not len(query[0]):
+            return []
+        
+        with self._lock:
+            candidate_ids = set()
+            for band, key in zip(self._bands, self._band_keys(minhash_signature(query[0]))):
+                candidate_ids.update(band.get(key, ()))
+            candidate_ids.discard(exclude_id)
+            
+            window = timedelta(hours=window_hours)
+            candidates = [
+                (report_id, entry) for report_id, entry in ((i, self._entries[i]) for i in candidate_ids)
+                if abs(entry['created_at'] - reported_at) <= window
+            ]
+            self.queries += 1
+            self.candidates += len(candidates)
+        
+        distances = {}
+        if candidates and latitude is not None and longitude is not None:
+            lat = np.array([entry['latitude'] for _, entry in candidates], dtype=np.float64)
+            lon = np.array([entry['longitude'] for _, entry in candidates], dtype=np.float64)
+            distance = haversine_km(float(latitude), float(longitude), lat, lon)
+            distances = {report_id: float(d) for (report_id, _), d in zip(candidates, distance)}
+            candidates = [(report_id, entry) for report_id, entry in candidates if distances[report_id] <= radius_km]
+        
+        if not candidates:
+            return []
+        
+        queryset = Report.objects.all() if queryset is None else queryset
+        reports = list(queryset.filter(pk__in=[report_id for report_id, _ in candidates]))
+        
+        # Candidates missing from the results were deleted by another process
+        # or are outside the caller's queryset
+        missing = {report_id for report_id, _ in candidates} - {report.pk for report in reports}
+        if missing:
+            deleted = missing - set(Report.objects.filter(pk__in=missing).values_list('pk', flat=True))
+            with self._lock:
+                for report_id in deleted:
+                    self._remove(report_id)
+                self.pruned += len(deleted)
+        
+        results = []
+        for report in reports:
+            jaccard, cosine = similarity_scores(query, shingle_counts(normalize_report_text(report.title, report.description)))
+            if max(jaccard, cosine) < min_similarity:
+                continue
+            results.append({
+                'report': report,
+                'jaccard': jaccard,
+                'cosine': cosine,
+                'distance_km': distances.get(report.pk),
+                'hours_apart': abs((report.created_at - reported_at).total_seconds()) / 3600,
+            })
+        
+        results.sort(key=lambda result: (result['jaccard'], result['cosine']), reverse=True)
+        return results[:limit]
+    
+    def get_stats(self):
+        """Get the size of the index and the average number of candidates per query"""
+        with self._lock:
+            return {
+                'built': self._built,
+                'building': self._build_thread is not None and self._build_thread.is_alive(),
+                'reports': len(self._entries),
+                'buckets': sum(len(band) for band in self._bands),
+                'build_seconds': self.build_seconds,
+                'queries': self.queries,
+                'avg_candidates': self.candidates / self.queries if self.queries else 0.0,
+                'pruned': self.pruned,
+            }
+
+
+# Index of this process
+duplicate_index = DuplicateIndex()
+
+
+def get_duplicate_index():
+    """Get the duplicate index of this process"""
+    return duplicate_index
+
+
+def report_saved(sender, instance, **kwargs):
+    """post_save handler keeping the index current"""
+    duplicate_index.update(instance)
+
+
+def report_deleted(sender, instance, **kwargs):
+    """post_delete handler keeping the index current"""
+    duplicate_index.remove(instance.pk)
@@ -0,0 +1,198 @@
+"""
+Persistent store of ML feature vectors for reports
+
+Vectors are kept as compact float32 blobs (ReportFeatureVector) tagged with
+the extractor version and a digest of the text they were computed from.
+They are recomputed lazily, the next time they are requested after the
+report text or the extractor changes, so duplicate detection, exports and
+re-scoring can read vectors in bulk instead of re-extracting them.
+"""
+import hashlib
+import json
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+import ml_utils
+from . import translation_memory
+from .models import Report, ReportFeatureVector
+
+# Reports looked up per query when reading or refreshing vectors
+FEATURE_STORE_CHUNK_SIZE = 500
+
+# Fields needed to rebuild a report's feature vector
+FEATURE_SOURCE_FIELDS = ['id', 'title', 'description', 'incident_type']
+
+
+def report_feature_inputs(report):
+    """Get the (title, description, incident_type, translated_text) tuple for a report"""
+    return report_feature_inputs_batch([report])[0]
+
+
+def report_feature_inputs_batch(reports):
+    """Get the feature input tuples of many reports, with one translation memory lookup"""
+    translations = translation_memory.translate_reports((report.title, report.description) for report in reports)
+    return [
+        (report.title, report.description, report.incident_type, translated_text)
+        for report, (translated_text, _) in zip(reports, translations)
+    ]
+
+
+def text_hash(inputs):
+    """Digest of the text a feature vector was computed from"""
+    return hashlib.sha256(json.dumps(list(inputs)).encode('utf-8')).hexdigest()
+
+
+def encode_vector(vector):
+    """Serialize a feature vector to little-endian float32 bytes"""
+    return np.asarray(vector, dtype='<f4').tobytes()
+
+
+def decode_vectors(blobs):
+    """Deserialize float32 blobs into an (N, 544) matrix"""
+    blobs = [bytes(blob) for blob in blobs]
+    if not blobs:
+        return np.zeros((0, ml_utils.FEATURE_VECTOR_SIZE), dtype=np.float32)
+    return np.frombuffer(b''.join(blobs), dtype='<f4').reshape(len(blobs), -1).astype(np.float32)
+
+
+def _is_current(entry, digest):
+    return (
+        entry is not None
+        and entry.extractor_version == ml_utils.FEATURE_EXTRACTOR_VERSION
+        and entry.extractor_tag == ml_utils.feature_extractor_tag()
+        and entry.text_hash == digest
+    )
+
+
+def _save_vectors(reports, vectors, digests, stored):
+    """Create or update the stored vectors of reports"""
+    now = timezone.now()
+    extractor_tag = ml_utils.feature_extractor_tag()
+    to_create = []
+    to_update = []
+    
+    for report, vector, digest in zip(reports, vectors, digests):
+        entry = stored.get(report.pk)
+        if entry is None:
+            to_create.append(ReportFeatureVector(
+                report_id=report.pk,
+                vector=encode_vector(vector),
+                extractor_version=ml_utils.FEATURE_EXTRACTOR_VERSION,
+                extractor_tag=extractor_tag,
+                text_hash=digest,
+                updated_at=now,
+            ))
+        else:
+            entry.vector = encode_vector(vector)
+            entry.extractor_version = ml_utils.FEATURE_EXTRACTOR_VERSION
+            entry.extractor_tag = extractor_tag
+            entry.text_hash = digest
+            entry.updated_at = now
+            to_update.append(entry)
+    
+    with transaction.atomic():
+        # Another worker may have stored the same vector concurrently
+        ReportFeatureVector.objects.bulk_create(to_create, ignore_conflicts=True)
+        ReportFeatureVector.objects.bulk_update(
+            to_update, ['vector', 'extractor_version', 'extractor_tag', 'text_hash', 'updated_at']
+        )
+
+
+def _get_chunk_vectors(reports, workers, inputs=None):
+    inputs = report_feature_inputs_batch(reports) if inputs is None else inputs
+    digests = [text_hash(row) for row in inputs]
+    stored = {
+        entry.report_id: entry
+        for entry in ReportFeatureVector.objects.filter(report_id__in=[report.pk for report in reports])
+    }
+    
+    matrix = np.zeros((len(reports), ml_utils.FEATURE_VECTOR_SIZE), dtype=np.float32)
+    current = []
+    stale = []
+    for row, report in enumerate(reports):
+        (current if _is_current(stored.get(report.pk), digests[row]) else stale).append(row)
+    
+    if current:
+        matrix[current] = decode_vectors(stored[reports[row].pk].vector for row in current)
+    
+    if stale:
+        matrix[stale], over_budget = ml_utils.extract_text_features_batch(
+            [inputs[row] for row in stale], workers=workers, return_over_budget=True
+        )
+        # Over-budget vectors depend on load at the time; recompute them next time
+        keep = [row for row, skipped in zip(stale, over_budget) if not skipped]
+        _save_vectors([reports[row] for row in keep], matrix[keep], [digests[row] for row in keep], stored)
+    
+    return matrix
+
+
+def get_feature_vectors(reports, workers=None, inputs=None):
+    """
+    Get the feature vectors of reports, computing and storing missing or stale ones
+    
+    Args:
+        reports (iterable): Report instances (title, description and incident_type are used)
+        workers (int): Process pool size for feature extraction
+        inputs (list): Feature input tuples of the reports, when the caller
+            already translated them (see report_feature_inputs_batch)
+        
+    Returns:
+        np.ndarray: (len(reports), 544) float32 matrix in the order of reports
+    """
+    reports = list(reports)
+    chunks = [
+        _get_chunk_vectors(
+            reports[start:start + FEATURE_STORE_CHUNK_SIZE], workers,
+            None if inputs is None else inputs[start:start + FEATURE_STORE_CHUNK_SIZE]
+        )
+        for start in range(0, len(reports), FEATURE_STORE_CHUNK_SIZE)
+    ]
+    if not chunks:
+        return np.zeros((0, ml_utils.FEATURE_VECTOR_SIZE), dtype=np.float32)
+    return np.concatenate(chunks, axis=0)
+
+
+def get_feature_vector(report):
+    """Get the feature vector of a single report"""
+    return get_feature_vectors([report])[0]
+
+
+def iter_feature_matrix(queryset=None, chunk_size=FEATURE_STORE_CHUNK_SIZE, workers=None):
+    """
+    Stream feature vectors for a queryset of reports in id order
+    
+    Yields:
+        tuple: (report ids as an int64 array, (n, 544) float32 matrix) per chunk
+    """
+    queryset = Report.objects.all() if queryset is None else queryset
+    queryset = queryset.only(*FEATURE_SOURCE_FIELDS).order_by('pk')
+    
+    chunk = []
+    for report in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(report)
+        if len(chunk) >= chunk_size:
+            yield np.array([report.pk for report in chunk], dtype=np.int64), get_feature_vectors(chunk, workers)
+            chunk = []
+    
+    if chunk:
+        yield np.array([report.pk for report in chunk], dtype=np.int64), get_feature_vectors(chunk, workers)
+
+
+def load_feature_matrix(queryset=None, workers=None):
+    """
+    Load feature vectors for a queryset of reports into one matrix
+    
+    Returns:
+        tuple: (report ids as an int64 array, (N, 544) float32 matrix)
+    """
+    ids = []
+    matrices = []
+    for chunk_ids, matrix in iter_feature_matrix(queryset, workers=workers):
+        ids.append(chunk_ids)
+        matrices.append(matrix)
+    
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, ml_utils.FEATURE_VECTOR_SIZE), dtype=np.float32)
+    return np.concatenate(ids), np.concatenate(matrices, axis=0)
@@ -0,0 +1,236 @@
+"""
+Standalone inference server on a Unix domain socket
+
+Owns the model interpreters for every web worker on the host. Requests that
+arrive within a short window are merged into one micro-batch per model, so
+concurrent callers share a single interpreter invocation.
+See ml_utils.InferenceClient for the client side of the protocol.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import ml_utils
+
+# Maximum rows merged into one micro-batch
+DEFAULT_MAX_BATCH = 256
+
+# Seconds to wait for more requests after the first one of a batch
+DEFAULT_BATCH_WINDOW = 0.005
+
+
+def predict_batch(model_name, features, return_probabilities):
+    """
+    Run one micro-batch on a model's manager
+
+    Goes straight to the manager: requests are already batched here, so the
+    registry's in-process PredictionCoalescer would only batch them again.
+    """
+    manager = ml_utils.model_registry.acquire(model_name)
+    if not manager.model_loaded:
+        raise ValueError("ML model is not available")
+    return manager.predict_incident_category(features, return_probabilities)
+
+
+class MicroBatcher:
+    """Merge concurrent predict requests for one model into batched inference calls"""
+
+    def __init__(self, model_name, executor, max_batch=DEFAULT_MAX_BATCH, window=DEFAULT_BATCH_WINDOW):
+        self.model_name = model_name
+        self.executor = executor
+        self.max_batch = max_batch
+        self.window = window
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, features, return_probabilities):
+        """Queue feature rows and wait for their predictions"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, return_probabilities, future))
+        self.requests += 1
+        return await future
+
+    async def _collect(self):
+        """Wait for a request, then gather more until the window closes or the batch is full"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        rows = batch[0][0].shape[0]
+        deadline = loop.time() + self.window
+
+        while rows < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0 and self._queue.empty():
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            rows += item[0].shape[0]
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Whatever goes wrong, every caller of the batch gets an answer and
+            # the batcher keeps serving the next one
+            try:
+                await self._run_batch(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        features = np.concatenate([item[0] for item in batch]) if len(batch) > 1 else batch[0][0]
+        return_probabilities = any(item[1] for item in batch)
+
+        predictions = await loop.run_in_executor(
+            self.executor, predict_batch, self.model_name, features, return_probabilities
+        )
+
+        self.batches += 1
+        self.rows += features.shape[0]
+
+        start = 0
+        for rows, wants_probabilities, future in batch:
+            results = predictions[start:start + rows.shape[0]]
+            start += rows.shape[0]
+            if return_probabilities and not wants_probabilities:
+                results = [
+                    {key: value for key, value in result.items()
+                     if key not in ('all_probabilities', 'top_5_predictions')}
+                    for result in results
+                ]
+            if not future.done():
+                future.set_result(results)
+
+    def get_stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+        }
+
+    def close(self):
+        self._task.cancel()
+
+
+class InferenceServer:
+    """Serve predict/status requests on a Unix socket"""
+
+    def __init__(self, socket_path, max_batch=DEFAULT_MAX_BATCH, window=DEFAULT_BATCH_WINDOW, threads=None):
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.window = window
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or ml_utils.INTERPRETER_POOL_SIZE, thread_name_prefix='ml-inference'
+        )
+        self.connections = 0
+        self.started_at = None
+        self._batchers = {}
+
+    def _get_batcher(self, model_name):
+        # Unknown names fail here rather than inside a shared batch
+        ml_utils.model_registry.get_manager(model_name)
+        batcher = self._batchers.get(model_name)
+        if batcher is None:
+            batcher = MicroBatcher(model_name, self.executor, self.max_batch, self.window)
+            self._batchers[model_name] = batcher
+        return batcher
+
+    async def _read_features(self, model_name, header, payload):
+        """Check a predict request's shape against the model input and decode its rows"""
+        manager = ml_utils.model_registry.get_manager(model_name)
+        if not manager.model_loaded:
+            loop = asyncio.get_running_loop()
+            manager = await loop.run_in_executor(self.executor, ml_utils.model_registry.acquire, model_name)
+        input_details = manager.input_details
+        if input_details is None:
+            raise ValueError("ML model is not available")
+
+        rows, cols = int(header['rows']), int(header['cols'])
+        expected = int(input_details[0]['shape'][-1])
+        if cols != expected:
+            raise ValueError(f"Expected {expected} feature columns, got {cols}")
+        if rows < 1 or len(payload) != rows * cols * np.dtype(np.float32).itemsize:
+            raise ValueError(f"Payload does not hold {rows} rows of {cols} float32 values")
+        return np.frombuffer(payload, dtype=np.float32).reshape(rows, cols)
+
+    async def _handle_request(self, header, payload):
+        op = header.get('op')
+        model_name = header.get('model')
+
+        if op == 'predict':
+            features = await self._read_features(model_name, header, payload)
+            predictions = await self._get_batcher(model_name).submit(features, header.get('return_probabilities', False))
+            return {"predictions": predictions}
+
+        if op == 'status':
+            loop = asyncio.get_running_loop()
+            manager = await loop.run_in_executor(self.executor, ml_utils.model_registry.acquire, model_name)
+            return {
+                "model_version": manager.model_version,
+                "uptime_seconds": time.monotonic() - self.started_at,
+                "connections": self.connections,
+                "batchers": {name or 'default': batcher.get_stats() for name, batcher in self._batchers.items()},
+            }
+
+        raise ValueError(f"Unknown op: {op}")
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    frame_header = await reader.readexactly(ml_utils.FRAME_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                header_length, payload_length = ml_utils.decode_frame_header(frame_header)
+                header = json.loads(await reader.readexactly(header_length))
+                payload = await reader.readexactly(payload_length)
+
+                try:
+                    response = await self._handle_request(header, payload)
+                except Exception as e:
+                    response = {"error": str(e)}
+
+                writer.write(ml_utils.encode_frame(response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self, ready=None):
+        """Serve until cancelled"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self.started_at = time.monotonic()
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        if ready:
+            ready()
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for batcher in self._batchers.values():
+                batcher.close()
+            self.executor.shutdown(wait=False)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
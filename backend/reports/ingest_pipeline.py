@@ -0,0 +1,637 @@
+"""
+Staged ingest pipeline: validate -> translate -> features -> predict -> dedupe -> persist
+
+Every path that takes reports in or classifies them builds an IngestPipeline
+from these stages: report creation, process_report_ml, the ML queue, batch
+jobs, `manage.py run_ai_categorization` and `manage.py import_reports`, so
+chunk and queue sizes are tuned in one place.
+
+Records move through the stages in chunks. A stage handles a whole chunk at
+once (one translation memory query, one extraction call, one inference batch
+per model, one transaction); if that raises, the records are retried one at a
+time. A record that fails is marked with the stage and error and skipped by
+the later stages, while the rest of its chunk carries on.
+
+Stages are chained as generators. With threaded=True each stage runs in its
+own thread instead, connected by bounded queues: database reads, feature
+extraction, inference and writes of consecutive chunks overlap, and a slow
+stage blocks the stages before it rather than letting chunks pile up.
+"""
+import queue
+import threading
+import time
+from collections.abc import Mapping
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+import ml_utils
+from . import duplicate_index, feature_store, translation_memory
+from .models import Report
+
+# Report fields written when a prediction is persisted
+ML_RESULT_FIELDS = [
+    'ml_predicted_category', 'ml_confidence', 'ml_processed', 'ml_processed_at',
+    'ml_model_version', 'ml_priority', 'ml_risk_level', 'priority', 'risk_level',
+]
+
+# Fields a person may set, with the field holding the model's suggestion for them
+SUGGESTED_FIELDS = {'priority': 'ml_priority', 'risk_level': 'ml_risk_level'}
+
+# Seconds between checks for a stopped pipeline while waiting on a queue
+QUEUE_POLL_SECONDS = 0.1
+
+
+def get_chunk_size():
+    return getattr(settings, 'INGEST_CHUNK_SIZE', 200)
+
+
+def get_queue_size():
+    return getattr(settings, 'INGEST_QUEUE_SIZE', 2)
+
+
+def prediction_fields(prediction, processed_at):
+    """Get the Report fields storing a prediction and the derived priority/risk level"""
+    priority, risk_level = ml_utils.assess_priority_and_risk(
+        prediction['predicted_category'], prediction['confidence']
+    )
+    # Match the capitalised Report.PRIORITY_CHOICES / RISK_LEVEL_CHOICES values
+    priority, risk_level = priority.capitalize(), risk_level.capitalize()
+    return {
+        'ml_predicted_category': prediction['predicted_category'],
+        'ml_confidence': prediction['confidence'],
+        'ml_processed': True,
+        'ml_processed_at': processed_at,
+        'ml_model_version': prediction.get('model_version') or '',
+        'ml_priority': priority,
+        'ml_risk_level': risk_level,
+        'priority': priority,
+        'risk_level': risk_level,
+    }
+
+
+def apply_prediction(report, prediction, processed_at):
+    """
+    Copy a prediction and the derived priority/risk level onto a report (without saving)
+    
+    priority and risk_level only take the model's suggestion while they are at
+    their default or the previous suggestion; a value set by a person is kept.
+    """
+    fields = prediction_fields(prediction, processed_at)
+    for field, suggestion_field in SUGGESTED_FIELDS.items():
+        current = getattr(report, field)
+        if current not in (Report._meta.get_field(field).default, getattr(report, suggestion_field)):
+            del fields[field]
+    for field, value in fields.items():
+        setattr(report, field, value)
+
+
+class IngestRecord:
+    """
+    A report moving through the pipeline, with what each stage produced
+    
+    Records start either from incoming data (validated into a serializer)
+    or from a stored Report.
+    """
+    
+    def __init__(self, data=None, report=None):
+        self.data = data
+        self.report = report
+        self.serializer = None
+        self.translated_text = None
+        self.is_tagalog = False
+        self.model_name = None
+        self.cache_key = None
+        self.features = None
+        self.prediction = None
+        self.priority = None
+        self.risk_level = None
+        self.duplicates = None
+        self.error = None
+        self.failed_stage = None
+    
+    @property
+    def failed(self):
+        return self.error is not None
+    
+    def get(self, field, default=''):
+        """Get a report field from the stored report or the (validated) incoming data"""
+        if self.report is not None:
+            value = getattr(self.report, field, default)
+        elif self.serializer is not None:
+            value = self.serializer.validated_data.get(field, default)
+        else:
+            value = self.data.get(field, default)
+        return default if value is None else value
+    
+    def feature_inputs(self):
+        """Get the (title, description, incident_type, translated_text) tuple"""
+        return self.get('title'), self.get('description'), self.get('incident_type'), self.translated_text
+
+
+def records_from_data(items):
+    """Wrap incoming report data (dicts) in records"""
+    for data in items:
+        yield IngestRecord(data=data)
+
+
+def records_from_reports(reports):
+    """Wrap stored reports in records"""
+    for report in reports:
+        yield IngestRecord(report=report)
+
+
+def iter_reports(queryset, chunk_size=None, limit=None):
+    """
+    Stream the reports of a queryset in id order, one page query per chunk
+    
+    Pages are fetched by id (pk > last id seen) rather than through one open
+    cursor, so the pipeline's writer threads are never waiting on a long read.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    queryset = queryset.order_by('pk')
+    last_id = None
+    remaining = limit
+    
+    while remaining is None or remaining > 0:
+        page_size = chunk_size if remaining is None else min(chunk_size, remaining)
+        page = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+        page = list(page[:page_size])
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1].pk
+        if remaining is not None:
+            remaining -= len(page)
+
+
+class Stage:
+    """
+    One step of the pipeline, run on the records of each chunk that haven't failed
+    
+    Subclasses implement process(records), marking records that fail on
+    their own with fail(); if process raises, the records are retried one
+    by one to find the ones at fault.
+    """
+    
+    name = None
+    
+    def __init__(self):
+        self.stats = {
+            'chunks': 0,
+            'records': 0,
+            'failed': 0,
+            'seconds': 0.0,
+            # Time spent waiting for the previous stage (threaded pipelines)
+            'wait_seconds': 0.0,
+            # Time spent blocked on the queue to the next stage (backpressure)
+            'blocked_seconds': 0.0,
+        }
+    
+    def process(self, records):
+        raise NotImplementedError
+    
+    def fail(self, record, error):
+        record.error = error
+        record.failed_stage = self.name
+        self.stats['failed'] += 1
+    
+    def run(self, chunk):
+        """Process the records of a chunk that haven't failed, isolating failures per record"""
+        records = [record for record in chunk if not record.failed]
+        started = time.perf_counter()
+        
+        if records:
+            try:
+                self.process(records)
+            except Exception:
+                for record in records:
+                    if record.failed:
+                        continue
+                    try:
+                        self.process([record])
+                    except Exception as e:
+                        self.fail(record, e)
+        
+        elapsed = time.perf_counter() - started
+        self.stats['chunks'] += 1
+        self.stats['records'] += len(records)
+        self.stats['seconds'] += elapsed
+        ml_utils.get_pipeline_metrics().observe(f'ingest_{self.name}', elapsed)
+        return chunk
+    
+    def stream(self, chunks):
+        """Generator running the stage over a stream of chunks"""
+        for chunk in chunks:
+            yield self.run(chunk)
+
+
+class ValidateStage(Stage):
+    """
+    Validate incoming report data with a serializer (stored reports pass through)
+    
+    Without a serializer class, only checks that the data is an object with
+    string text fields.
+    """
+    
+    name = 'validate'
+    
+    TEXT_FIELDS = ('title', 'description', 'incident_type')
+    
+    def __init__(self, serializer_class=None, context=None):
+        super().__init__()
+        self.serializer_class = serializer_class
+        self.context = context or {}
+    
+    def process(self, records):
+        for record in records:
+            if record.report is not None:
+                continue
+            if not isinstance(record.data, Mapping):
+                self.fail(record, ValueError('Report data must be an object'))
+                continue
+            
+            if self.serializer_class is None:
+                for field in self.TEXT_FIELDS:
+                    value = record.data.get(field)
+                    if value is not None and not isinstance(value, str):
+                        self.fail(record, ValueError(f'{field} must be a string'))
+                        break
+                continue
+            
+            serializer = self.serializer_class(data=record.data, context=self.context)
+            if serializer.is_valid():
+                record.serializer = serializer
+            else:
+                self.fail(record, ValidationError(serializer.errors))
+
+
+class TranslateStage(Stage):
+    """Normalize and translate report text through the translation memory, and pick the model by language"""
+    
+    name = 'translate'
+    
+    def process(self, records):
+        translations = translation_memory.translate_reports(
+            (record.get('title'), record.get('description')) for record in records
+        )
+        registry = ml_utils.get_model_registry()
+        for record, (translated_text, is_tagalog) in zip(records, translations):
+            record.translated_text = translated_text
+            record.is_tagalog = is_tagalog
+            # Tagalog reports go to a Tagalog-specialised model when one is registered
+            record.model_name = registry.model_for_language('tagalog' if is_tagalog else 'english')
+
+
+class FeatureStage(Stage):
+    """
+    Get feature vectors: from the feature store for stored reports, otherwise
+    from the prediction cache (which also holds the prediction) or by extraction
+    """
+    
+    name = 'features'
+    
+    def __init__(self, workers=None):
+        super().__init__()
+        self.workers = workers
+    
+    def _lookup_cache(self, records):
+        versions = {}
+        for record in records:
+            if record.model_name not in versions:
+                try:
+                    versions[record.model_name] = ml_utils.get_model_version(record.model_name)
+                except Exception:
+                    versions[record.model_name] = None
+            if versions[record.model_name] is not None:
+                record.cache_key = ml_utils.PredictionCache.make_key(
+                    *record.feature_inputs(), versions[record.model_name]
+                )
+        
+        keys = list(dict.fromkeys(record.cache_key for record in records if record.cache_key))
+        entries = ml_utils.prediction_cache.get_many(keys) if keys else {}
+        for record in records:
+            if record.cache_key in entries:
+                features, prediction = entries[record.cache_key]
+                record.features = features.copy()
+                record.prediction = dict(prediction)
+    
+    def process(self, records):
+        stored = [record for record in records if record.report is not None and record.report.pk is not None]
+        if stored:
+            vectors = feature_store.get_feature_vectors(
+                [record.report for record in stored], self.workers,
+                inputs=[record.feature_inputs() for record in stored]
+            )
+            for record, vector in zip(stored, vectors):
+                record.features = vector
+        
+        incoming = [record for record in records if record.features is None]
+        if incoming:
+            self._lookup_cache(incoming)
+        
+        missing = [record for record in incoming if record.features is None]
+        if missing:
+            vectors, over_budget = ml_utils.extract_text_features_batch(
+                [record.feature_inputs() for record in missing], workers=self.workers, return_over_budget=True
+            )
+            for record, vector, skipped in zip(missing, vectors, over_budget):
+                record.features = vector
+                if skipped:
+                    # Depends on load at the time, so keep it out of the prediction cache
+                    record.cache_key = None
+
+
+class PredictStage(Stage):
+    """
+    Predict categories in one batch per model and apply the priority/risk rules
+    
+    With fallback=True, a failed inference falls back to the submitted
+    incident type (confidence 0.5) instead of failing the records.
+    """
+    
+    name = 'predict'
+    
+    def __init__(self, return_probabilities=False, fallback=False):
+        super().__init__()
+        self.return_probabilities = return_probabilities
+        self.fallback = fallback
+    
+    def _predict(self, model_name, records):
+        # Cached predictions keep all probabilities, so they can serve any request
+        cached = any(record.cache_key for record in records)
+        try:
+            predictions = ml_utils.predict_incident_category(
+                np.stack([record.features for record in records]),
+                self.return_probabilities or cached, model_name
+            )
+        except Exception as e:
+            if not self.fallback:
+                raise
+            print(f"ML prediction error: {e}")
+            ml_utils.get_pipeline_metrics().increment('prediction_fallbacks', len(records))
+            for record in records:
+                record.prediction = {
+                    'predicted_category': record.get('incident_type') or 'Others',
+                    'confidence': 0.5,
+                    'model_version': None,
+                }
+            return
+        
+        ml_utils.prediction_cache.set_many({
+            record.cache_key: (record.features.copy(), prediction)
+            for record, prediction in zip(records, predictions)
+            if record.cache_key
+        })
+        for record, prediction in zip(records, predictions):
+            record.prediction = dict(prediction)
+    
+    def process(self, records):
+        by_model = {}
+        for record in records:
+            if record.prediction is None:
+                by_model.setdefault(record.model_name, []).append(record)
+        for model_name, group in by_model.items():
+            self._predict(model_name, group)
+        
+        ml_utils.get_pipeline_metrics().increment('reports_classified', len(records))
+        for record in records:
+            if not self.return_probabilities:
+                record.prediction.pop('all_probabilities', None)
+                record.prediction.pop('top_5_predictions', None)
+            record.priority, record.risk_level = ml_utils.assess_priority_and_risk(
+                record.prediction['predicted_category'], record.prediction['confidence']
+            )
+
+
+class DedupeStage(Stage):
+    """
+    Find likely duplicates among existing reports (see reports.duplicate_index)
+    
+    With skip=True, records that have duplicates fail here so they are not persisted.
+    With wait=False, the stage does not wait for the index to be built: records
+    are left with duplicates=None (not checked) until it is.
+    """
+    
+    name = 'dedupe'
+    
+    def __init__(self, queryset=None, limit=5, skip=False, wait=True):
+        super().__init__()
+        self.queryset = queryset
+        self.limit = limit
+        self.skip = skip
+        self.wait = wait
+    
+    def process(self, records):
+        index = duplicate_index.get_duplicate_index()
+        for record in records:
+            try:
+                record.duplicates = index.find_duplicates(
+                    record.get('title'), record.get('description'),
+                    record.get('latitude', None), record.get('longitude', None),
+                    exclude_id=record.report.pk if record.report is not None else None,
+                    queryset=self.queryset,
+                    limit=self.limit,
+                    wait=self.wait,
+                )
+            except duplicate_index.IndexNotReady:
+                record.duplicates = None
+                continue
+            if self.skip and record.duplicates:
+                self.fail(record, ValueError(f"Duplicate of report #{record.duplicates[0]['report'].pk}"))
+
+
+class PersistStage(Stage):
+    """
+    Save a chunk in one transaction: new reports are created through their
+    serializer, stored reports get their prediction written back with bulk_update
+    """
+    
+    name = 'persist'
+    
+    def process(self, records):
+        processed_at = timezone.now()
+        created = []
+        try:
+            with transaction.atomic():
+                updated = []
+                for record in records:
+                    fields = prediction_fields(record.prediction, processed_at) if record.prediction is not None else {}
+                    if record.report is None:
+                        if record.serializer is None:
+                            raise ValueError('Report data was not validated')
+                        # Values submitted with the report win over the model's suggestion
+                        for field in SUGGESTED_FIELDS:
+                            if field in record.serializer.validated_data:
+                                fields.pop(field, None)
+                        created.append(record)
+                        record.report = record.serializer.save(**fields)
+                    elif fields:
+                        apply_prediction(record.report, record.prediction, processed_at)
+                        updated.append(record.report)
+                if updated:
+                    Report.objects.bulk_update(updated, ML_RESULT_FIELDS)
+        except Exception:
+            # Rolled back: the reports created so far no longer exist
+            for record in created:
+                record.report = None
+                record.serializer.instance = None
+            raise
+        
+        ml_utils.get_pipeline_metrics().increment(
+            'reports_scored', sum(record.prediction is not None for record in records)
+        )
+
+
+_DONE = object()
+
+
+class _Failure:
+    """Error raised in a pipeline thread, passed down the queues to the consumer"""
+    
+    def __init__(self, error):
+        self.error = error
+
+
+class IngestPipeline:
+    """
+    Run stages over a stream of records in chunks
+    
+    Args:
+        stages: Stage instances, in order
+        chunk_size: Records per chunk (defaults to INGEST_CHUNK_SIZE)
+        threaded: Run each stage in its own thread, with bounded queues between them
+        queue_size: Chunks buffered between two stages (defaults to INGEST_QUEUE_SIZE)
+    """
+    
+    def __init__(self, stages, chunk_size=None, threaded=False, queue_size=None):
+        self.stages = list(stages)
+        self.chunk_size = chunk_size or get_chunk_size()
+        self.threaded = threaded
+        self.queue_size = queue_size or get_queue_size()
+        self.records = 0
+        self.failed = 0
+        self.seconds = 0.0
+    
+    def _chunks(self, records):
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def run(self, records):
+        """
+        Process a stream of records
+        
+        Yields:
+            list: Each chunk of records once it went through every stage, in input order
+        """
+        started = time.perf_counter()
+        stream = self._chunks(records)
+        if self.threaded:
+            stream = self._run_threaded(stream)
+        else:
+            for stage in self.stages:
+                stream = stage.stream(stream)
+        
+        try:
+            for chunk in stream:
+                self.records += len(chunk)
+                self.failed += sum(record.failed for record in chunk)
+                yield chunk
+        finally:
+            self.seconds += time.perf_counter() - started
+    
+    def process(self, records):
+        """Process records to completion and return them all"""
+        return [record for chunk in self.run(records) for record in chunk]
+    
+    def _run_threaded(self, chunks):
+        stop = threading.Event()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        
+        def put(outbox, item, stage=None):
+            started = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    outbox.put(item, timeout=QUEUE_POLL_SECONDS)
+                    break
+                except queue.Full:
+                    continue
+            if stage is not None:
+                stage.stats['blocked_seconds'] += time.perf_counter() - started
+        
+        def get(inbox, stage):
+            started = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    item = inbox.get(timeout=QUEUE_POLL_SECONDS)
+                    break
+                except queue.Empty:
+                    continue
+            else:
+                item = _DONE
+            stage.stats['wait_seconds'] += time.perf_counter() - started
+            return item
+        
+        def feed():
+            try:
+                for chunk in chunks:
+                    if stop.is_set():
+                        return
+                    put(queues[0], chunk)
+                put(queues[0], _DONE)
+            except Exception as e:
+                put(queues[0], _Failure(e))
+            finally:
+                close_old_connections()
+        
+        def work(stage, inbox, outbox):
+            try:
+                while True:
+                    item = get(inbox, stage)
+                    if item is _DONE or isinstance(item, _Failure):
+                        put(outbox, item)
+                        return
+                    put(outbox, stage.run(item), stage)
+            except Exception as e:
+                put(outbox, _Failure(e))
+            finally:
+                close_old_connections()
+        
+        threads = [threading.Thread(target=feed, name='ingest-source', daemon=True)]
+        for stage, inbox, outbox in zip(self.stages, queues, queues[1:]):
+            threads.append(threading.Thread(
+                target=work, args=(stage, inbox, outbox), name=f'ingest-{stage.name}', daemon=True
+            ))
+        for thread in threads:
+            thread.start()
+        
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+    
+    def get_stats(self):
+        """Get record counts and the time spent in each stage"""
+        return {
+            'records': self.records,
+            'failed': self.failed,
+            'seconds': self.seconds,
+            'stages': {stage.name: dict(stage.stats) for stage in self.stages},
+        }
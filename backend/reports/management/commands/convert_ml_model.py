@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+import ml_utils
+
+
+class Command(BaseCommand):
+    help = 'Convert the TFLite model to an .npz for the NumPy engine and check that both agree'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=None, help='TFLite model to convert (defaults to best_model.tflite)')
+        parser.add_argument('--output', default=None, help='Output .npz path (defaults to the model path with .npz)')
+        parser.add_argument('--rows', type=int, default=1024, help='Random feature rows used for the parity check')
+        parser.add_argument('--tolerance', type=float, default=1e-5, help='Maximum allowed absolute output difference')
+
+    def handle(self, *args, **options):
+        tflite_path = Path(options['model']) if options['model'] else ml_utils.get_model_manager().model_path
+
+        try:
+            npz_path = ml_utils.convert_tflite_to_numpy(tflite_path, options['output'])
+            parity = ml_utils.check_numpy_parity(tflite_path, npz_path, rows=options['rows'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Parity over {parity['rows']} rows: max abs diff {parity['max_abs_diff']:.3g}, "
+            f"argmax agreement {parity['argmax_agreement']:.2%}"
+        )
+        if parity['max_abs_diff'] > options['tolerance'] or parity['argmax_agreement'] < 1:
+            raise CommandError(f'NumPy engine does not match TFLite (written to {npz_path}; do not deploy it)')
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {npz_path}'))
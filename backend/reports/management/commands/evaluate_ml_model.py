@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.ml_evaluation import MODEL_METRICS_PATH, evaluate_model, load_dataset, write_model_metrics
+
+
+class Command(BaseCommand):
+    help = 'Evaluate and benchmark the ML model on a labeled CSV/JSONL dataset and write model_metrics.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', help='CSV or JSONL file with title, description, incident_type and the true category')
+        parser.add_argument('--label-field', default='category', help='Field holding the true category')
+        parser.add_argument('--model', default=None, help='Registered model to evaluate (defaults to the default model)')
+        parser.add_argument('--batch-size', type=int, default=512, help='Rows per inference call in the accuracy pass')
+        parser.add_argument('--workers', type=int, default=None, help='Processes used for feature extraction')
+        parser.add_argument('--benchmark-batches', type=int, default=50,
+                            help='Batches timed per batch size for latency (0 skips the benchmark)')
+        parser.add_argument('--output', default=str(MODEL_METRICS_PATH), help='Where to write the metrics')
+        parser.add_argument('--dry-run', action='store_true', help='Print the metrics without writing them')
+
+    def handle(self, *args, **options):
+        try:
+            reports, labels = load_dataset(options['dataset'], options['label_field'])
+            metrics = evaluate_model(
+                reports, labels,
+                model_name=options['model'],
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                benchmark_batches=options['benchmark_batches'],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        performance = metrics['performance_metrics']
+        self.stdout.write(
+            f"{metrics['test_samples']} reports: accuracy {metrics['model_accuracy']:.3f}, "
+            f"macro precision {performance['precision']:.3f}, recall {performance['recall']:.3f}, "
+            f"F1 {performance['f1_score']:.3f}"
+        )
+        self.stdout.write(f"Throughput: {metrics['throughput']['reports_per_second']:.0f} reports/sec")
+        for batch_size, latency in metrics['latency_by_batch_size'].items():
+            self.stdout.write(
+                f"  batch {batch_size:>4}: p50 {latency['p50_ms']:.2f}ms, p95 {latency['p95_ms']:.2f}ms, "
+                f"p99 {latency['p99_ms']:.2f}ms, {latency['reports_per_second']:.0f} reports/sec"
+            )
+
+        if options['dry_run']:
+            return
+        path = write_model_metrics(metrics, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
@@ -0,0 +1,85 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+import ml_utils
+from reports import ingest_pipeline
+from reports.models import ReportAction
+from reports.serializers import ReportSerializer
+
+
+class Command(BaseCommand):
+    help = 'Import reports from a CSV/JSONL file, classifying them on the way in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with one report per row (ReportSerializer fields)')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Reports validated, classified and saved per batch')
+        parser.add_argument('--workers', type=int, default=None, help='Processes used for feature extraction')
+        parser.add_argument('--skip-duplicates', action='store_true',
+                            help='Leave out reports that duplicate an existing report nearby')
+
+    def read_rows(self, path):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if path.suffix.lower() in ('.jsonl', '.ndjson'):
+                rows = (json.loads(line) for line in f if line.strip())
+            else:
+                rows = csv.DictReader(f)
+            for row in rows:
+                # Empty CSV cells mean "not given"
+                yield {field: value for field, value in row.items() if value not in ('', None)}
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+
+        stages = [
+            ingest_pipeline.ValidateStage(ReportSerializer),
+            ingest_pipeline.TranslateStage(),
+        ]
+        if ml_utils.is_model_ready():
+            stages += [ingest_pipeline.FeatureStage(options['workers']), ingest_pipeline.PredictStage()]
+        else:
+            self.stderr.write('ML model is not available; reports are imported unclassified '
+                              '(classify them later with run_ai_categorization)')
+        stages += [
+            ingest_pipeline.DedupeStage(limit=1, skip=True) if options['skip_duplicates'] else None,
+            ingest_pipeline.PersistStage(),
+        ]
+        pipeline = ingest_pipeline.IngestPipeline(
+            [stage for stage in stages if stage is not None], chunk_size=options['chunk_size'], threaded=True
+        )
+
+        started = time.perf_counter()
+        imported = 0
+        failed = 0
+        line_number = 0
+        for chunk in pipeline.run(ingest_pipeline.records_from_data(self.read_rows(path))):
+            created = []
+            for record in chunk:
+                line_number += 1
+                if record.failed:
+                    failed += 1
+                    self.stderr.write(f'Row {line_number} ({record.failed_stage}): {record.error}')
+                else:
+                    created.append(record.report)
+            ReportAction.objects.bulk_create([
+                ReportAction(report=report, action_type='created', notes=f'Report imported from {path.name}')
+                for report in created
+            ])
+            imported += len(created)
+            self.stdout.write(f'{imported} reports imported, {failed} rows failed')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} reports ({failed} rows failed) in {elapsed:.1f}s '
+            f'({imported / max(elapsed, 1e-9):.1f} reports/sec)'
+        ))
+        for name, stats in pipeline.get_stats()['stages'].items():
+            self.stdout.write(
+                f"  {name}: {stats['seconds']:.1f}s busy, {stats['wait_seconds']:.1f}s waiting for input, "
+                f"{stats['blocked_seconds']:.1f}s blocked on the next stage"
+            )
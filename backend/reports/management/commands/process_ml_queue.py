@@ -0,0 +1,30 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from reports.ml_queue import MLQueueWorker
+
+
+class Command(BaseCommand):
+    help = 'Run a worker that classifies queued reports with the ML model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Reports per micro-batch')
+        parser.add_argument('--poll', type=float, default=None, help='Seconds between queue polls')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        worker = MLQueueWorker(batch_size=options['batch_size'], poll_seconds=options['poll'])
+
+        if options['once']:
+            processed = worker.drain()
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} reports ({worker.failed} failed)'))
+            return
+
+        signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+        self.stdout.write(f'Processing ML queue (batch size {worker.batch_size}, poll every {worker.poll_seconds}s)')
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
+        self.stdout.write(f'Stopped after {worker.processed} reports ({worker.failed} failed)')
@@ -0,0 +1,130 @@
+import json
+import time
+from datetime import datetime, time as dt_time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+import ml_utils
+from reports.feature_store import FEATURE_SOURCE_FIELDS
+from reports.ingest_pipeline import ML_RESULT_FIELDS, iter_reports, records_from_reports
+from reports.ml_processing import scoring_pipeline, split_results
+from reports.models import Report
+
+
+class Command(BaseCommand):
+    help = 'Classify stored reports with the ML model in streaming batches (backfill / re-scoring)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only reports created on or after this date/datetime (ISO 8601)')
+        parser.add_argument('--barangay', help='Only reports from this barangay')
+        parser.add_argument('--reprocess', action='store_true', help='Also re-score reports that were already processed')
+        parser.add_argument('--stale', action='store_true', help='Also re-score reports scored by another model version')
+        parser.add_argument('--workers', type=int, default=None, help='Processes used for feature extraction')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Reports fetched and scored per batch')
+        parser.add_argument(
+            '--checkpoint', help='File recording the last processed report id and failed ids, used to resume'
+        )
+        parser.add_argument('--reset-checkpoint', action='store_true', help='Ignore an existing checkpoint and start over')
+
+    def handle(self, *args, **options):
+        if not ml_utils.is_model_ready():
+            raise CommandError('ML model is not available')
+
+        checkpoint = Path(options['checkpoint']) if options['checkpoint'] else None
+        last_id = 0
+        # Reports that failed before the checkpoint; they are retried on resume
+        failed_ids = set()
+        if checkpoint and checkpoint.exists() and not options['reset_checkpoint']:
+            state = json.loads(checkpoint.read_text())
+            last_id = state.get('last_id', 0)
+            failed_ids = set(state.get('failed_ids', []))
+            self.stdout.write(f'Resuming after report #{last_id}, retrying {len(failed_ids)} failed reports')
+
+        queryset = self.get_queryset(options).filter(Q(pk__gt=last_id) | Q(pk__in=failed_ids)).order_by('pk')
+        total = queryset.count()
+        self.stdout.write(f'{total} reports to process')
+        if not total:
+            return
+
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+        processed = 0
+        failed = 0
+
+        # Reading, extraction, inference and writes of consecutive chunks overlap
+        pipeline = scoring_pipeline(options['workers'], chunk_size, threaded=True)
+        reports = iter_reports(queryset.only(*FEATURE_SOURCE_FIELDS, *ML_RESULT_FIELDS), chunk_size)
+        for chunk in pipeline.run(records_from_reports(reports)):
+            scored, failures = split_results(chunk)
+            processed += len(scored)
+            failed += len(failures)
+            failed_ids.difference_update(report.pk for report in scored)
+            for report, error in failures:
+                failed_ids.add(report.pk)
+                self.stderr.write(f'Report #{report.pk} failed: {error}')
+            if checkpoint:
+                last_id = max(last_id, chunk[-1].report.pk)
+                self.write_checkpoint(checkpoint, last_id, failed_ids)
+            self.report_progress(processed + failed, total, started)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} reports ({failed} failed) in {elapsed:.1f}s '
+            f'({processed / max(elapsed, 1e-9):.1f} reports/sec)'
+        ))
+        if checkpoint and failed_ids:
+            self.stdout.write(f'{len(failed_ids)} failed reports are recorded in {checkpoint} and retried on resume')
+        for name, stats in pipeline.get_stats()['stages'].items():
+            self.stdout.write(
+                f"  {name}: {stats['seconds']:.1f}s busy, {stats['wait_seconds']:.1f}s waiting for input, "
+                f"{stats['blocked_seconds']:.1f}s blocked on the next stage"
+            )
+
+    def get_queryset(self, options):
+        queryset = Report.objects.all()
+
+        if options['stale'] and not options['reprocess']:
+            model_version = ml_utils.get_model_version()
+            if model_version is None:
+                raise CommandError('Model not loaded; cannot tell which reports are stale')
+            queryset = queryset.filter(Q(ml_processed=False) | ~Q(ml_model_version=model_version))
+        elif not options['reprocess']:
+            queryset = queryset.filter(ml_processed=False)
+
+        if options['barangay']:
+            queryset = queryset.filter(barangay=options['barangay'])
+
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                since_date = parse_date(options['since'])
+                if since_date is None:
+                    raise CommandError(f"Invalid --since value: {options['since']}")
+                since = datetime.combine(since_date, dt_time.min)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(created_at__gte=since)
+
+        return queryset
+
+    def write_checkpoint(self, checkpoint, last_id, failed_ids):
+        # Write then rename so an interrupted run never leaves a torn checkpoint
+        temp_path = checkpoint.with_name(checkpoint.name + '.tmp')
+        temp_path.write_text(json.dumps({
+            'last_id': last_id,
+            'failed_ids': sorted(failed_ids),
+            'updated_at': timezone.now().isoformat(),
+        }))
+        temp_path.replace(checkpoint)
+
+    def report_progress(self, processed, total, started):
+        elapsed = time.perf_counter() - started
+        rate = processed / max(elapsed, 1e-9)
+        eta = (total - processed) / rate if rate else 0
+        self.stdout.write(
+            f'{processed}/{total} reports ({processed / total:.0%}) - {rate:.1f} reports/sec - ETA {eta:.0f}s'
+        )
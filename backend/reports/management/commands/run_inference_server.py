@@ -0,0 +1,52 @@
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+import ml_utils
+from reports.inference_server import DEFAULT_BATCH_WINDOW, DEFAULT_MAX_BATCH, InferenceServer
+
+
+class Command(BaseCommand):
+    help = 'Run the ML inference server on a Unix socket (web workers connect via ML_INFERENCE_SOCKET)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None, help='Socket path (defaults to ML_INFERENCE_SOCKET)')
+        parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH, help='Maximum rows per micro-batch')
+        parser.add_argument('--window-ms', type=float, default=DEFAULT_BATCH_WINDOW * 1000,
+                            help='Milliseconds to wait for more requests before running a batch')
+        parser.add_argument('--threads', type=int, default=None, help='Threads running inference')
+
+    def handle(self, *args, **options):
+        socket_path = options['socket'] or ml_utils.INFERENCE_SOCKET
+        if not socket_path:
+            raise CommandError('Pass --socket or set ML_INFERENCE_SOCKET')
+
+        if not ml_utils.warm_up_model():
+            raise CommandError('ML model is not available')
+
+        server = InferenceServer(
+            socket_path,
+            max_batch=options['max_batch'],
+            window=options['window_ms'] / 1000,
+            threads=options['threads'],
+        )
+        asyncio.run(self.serve(server))
+        self.stdout.write('Inference server stopped')
+
+    async def serve(self, server):
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, task.cancel)
+
+        def ready():
+            self.stdout.write(self.style.SUCCESS(
+                f'Serving ML inference on {server.socket_path} '
+                f'(max batch {server.max_batch}, window {server.window * 1000:g}ms)'
+            ))
+
+        try:
+            await server.serve(ready)
+        except asyncio.CancelledError:
+            pass
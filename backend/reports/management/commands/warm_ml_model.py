@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+import ml_utils
+
+
+# The model is loaded into this command's own process, which exits when it is
+# done: this measures load and warm-up time and checks the model works, but
+# does not warm web workers. Set ML_PRELOAD_MODEL=true to load the model in
+# each web process at startup (ReportsConfig.ready), or run
+# run_inference_server, which loads it once and serves every worker.
+class Command(BaseCommand):
+    help = (
+        'Load the ML model and run a warm-up prediction in this process, reporting how long it took. '
+        'Does not warm web workers: use ML_PRELOAD_MODEL=true or run_inference_server for that'
+    )
+
+    def handle(self, *args, **options):
+        if not ml_utils.warm_up_model():
+            raise CommandError('ML model could not be loaded')
+
+        status = ml_utils.get_model_status()
+        self.stdout.write(f"Runtime import: {status['runtime_import_seconds'] or 0:.3f}s")
+        self.stdout.write(f"Model load: {status['model_load_seconds'] or 0:.3f}s")
+        self.stdout.write(self.style.SUCCESS('ML model loads and predicts'))
+        self.stdout.write(
+            'Only this process was warmed; set ML_PRELOAD_MODEL=true or run run_inference_server to warm web workers'
+        )
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_report_ml_confidence_report_ml_predicted_category_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportFeatureVector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vector', models.BinaryField()),
+                ('extractor_version', models.PositiveIntegerField()),
+                ('text_hash', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField()),
+                ('report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feature_vector', to='reports.report')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0007_mlbatchjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='ml_model_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
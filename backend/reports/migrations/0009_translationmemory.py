@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0008_report_ml_model_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_hash', models.CharField(max_length=64, unique=True)),
+                ('translator_version', models.PositiveIntegerField()),
+                ('translated_text', models.TextField()),
+                ('is_tagalog', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0009_translationmemory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportfeaturevector',
+            name='extractor_tag',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:48
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_suggestions(apps, schema_editor):
+    # Reports classified so far got priority/risk_level from the model
+    Report = apps.get_model('reports', 'Report')
+    Report.objects.filter(ml_processed=True).update(ml_priority=F('priority'), ml_risk_level=F('risk_level'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0010_reportfeaturevector_extractor_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='ml_priority',
+            field=models.CharField(blank=True, choices=[('High', 'High'), ('Medium', 'Medium'), ('Low', 'Low')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='ml_risk_level',
+            field=models.CharField(blank=True, choices=[('High', 'High'), ('Medium', 'Medium'), ('Low', 'Low')], default='', max_length=10),
+        ),
+        migrations.RunPython(copy_suggestions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,238 @@
+"""
+Offline evaluation and benchmarking of the ML model on a labeled dataset
+
+Produces model_metrics.json (read by the ml/metrics/ endpoint): accuracy,
+per-class precision/recall, the confusion matrix, throughput and latency
+percentiles by batch size.
+"""
+import csv
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+import ml_utils
+
+# Default location of the metrics file, next to ml_utils.py / best_model.tflite
+MODEL_METRICS_PATH = Path(ml_utils.__file__).parent / 'model_metrics.json'
+
+# Batch sizes benchmarked for latency
+BENCHMARK_BATCH_SIZES = (1, 8, 32, 128, 512)
+
+
+def load_dataset(path, label_field='category'):
+    """
+    Read labeled reports from a CSV or JSONL file
+
+    Each record needs the label field and a description (or "text"); title
+    and incident_type are optional.
+
+    Returns:
+        tuple: (list of (title, description, incident_type) tuples, list of labels)
+    """
+    path = Path(path)
+    if path.suffix.lower() in ('.jsonl', '.ndjson'):
+        with open(path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            records = list(csv.DictReader(f))
+
+    reports = []
+    labels = []
+    for line_number, record in enumerate(records, start=1):
+        label = (record.get(label_field) or '').strip()
+        if not label:
+            raise ValueError(f"Record {line_number} has no '{label_field}'")
+        reports.append((
+            record.get('title') or '',
+            record.get('description') or record.get('text') or '',
+            record.get('incident_type') or '',
+        ))
+        labels.append(label)
+    return reports, labels
+
+
+def classification_metrics(true_indices, predicted_indices, categories):
+    """
+    Compute accuracy, per-class precision/recall/F1 and the confusion matrix
+
+    Returns:
+        dict: Metrics, with macro averages under 'performance_metrics'
+    """
+    count = len(categories)
+    confusion = np.zeros((count, count), dtype=np.int64)
+    np.add.at(confusion, (true_indices, predicted_indices), 1)
+
+    true_positives = np.diag(confusion).astype(np.float64)
+    predicted_totals = confusion.sum(axis=0)
+    support = confusion.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted_totals > 0, true_positives / predicted_totals, 0.0)
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    accuracy = float(true_positives.sum() / max(len(true_indices), 1))
+
+    # Macro averages over the classes present in the dataset
+    present = support > 0
+    return {
+        'model_accuracy': accuracy,
+        'performance_metrics': {
+            'precision': float(precision[present].mean()) if present.any() else 0.0,
+            'recall': float(recall[present].mean()) if present.any() else 0.0,
+            'f1_score': float(f1[present].mean()) if present.any() else 0.0,
+            'accuracy': accuracy,
+        },
+        'per_class_metrics': {
+            category: {
+                'precision': float(precision[i]),
+                'recall': float(recall[i]),
+                'f1_score': float(f1[i]),
+                'support': int(support[i]),
+            }
+            for i, category in enumerate(categories)
+        },
+        'confusion_matrix': {
+            'labels': list(categories),
+            'matrix': confusion.tolist(),
+        },
+    }
+
+
+def benchmark_batch_sizes(rows, manager, batch_sizes=BENCHMARK_BATCH_SIZES, max_batches=50):
+    """
+    Measure extraction + inference latency for each batch size
+
+    Args:
+        rows: (title, description, incident_type, translated_text) tuples
+        manager: Loaded MLModelManager
+        max_batches: Batches timed per batch size
+
+    Returns:
+        dict: batch size -> batches timed, p50/p95/p99 latency (ms) and reports/sec
+    """
+    results = {}
+    for batch_size in batch_sizes:
+        if not rows:
+            break
+        latencies = []
+        inference_latencies = []
+        for batch_number in range(max_batches):
+            start = (batch_number * batch_size) % len(rows)
+            batch = (rows[start:] + rows[:start])[:batch_size]
+            if len(batch) < batch_size:
+                batch = (batch * (batch_size // len(batch) + 1))[:batch_size]
+
+            started = time.perf_counter()
+            features = ml_utils.extract_text_features_batch(batch)
+            extracted = time.perf_counter()
+            manager.predict(features)
+            finished = time.perf_counter()
+
+            latencies.append(finished - started)
+            inference_latencies.append(finished - extracted)
+
+        latencies = np.array(latencies) * 1000
+        inference_latencies = np.array(inference_latencies) * 1000
+        results[str(batch_size)] = {
+            'batches': len(latencies),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'inference_p50_ms': float(np.percentile(inference_latencies, 50)),
+            'inference_p99_ms': float(np.percentile(inference_latencies, 99)),
+            'reports_per_second': float(batch_size / (latencies.mean() / 1000)),
+        }
+    return results
+
+
+def evaluate_model(reports, labels, model_name=None, batch_size=512, workers=None, benchmark_batches=50):
+    """
+    Run the model over a labeled dataset and measure quality and speed
+
+    Args:
+        reports: (title, description, incident_type) tuples
+        labels: True category of each report
+        model_name: Registered model to evaluate (defaults to the default model)
+        batch_size: Rows per inference call in the accuracy pass
+        workers: Process pool size for feature extraction
+        benchmark_batches: Batches timed per batch size (0 skips the benchmark)
+
+    Returns:
+        dict: Metrics in the model_metrics.json layout
+    """
+    manager = ml_utils.get_model_registry().acquire(model_name)
+    if not manager.model_loaded:
+        raise ValueError('ML model is not available')
+
+    categories = manager.get_categories_list()
+    unknown = sorted(set(labels) - set(categories))
+    if unknown:
+        raise ValueError(f"Unknown categories in dataset: {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    rows = []
+    for title, description, incident_type in reports:
+        translated_text, _ = ml_utils.translate_report_text(title, description)
+        rows.append((title, description, incident_type, translated_text))
+    translated = time.perf_counter()
+
+    features = ml_utils.extract_text_features_batch(rows, workers=workers)
+    extracted = time.perf_counter()
+
+    outputs = [manager.predict(features[start:start + batch_size]) for start in range(0, len(features), batch_size)]
+    raw_output = np.concatenate(outputs) if outputs else np.zeros((0, len(categories)), dtype=np.float32)
+    predicted_indices = np.argmax(raw_output, axis=1)
+    finished = time.perf_counter()
+
+    category_index = {category: i for i, category in enumerate(categories)}
+    true_indices = np.array([category_index[label] for label in labels], dtype=np.int64)
+
+    total_seconds = finished - started
+    metrics = classification_metrics(true_indices, predicted_indices, categories)
+    metrics.update({
+        'model_name': manager.model_path.name,
+        'model_version': manager.model_version,
+        'engine': manager.get_model_info().get('engine'),
+        'feature_extractor_version': ml_utils.FEATURE_EXTRACTOR_VERSION,
+        'feature_extractor_tag': ml_utils.feature_extractor_tag(),
+        'test_samples': len(labels),
+        'categories_count': len(categories),
+        'model_size_mb': manager.model_path.stat().st_size / (1024 * 1024),
+        'throughput': {
+            'reports_per_second': len(labels) / total_seconds if total_seconds else 0.0,
+            'translation_seconds': translated - started,
+            'extraction_seconds': extracted - translated,
+            'inference_seconds': finished - extracted,
+            'batch_size': batch_size,
+            'workers': workers or 1,
+        },
+        'latency_by_batch_size': benchmark_batch_sizes(rows, manager, max_batches=benchmark_batches) if benchmark_batches else {},
+        'model_status': 'healthy',
+        'last_updated': datetime.now(timezone.utc).isoformat(),
+    })
+    return metrics
+
+
+def write_model_metrics(metrics, path=MODEL_METRICS_PATH):
+    """
+    Atomically write model_metrics.json, keeping fields this harness does
+    not measure (e.g. training sample counts) from the existing file
+    """
+    path = Path(path)
+    existing = {}
+    if path.exists():
+        try:
+            existing = json.loads(path.read_text())
+        except (OSError, ValueError):
+            existing = {}
+
+    existing.update(metrics)
+    temp_path = path.with_name(path.name + '.tmp')
+    temp_path.write_text(json.dumps(existing, indent=2) + '\n')
+    temp_path.replace(path)
+    return path
@@ -0,0 +1,88 @@
+"""
+Background ML batch jobs with progress polling
+
+A job is stored as an MLBatchJob row, so any web process can report its
+progress. It runs on an executor thread of the process that accepted it,
+streaming reports through the same threaded scoring pipeline as
+`manage.py run_ai_categorization`. A job that was running when its process
+exited stays in the running state.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .feature_store import FEATURE_SOURCE_FIELDS
+from .ingest_pipeline import ML_RESULT_FIELDS, iter_reports, records_from_reports
+from .ml_processing import scoring_pipeline, split_results
+from .models import MLBatchJob, Report
+
+# Reports scored per batch
+JOB_CHUNK_SIZE = 200
+
+# Number of per-report errors kept on the job for inspection
+MAX_RECENT_ERRORS = 20
+
+# Jobs run one at a time per process
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ml-batch-job')
+
+
+def submit_batch_job(user=None, reprocess=False, barangay='', limit=None):
+    """Create a batch job and start it once the surrounding transaction commits"""
+    job = MLBatchJob.objects.create(
+        submitted_by=user if user is not None and user.is_authenticated else None,
+        reprocess=reprocess,
+        barangay=barangay or '',
+        limit=limit,
+    )
+    transaction.on_commit(lambda: _executor.submit(run_batch_job, job.pk))
+    return job
+
+
+def get_job_queryset(job):
+    """Reports a job should process, in id order"""
+    queryset = Report.objects.all()
+    if not job.reprocess:
+        queryset = queryset.filter(ml_processed=False)
+    if job.barangay:
+        queryset = queryset.filter(barangay=job.barangay)
+    return queryset.order_by('pk')
+
+
+def _record_progress(job, scored, failures):
+    job.processed += len(scored)
+    job.failed += len(failures)
+    job.recent_errors = (
+        job.recent_errors + [{'id': report.pk, 'error': str(error)} for report, error in failures]
+    )[-MAX_RECENT_ERRORS:]
+    job.save(update_fields=['processed', 'failed', 'recent_errors'])
+
+
+def run_batch_job(job_id):
+    """Process the reports of a batch job, recording progress after every chunk"""
+    try:
+        job = MLBatchJob.objects.get(pk=job_id)
+        queryset = get_job_queryset(job)
+        
+        job.total = queryset.count() if job.limit is None else min(queryset.count(), job.limit)
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['total', 'status', 'started_at'])
+        
+        reports = iter_reports(
+            queryset.only(*FEATURE_SOURCE_FIELDS, *ML_RESULT_FIELDS), JOB_CHUNK_SIZE, job.limit
+        )
+        pipeline = scoring_pipeline(chunk_size=JOB_CHUNK_SIZE, threaded=True)
+        for chunk in pipeline.run(records_from_reports(reports)):
+            _record_progress(job, *split_results(chunk))
+        
+        job.status = 'completed'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+    
+    except Exception as e:
+        print(f"ML batch job #{job_id} failed: {e}")
+        MLBatchJob.objects.filter(pk=job_id).update(status='failed', error=str(e), finished_at=timezone.now())
+    
+    finally:
+        close_old_connections()
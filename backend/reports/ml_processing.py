@@ -0,0 +1,81 @@
+"""
+Classify stored reports with the ML model and persist the results
+
+Shared by the ML queue worker, batch jobs and the bulk re-scoring tools so
+every path runs the same translate, features, predict and persist stages of
+the ingest pipeline.
+"""
+from .ingest_pipeline import (
+    FeatureStage, IngestPipeline, PersistStage, PredictStage, TranslateStage, records_from_reports,
+)
+
+
+def scoring_pipeline(workers=None, chunk_size=None, threaded=False):
+    """
+    Build the pipeline that classifies stored reports and writes the results back
+    
+    Args:
+        workers (int): Process pool size for feature extraction
+        chunk_size (int): Reports per chunk (defaults to INGEST_CHUNK_SIZE)
+        threaded (bool): Run the stages in threads with bounded queues between them
+    """
+    return IngestPipeline(
+        [TranslateStage(), FeatureStage(workers), PredictStage(), PersistStage()],
+        chunk_size=chunk_size,
+        threaded=threaded,
+    )
+
+
+def split_results(records):
+    """
+    Split processed pipeline records into successes and failures
+    
+    Returns:
+        tuple: (list of scored reports, list of (report, error) pairs)
+    """
+    scored = [record.report for record in records if not record.failed]
+    failures = [(record.report, record.error) for record in records if record.failed]
+    return scored, failures
+
+
+def score_reports(reports, workers=None):
+    """
+    Classify reports in one batch and persist the results with bulk_update
+    
+    Args:
+        reports (iterable): Report instances
+        workers (int): Process pool size for feature extraction
+    
+    Returns:
+        list: Prediction dicts in the order of reports
+    
+    Raises:
+        The error of the first report that failed (the others are still saved)
+    """
+    reports = list(reports)
+    if not reports:
+        return []
+    
+    records = scoring_pipeline(workers, chunk_size=len(reports)).process(records_from_reports(reports))
+    for record in records:
+        if record.failed:
+            raise record.error
+    return [record.prediction for record in records]
+
+
+def score_reports_safely(reports, workers=None):
+    """
+    Classify reports like score_reports, isolating failures per report
+    
+    The batch is scored in one go; a report that fails any stage is retried
+    on its own and reported, without failing the others.
+    
+    Returns:
+        tuple: (list of scored reports, list of (report, error) pairs)
+    """
+    reports = list(reports)
+    if not reports:
+        return [], []
+    
+    records = scoring_pipeline(workers, chunk_size=len(reports)).process(records_from_reports(reports))
+    return split_results(records)
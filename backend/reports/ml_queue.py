@@ -0,0 +1,214 @@
+"""
+Database-backed queue that classifies new reports in the background
+
+Report creation only inserts an MLProcessingTask row. A worker drains the
+queue in micro-batches through the model and persists the results with
+bulk_update. The worker runs as a daemon thread inside each web process
+(ML_QUEUE_IN_PROCESS) or as `manage.py process_ml_queue`; both claim tasks
+through the database, so no message broker is needed.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+import ml_utils
+from .ml_processing import score_reports_safely
+from .models import MLProcessingTask
+
+# Attempts before a task is left in the failed state
+MAX_ATTEMPTS = 3
+
+# Tasks stuck in processing for longer than this (e.g. the worker died) are retried
+STALE_AFTER = timedelta(minutes=5)
+
+# Seconds to wait after a wake-up so reports created together share a batch
+BATCH_WINDOW = 0.25
+
+
+def get_batch_size():
+    return getattr(settings, 'ML_QUEUE_BATCH_SIZE', 32)
+
+
+def get_poll_seconds():
+    return getattr(settings, 'ML_QUEUE_POLL_SECONDS', 2)
+
+
+def enqueue_reports(report_ids):
+    """
+    Queue reports for classification
+    
+    Reports that already have a task are reset to pending so their latest
+    text is classified again.
+    """
+    report_ids = list(report_ids)
+    if not report_ids:
+        return
+    
+    MLProcessingTask.objects.bulk_create(
+        [MLProcessingTask(report_id=report_id) for report_id in report_ids],
+        ignore_conflicts=True,
+    )
+    MLProcessingTask.objects.filter(report_id__in=report_ids).exclude(status='pending').update(
+        status='pending', attempts=0, last_error='', started_at=None
+    )
+    
+    if getattr(settings, 'ML_QUEUE_IN_PROCESS', True):
+        transaction.on_commit(lambda: get_worker().wake())
+
+
+def _claim_tasks(batch_size):
+    """Mark up to batch_size pending (or stale) tasks as processing and return them"""
+    claimed_at = timezone.now()
+    
+    with transaction.atomic():
+        task_ids = list(
+            MLProcessingTask.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending') | Q(status='processing', started_at__lt=claimed_at - STALE_AFTER))
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not task_ids:
+            return []
+        MLProcessingTask.objects.filter(id__in=task_ids).update(
+            status='processing', started_at=claimed_at, attempts=F('attempts') + 1
+        )
+    
+    return list(
+        MLProcessingTask.objects.filter(id__in=task_ids, started_at=claimed_at).select_related('report')
+    )
+
+
+def _finish_tasks(tasks):
+    # Tasks re-queued while they were processing are no longer in processing
+    MLProcessingTask.objects.filter(
+        id__in=[task.id for task in tasks], status='processing', started_at=tasks[0].started_at
+    ).delete()
+
+
+def _fail_task(task, error):
+    status = 'failed' if task.attempts >= MAX_ATTEMPTS else 'pending'
+    MLProcessingTask.objects.filter(id=task.id, status='processing', started_at=task.started_at).update(
+        status=status, last_error=str(error)
+    )
+
+
+def process_next_batch(batch_size=None):
+    """
+    Classify one micro-batch of queued reports
+    
+    Returns:
+        tuple: (processed, failed) counts; (0, 0) when the queue is empty
+    """
+    tasks = _claim_tasks(batch_size or get_batch_size())
+    if not tasks:
+        return 0, 0
+    
+    tasks_by_report = {task.report_id: task for task in tasks}
+    scored, failures = score_reports_safely([task.report for task in tasks])
+    
+    if scored:
+        _finish_tasks([tasks_by_report[report.pk] for report in scored])
+    for report, error in failures:
+        print(f"ML queue error for report #{report.pk}: {error}")
+        _fail_task(tasks_by_report[report.pk], error)
+    
+    return len(scored), len(failures)
+
+class MLQueueWorker:
+    """Drains the ML queue, waking up when reports are enqueued or every poll interval"""
+    
+    def __init__(self, batch_size=None, poll_seconds=None):
+        self.batch_size = batch_size or get_batch_size()
+        self.poll_seconds = poll_seconds or get_poll_seconds()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_at = None
+    
+    def start(self):
+        """Run the worker in a daemon thread"""
+        self._thread = threading.Thread(target=self.run, name='ml-queue-worker', daemon=True)
+        self._thread.start()
+    
+    def wake(self):
+        self._wake.set()
+    
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+    
+    def drain(self):
+        """Process batches until the queue is empty; returns the number of reports processed"""
+        total = 0
+        if not ml_utils.is_model_ready():
+            return total
+        
+        try:
+            while not self._stop.is_set():
+                processed, failed = process_next_batch(self.batch_size)
+                if not processed and not failed:
+                    break
+                total += processed
+                self.processed += processed
+                self.failed += failed
+                self.batches += 1
+                self.last_batch_at = timezone.now()
+        finally:
+            close_old_connections()
+        return total
+    
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"ML queue worker error: {e}")
+            
+            if self._wake.wait(self.poll_seconds):
+                self._wake.clear()
+                time.sleep(BATCH_WINDOW)
+    
+    def get_stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'processed': self.processed,
+            'failed': self.failed,
+            'batches': self.batches,
+            'last_batch_at': self.last_batch_at,
+        }
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """Get the in-process worker, starting it on first use"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = MLQueueWorker()
+            _worker.start()
+        return _worker
+
+
+def get_queue_stats():
+    """Get queue depth by status and, if running here, the in-process worker counters"""
+    counts = dict(
+        MLProcessingTask.objects.values_list('status').annotate(count=Count('id')).values_list('status', 'count')
+    )
+    return {
+        'pending': counts.get('pending', 0),
+        'processing': counts.get('processing', 0),
+        'failed': counts.get('failed', 0),
+        'worker': _worker.get_stats() if _worker is not None else None,
+    }
@@ -60,6 +60,16 @@ class Report(models.Model):
     verified_at = models.DateTimeField(null=True, blank=True)
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='Low')
     risk_level = models.CharField(max_length=10, choices=RISK_LEVEL_CHOICES, default='Low')
+    ml_predicted_category = models.CharField(max_length=100, blank=True, null=True)
+    ml_confidence = models.FloatField(blank=True, null=True)
+    ml_processed = models.BooleanField(default=False)
+    ml_processed_at = models.DateTimeField(blank=True, null=True)
+    ml_model_version = models.CharField(max_length=64, blank=True, default='')
+    # Priority and risk level suggested by the ML model. priority/risk_level
+    # follow the suggestion only while they are at their default or the
+    # previous suggestion, so values set by a person are kept.
+    ml_priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, blank=True, default='')
+    ml_risk_level = models.CharField(max_length=10, choices=RISK_LEVEL_CHOICES, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -95,3 +105,77 @@ class ReportAction(models.Model):
 
     def __str__(self):
         return f"{self.action_type} - Report #{self.report.id}"
+
+class ReportFeatureVector(models.Model):
+    """ML feature vector of a report, stored as a compact float32 blob"""
+    report = models.OneToOneField(Report, on_delete=models.CASCADE, related_name='feature_vector')
+    vector = models.BinaryField()
+    extractor_version = models.PositiveIntegerField()
+    # ml_utils.feature_extractor_tag(): version and the settings the vector depends on
+    extractor_tag = models.CharField(max_length=64, blank=True, default='')
+    text_hash = models.CharField(max_length=64)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Feature vector v{self.extractor_version} - Report #{self.report_id}"
+
+class TranslationMemory(models.Model):
+    """Normalized and translated text of a report, keyed by a hash of the original title and description"""
+    text_hash = models.CharField(max_length=64, unique=True)
+    translator_version = models.PositiveIntegerField()
+    translated_text = models.TextField()
+    is_tagalog = models.BooleanField(default=False)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Translation v{self.translator_version} - {self.text_hash[:12]}"
+
+class MLProcessingTask(models.Model):
+    """Queued request to classify a report with the ML model"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('failed', 'Failed'),
+    ]
+
+    report = models.OneToOneField(Report, on_delete=models.CASCADE, related_name='ml_task')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"ML task ({self.status}) - Report #{self.report_id}"
+
+class MLBatchJob(models.Model):
+    """Background job that classifies stored reports in batches"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    reprocess = models.BooleanField(default=False)
+    barangay = models.CharField(max_length=100, blank=True, default="")
+    limit = models.PositiveIntegerField(null=True, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    recent_errors = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    submitted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ml_batch_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"ML batch job #{self.id} ({self.status})"
@@ -1,5 +1,6 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Report, Category, ReportAction
+from .models import Report, Category, ReportAction, MLBatchJob
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -24,9 +25,10 @@ class ReportSerializer(serializers.ModelSerializer):
             'id', 'title', 'incident_type', 'description', 'barangay', 'latitude', 'longitude',
             'media', 'media_type', 'media_url', 'status', 'submitted_by', 'submitted_by_email', 
             'submitted_by_username', 'is_sensitive', 'has_media', 'verified_by', 'verified_by_username',
-            'verified_at', 'priority', 'risk_level', 'created_at', 'updated_at', 'actions'
+            'verified_at', 'priority', 'risk_level', 'ml_priority', 'ml_risk_level', 'created_at', 'updated_at',
+            'actions'
         ]
-        read_only_fields = ['submitted_by', 'verified_by', 'verified_at', 'has_media']
+        read_only_fields = ['submitted_by', 'verified_by', 'verified_at', 'has_media', 'ml_priority', 'ml_risk_level']
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -46,3 +48,36 @@ class ReportListSerializer(serializers.ModelSerializer):
             'status', 'submitted_by_email', 'submitted_by_username', 'is_sensitive', 
             'has_media', 'priority', 'risk_level', 'created_at'
         ]
+
+class MLBatchJobSerializer(serializers.ModelSerializer):
+    """Progress of a background ML batch job"""
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    progress = serializers.SerializerMethodField()
+    rate = serializers.SerializerMethodField()
+    eta_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MLBatchJob
+        fields = [
+            'job_id', 'status', 'reprocess', 'barangay', 'limit', 'total', 'processed', 'failed',
+            'progress', 'rate', 'eta_seconds', 'recent_errors', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
+
+    def get_progress(self, obj):
+        if not obj.total:
+            return 1.0 if obj.status == 'completed' else 0.0
+        return (obj.processed + obj.failed) / obj.total
+
+    def get_rate(self, obj):
+        """Reports handled per second"""
+        if not obj.started_at:
+            return 0.0
+        elapsed = ((obj.finished_at or timezone.now()) - obj.started_at).total_seconds()
+        return (obj.processed + obj.failed) / elapsed if elapsed > 0 else 0.0
+
+    def get_eta_seconds(self, obj):
+        rate = self.get_rate(obj)
+        if obj.status != 'running' or not rate:
+            return None
+        return max(obj.total - obj.processed - obj.failed, 0) / rate
@@ -0,0 +1,318 @@
+"""
+"Find similar reports": top-k cosine search over report feature vectors
+
+Each web process keeps one float32 matrix with a row per report, built from
+the feature store (extract_text_features output). Cosine similarity is taken
+between vectors centered on the column means of the indexed reports: the
+features every report shares (lengths, average word length, the n-gram
+profile) otherwise put every pair of reports above 0.9. The means change as
+reports come and go, so rows are stored uncentered and centering is folded
+into the query: one pass over the matrix computes both the dot products with
+the centered query and the row norms. np.argpartition then picks the top k,
+with reports outside the caller's barangay scope masked out.
+
+Rows are refreshed incrementally: saved reports are marked stale by the
+Report post_save signal (and picked up from other processes by updated_at)
+and re-read from the feature store before the next query; deleted reports
+are masked out, including ones deleted by other processes, which are found
+when they come up as a match.
+
+Building the matrix reads (and, with a cold feature store, computes) every
+report's vector, so requests never do it: they start a build in a
+background thread and get IndexNotReady until it is done. Set
+PRELOAD_REPORT_INDEXES to start the build when the app starts.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import feature_store
+from .models import Report
+
+# Seconds between checks for reports saved by other processes
+SYNC_SECONDS = 5
+
+# Rows allocated when the matrix grows
+MIN_CAPACITY = 1024
+
+# Feature columns with raw counts (characters, words, punctuation, title and
+# description words), log-scaled so long reports don't dominate the cosine
+COUNT_COLUMNS = [0, 1, 2, 3, 4, 5, 8, 9]
+
+# Columns 488-543 are a digest of the text, which carries no similarity
+DIGEST_START = 488
+
+
+def get_min_similarity():
+    return getattr(settings, 'SIMILAR_REPORTS_MIN_SIMILARITY', 0.3)
+
+
+class IndexNotReady(Exception):
+    """The index is being built in the background"""
+
+
+def similarity_vectors(features):
+    """
+    Turn feature vectors into the (uncentered) vectors compared by the index
+    
+    Returns:
+        np.ndarray: (N, 488) float32 matrix
+    """
+    vectors = np.array(np.atleast_2d(features)[:, :DIGEST_START], dtype=np.float32)
+    vectors[:, COUNT_COLUMNS] = np.log1p(np.maximum(vectors[:, COUNT_COLUMNS], 0))
+    return vectors
+
+
+class SimilarityIndex:
+    """In-memory matrix of report vectors answering top-k cosine queries"""
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._matrix = np.zeros((0, DIGEST_START), dtype=np.float32)
+        self._squared_norms = np.zeros(0, dtype=np.float64)
+        # Column sums over valid rows, for the mean the vectors are centered on
+        self._column_sums = np.zeros(DIGEST_START, dtype=np.float64)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._barangays = np.zeros(0, dtype=np.int32)
+        self._valid = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._rows = {}
+        self._barangay_codes = {}
+        self._stale = set()
+        self._synced_until = None
+        self._next_sync = 0.0
+        self._build_thread = None
+        self._build_lock = threading.Lock()
+        self.build_seconds = None
+        self.queries = 0
+    
+    def _barangay_code(self, barangay):
+        return self._barangay_codes.setdefault(barangay or '', len(self._barangay_codes))
+    
+    def _reserve(self, rows):
+        """Grow the arrays (doubling) so they can hold the given number of rows"""
+        capacity = len(self._ids)
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, MIN_CAPACITY)
+        for name in ('_matrix', '_squared_norms', '_ids', '_barangays', '_valid'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+    
+    def _upsert(self, reports, features):
+        """Store the vectors of reports, replacing the rows they already have"""
+        vectors = similarity_vectors(features)
+        new_reports = [report for report in reports if report.pk not in self._rows]
+        self._reserve(self._size + len(new_reports))
+        for report in new_reports:
+            self._rows[report.pk] = self._size
+            self._size += 1
+        
+        rows = np.array([self._rows[report.pk] for report in reports], dtype=np.int64)
+        replaced = rows[self._valid[rows]]
+        self._column_sums -= self._matrix[replaced].sum(axis=0, dtype=np.float64)
+        self._column_sums += vectors.sum(axis=0, dtype=np.float64)
+        self._matrix[rows] = vectors
+        self._squared_norms[rows] = np.einsum('ij,ij->i', vectors, vectors, dtype=np.float64)
+        self._ids[rows] = [report.pk for report in reports]
+        self._barangays[rows] = [self._barangay_code(report.barangay) for report in reports]
+        self._valid[rows] = True
+        
+        for report in reports:
+            self._stale.discard(report.pk)
+            if self._synced_until is None or report.updated_at > self._synced_until:
+                self._synced_until = report.updated_at
+    
+    def _load(self, queryset):
+        """Read reports and their feature vectors from the feature store in chunks"""
+        queryset = queryset.only(*feature_store.FEATURE_SOURCE_FIELDS, 'barangay', 'updated_at').order_by('pk')
+        chunk = []
+        for report in queryset.iterator(chunk_size=feature_store.FEATURE_STORE_CHUNK_SIZE):
+            chunk.append(report)
+            if len(chunk) >= feature_store.FEATURE_STORE_CHUNK_SIZE:
+                self._upsert(chunk, feature_store.get_feature_vectors(chunk))
+                chunk = []
+        if chunk:
+            self._upsert(chunk, feature_store.get_feature_vectors(chunk))
+    
+    def ensure_built(self, wait=True):
+        """
+        Load every report on first use
+        
+        With wait=False, a missing index is built in a background thread and
+        IndexNotReady is raised instead.
+        """
+        if self._built:
+            return
+        if not wait:
+            self.start_build()
+            raise IndexNotReady()
+        with self._lock:
+            if self._built:
+                return
+            started = time.perf_counter()
+            self._load(Report.objects.all())
+            self.build_seconds = time.perf_counter() - started
+            self._next_sync = time.monotonic() + SYNC_SECONDS
+            self._built = True
+    
+    def _build_in_background(self):
+        try:
+            self.ensure_built()
+        except Exception as e:
+            print(f"Similarity index build failed: {e}")
+        finally:
+            close_old_connections()
+    
+    def start_build(self):
+        """Build the index in a background thread, unless it is built or being built"""
+        with self._build_lock:
+            if self._built or (self._build_thread is not None and self._build_thread.is_alive()):
+                return
+            self._build_thread = threading.Thread(
+                target=self._build_in_background, name='similarity-index-build', daemon=True
+            )
+            self._build_thread.start()
+    
+    def refresh(self, force=False, wait=True):
+        """Re-read reports saved since the last refresh"""
+        self.ensure_built(wait)
+        if not self._stale and not force and time.monotonic() < self._next_sync:
+            return
+        with self._lock:
+            if self._stale:
+                self._load(Report.objects.filter(pk__in=list(self._stale)))
+                # Anything still stale was deleted meanwhile
+                for report_id in self._stale:
+                    self._remove(report_id)
+                self._stale.clear()
+            if force or time.monotonic() >= self._next_sync:
+                queryset = Report.objects.all()
+                if self._synced_until is not None:
+                    queryset = queryset.filter(updated_at__gt=self._synced_until)
+                self._load(queryset)
+                self._next_sync = time.monotonic() + SYNC_SECONDS
+    
+    def mark_stale(self, report_id):
+        """Re-read a report before the next query (no-op until the index is built)"""
+        if self._built:
+            with self._lock:
+                self._stale.add(report_id)
+    
+    def _remove(self, report_id):
+        row = self._rows.get(report_id)
+        if row is not None and self._valid[row]:
+            self._column_sums -= self._matrix[row]
+            self._valid[row] = False
+    
+    def remove(self, report_id):
+        """Leave a deleted report out of all results"""
+        with self._lock:
+            self._stale.discard(report_id)
+            self._remove(report_id)
+    
+    def _top_k(self, row, k, barangays, min_similarity):
+        size = self._size
+        valid = self._valid[:size]
+        mean = (self._column_sums / max(int(valid.sum()), 1)).astype(np.float32)
+        query = self._matrix[row] - mean
+        
+        # (m - mean) . query = m . query - mean . query and
+        # |m - mean|^2 = |m|^2 - 2 m . mean + |mean|^2
+        products = self._matrix[:size] @ np.stack([query, mean], axis=1)
+        dots = products[:, 0] - float(mean @ query)
+        squared_norms = self._squared_norms[:size] - 2 * products[:, 1] + float(mean @ mean)
+        norms = np.sqrt(np.maximum(squared_norms, 0)) * float(np.linalg.norm(query))
+        scores = np.divide(dots, norms, out=np.zeros(size), where=norms > 1e-9)
+        
+        mask = ~valid | (scores < min_similarity)
+        mask[row] = True
+        if barangays is not None:
+            codes = [self._barangay_codes[b] for b in barangays if b in self._barangay_codes]
+            mask |= ~np.isin(self._barangays[:size], codes)
+        scores[mask] = -np.inf
+        
+        k = min(k, size - int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self._ids[i]), min(float(scores[i]), 1.0)) for i in top]
+    
+    def find_similar(self, report_id, k=10, barangays=None, min_similarity=None, wait=True):
+        """
+        Find the reports whose feature vectors are most similar to a report's
+        
+        Args:
+            report_id: Report to find neighbours of
+            k: Number of results
+            barangays: If given, only return reports of these barangays
+            min_similarity: Minimum cosine similarity (defaults to
+                SIMILAR_REPORTS_MIN_SIMILARITY); centered vectors of unrelated
+                reports point away from each other, so scores can be negative
+            wait: If False, raise IndexNotReady while the index is being built
+        
+        Returns:
+            list: (report id, cosine similarity) pairs, most similar first
+        """
+        min_similarity = get_min_similarity() if min_similarity is None else min_similarity
+        self.refresh(wait=wait)
+        if report_id not in self._rows:
+            # Possibly saved by another process since the last sync
+            self.refresh(force=True)
+        
+        while True:
+            with self._lock:
+                row = self._rows.get(report_id)
+                if row is None or not self._valid[row]:
+                    raise KeyError(report_id)
+                neighbours = self._top_k(row, k, barangays, min_similarity)
+                self.queries += 1
+            
+            # Reports deleted by other processes are only found here
+            ids = [neighbour_id for neighbour_id, _ in neighbours]
+            deleted = set(ids) - set(Report.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            if not deleted:
+                return neighbours
+            for neighbour_id in deleted:
+                self.remove(neighbour_id)
+    
+    def get_stats(self):
+        """Get the number of indexed reports and the memory used by the matrix"""
+        with self._lock:
+            return {
+                'built': self._built,
+                'building': self._build_thread is not None and self._build_thread.is_alive(),
+                'reports': int(self._valid[:self._size].sum()),
+                'rows': self._size,
+                'capacity': len(self._ids),
+                'matrix_mb': self._matrix.nbytes / (1024 * 1024),
+                'stale': len(self._stale),
+                'build_seconds': self.build_seconds,
+                'queries': self.queries,
+            }
+
+
+# Index of this process
+similarity_index = SimilarityIndex()
+
+
+def get_similarity_index():
+    """Get the similarity index of this process"""
+    return similarity_index
+
+
+def report_saved(sender, instance, **kwargs):
+    """post_save handler marking the report's vector for refresh"""
+    similarity_index.mark_stale(instance.pk)
+
+
+def report_deleted(sender, instance, **kwargs):
+    """post_delete handler removing the report from results"""
+    similarity_index.remove(instance.pk)
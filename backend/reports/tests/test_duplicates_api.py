@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reports import duplicate_index
+from reports.models import Report
+
+TEXT = 'Someone snatched my cellphone near the public market entrance this morning'
+
+
+def create_report(title, description=TEXT, barangay='San Roque', latitude=14.6, longitude=121.0):
+    return Report.objects.create(
+        title=title, incident_type='Theft', description=description, barangay=barangay,
+        latitude=latitude, longitude=longitude,
+    )
+
+
+class DuplicatesEndpointTests(TestCase):
+    def setUp(self):
+        self.index = duplicate_index.DuplicateIndex()
+        mock.patch.object(duplicate_index, 'duplicate_index', self.index).start()
+        self.addCleanup(mock.patch.stopall)
+        
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='secret', is_admin=True
+        )
+        self.resident = User.objects.create_user(
+            username='resident', email='resident@example.com', password='secret', barangay='San Roque'
+        )
+        self.client = APIClient()
+        
+        self.report = create_report('Cellphone snatched')
+        self.same_barangay = create_report('Snatched cellphone')
+        self.other_barangay = create_report('Cellphone snatching', barangay='Santo Nino')
+        # About 11 km north
+        self.far_away = create_report('Cellphone snatched at market', latitude=14.7)
+        self.unrelated = create_report('Stray dog', description='A stray dog bit a child beside the basketball court')
+    
+    def get(self, **params):
+        return self.client.get(reverse('report-duplicates', args=[self.report.pk]), params)
+    
+    def ids(self, response):
+        return {duplicate['id'] for duplicate in response.data['duplicates']}
+    
+    def test_duplicates_are_reported_close_in_space_and_text(self):
+        self.index.ensure_built()
+        self.client.force_authenticate(self.admin)
+        
+        response = self.get()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids(response), {self.same_barangay.pk, self.other_barangay.pk})
+        self.assertEqual(response.data['count'], 2)
+        for duplicate in response.data['duplicates']:
+            self.assertGreaterEqual(duplicate['similarity'], duplicate_index.get_min_similarity())
+            self.assertLess(duplicate['distance_km'], duplicate_index.get_radius_km())
+        
+        self.assertIn(self.far_away.pk, self.ids(self.get(radius_km=20)))
+    
+    def test_residents_only_see_duplicates_in_their_barangay(self):
+        self.index.ensure_built()
+        self.client.force_authenticate(self.resident)
+        
+        self.assertEqual(self.ids(self.get()), {self.same_barangay.pk})
+    
+    def test_reports_saved_after_the_build_are_found(self):
+        self.index.ensure_built()
+        later = create_report('Phone snatched')
+        self.client.force_authenticate(self.admin)
+        
+        self.assertIn(later.pk, self.ids(self.get()))
+    
+    def test_invalid_parameter_is_rejected(self):
+        self.client.force_authenticate(self.admin)
+        
+        response = self.get(radius_km='near')
+        
+        self.assertEqual(response.status_code, 400)
+    
+    def test_unavailable_while_the_index_is_built(self):
+        self.client.force_authenticate(self.admin)
+        
+        with mock.patch.object(self.index, 'start_build') as start_build:
+            response = self.get()
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '10')
+        start_build.assert_called_once_with()
@@ -0,0 +1,40 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+import ml_utils
+
+
+class BatchFeatureExtractionTests(SimpleTestCase):
+    ROWS = [
+        ('Stolen cellphone', 'Someone stole my cellphone at the market', 'Theft', 'someone stole my cellphone at the market'),
+        ('Nanakaw', 'Ninakaw ang selpon ko sa palengke', 'Theft', 'stolen the cellphone my at market'),
+        ('', '', '', ''),
+        ('Loud karaoke', 'Neighbors singing until 3am ' * 50, 'Noise', None),
+        ('URGENT!!! Help', 'Emergency, a man was assaulted near the school', 'Assault/Harassment', ''),
+        ('Missing child', 'Bata nawawala since yesterday, please help', 'Missing Person', 'child missing since yesterday'),
+        ('Drugs', 'Shabu being sold at the corner', 'Drugs Addiction', 'shabu being sold at the corner'),
+    ]
+    
+    def per_row_features(self):
+        return np.stack([ml_utils.extract_text_features(*row) for row in self.ROWS])
+    
+    def test_batch_matches_per_row_extractor(self):
+        batch = ml_utils.extract_text_features_batch(self.ROWS)
+        
+        self.assertEqual(batch.shape, (len(self.ROWS), ml_utils.FEATURE_VECTOR_SIZE))
+        self.assertEqual(batch.dtype, np.float32)
+        np.testing.assert_array_equal(batch, self.per_row_features())
+    
+    def test_process_pool_matches_per_row_extractor(self):
+        batch = ml_utils.extract_text_features_batch(self.ROWS * 3, workers=2, chunk_size=4)
+        np.testing.assert_array_equal(batch, np.concatenate([self.per_row_features()] * 3))
+    
+    def test_long_texts_are_not_capped_by_default(self):
+        row = ('Noise complaint', 'karaoke until dawn, very loud ' * 1500, 'Noise', 'karaoke until dawn ' * 1500)
+        
+        default = ml_utils.extract_text_features_batch([row])
+        np.testing.assert_array_equal(default, ml_utils.extract_text_features_batch([row], max_chars=0))
+        
+        capped = ml_utils.extract_text_features_batch([row], max_chars=10000)
+        self.assertFalse(np.array_equal(default, capped))
+        self.assertNotEqual(ml_utils.feature_extractor_tag(), ml_utils.feature_extractor_tag(max_chars=10000))
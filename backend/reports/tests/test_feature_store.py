@@ -0,0 +1,51 @@
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+
+import ml_utils
+from reports import feature_store
+from reports.models import Report, ReportFeatureVector
+
+
+class FeatureStoreTests(TestCase):
+    def setUp(self):
+        self.report = Report.objects.create(
+            title='Stolen cellphone', incident_type='Theft', description='Someone stole my cellphone at the market',
+            latitude=14.6, longitude=121.0,
+        )
+        self.extract = mock.patch.object(
+            ml_utils, 'extract_text_features_batch', wraps=ml_utils.extract_text_features_batch
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+    
+    def test_stored_vector_is_reused(self):
+        first = feature_store.get_feature_vector(self.report)
+        second = feature_store.get_feature_vector(Report.objects.get(pk=self.report.pk))
+        
+        self.assertEqual(self.extract.call_count, 1)
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(ReportFeatureVector.objects.count(), 1)
+    
+    def test_vector_is_recomputed_when_text_changes(self):
+        before = feature_store.get_feature_vector(self.report)
+        stored_hash = ReportFeatureVector.objects.get(report=self.report).text_hash
+        
+        self.report.description = 'A dog bit my neighbour near the chapel'
+        self.report.save()
+        after = feature_store.get_feature_vector(self.report)
+        
+        self.assertEqual(self.extract.call_count, 2)
+        self.assertFalse(np.array_equal(before, after))
+        entry = ReportFeatureVector.objects.get(report=self.report)
+        self.assertNotEqual(entry.text_hash, stored_hash)
+        np.testing.assert_array_equal(feature_store.decode_vectors([entry.vector])[0], after)
+    
+    def test_vector_is_recomputed_when_extractor_changes(self):
+        feature_store.get_feature_vector(self.report)
+        
+        with mock.patch.object(ml_utils, 'feature_extractor_tag', return_value='other-extractor'):
+            feature_store.get_feature_vector(self.report)
+            self.assertEqual(ReportFeatureVector.objects.get(report=self.report).extractor_tag, 'other-extractor')
+        
+        self.assertEqual(self.extract.call_count, 2)
@@ -0,0 +1,125 @@
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.test import SimpleTestCase
+
+import ml_utils
+from reports.inference_server import InferenceServer, MicroBatcher
+
+MODEL_PATH = Path(ml_utils.__file__).parent / 'best_model.tflite'
+
+
+def feature_rows(count, seed=0):
+    return np.random.default_rng(seed).exponential(size=(count, ml_utils.FEATURE_VECTOR_SIZE)).astype(np.float32)
+
+
+@skipUnless(MODEL_PATH.exists(), 'needs best_model.tflite')
+class InferenceServerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if not ml_utils.warm_up_model():
+            raise cls.failureException('ML model could not be loaded')
+        
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.socket_path = str(Path(cls.directory.name) / 'inference.sock')
+        cls.server = InferenceServer(cls.socket_path, window=0.002)
+        ready = threading.Event()
+        
+        def serve():
+            cls.loop = asyncio.new_event_loop()
+            cls.task = cls.loop.create_task(cls.server.serve(ready.set))
+            try:
+                cls.loop.run_until_complete(cls.task)
+            except asyncio.CancelledError:
+                pass
+        
+        cls.thread = threading.Thread(target=serve, daemon=True)
+        cls.thread.start()
+        if not ready.wait(10):
+            raise cls.failureException('Inference server did not start')
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.task.cancel)
+        cls.thread.join(10)
+        cls.directory.cleanup()
+        super().tearDownClass()
+    
+    def test_client_round_trip_matches_in_process_predictions(self):
+        client = ml_utils.InferenceClient(self.socket_path)
+        rows = feature_rows(5)
+        
+        remote = client.predict_incident_category(rows, return_probabilities=True)
+        local = ml_utils.get_model_manager().predict_incident_category(rows, return_probabilities=True)
+        
+        self.assertEqual([p['predicted_category'] for p in remote], [p['predicted_category'] for p in local])
+        np.testing.assert_allclose([p['confidence'] for p in remote], [p['confidence'] for p in local], rtol=1e-5)
+        self.assertEqual(remote[0]['top_5_predictions'], [tuple(pair) for pair in local[0]['top_5_predictions']])
+        self.assertEqual(client.get_model_version(), ml_utils.get_model_manager().model_version)
+    
+    def test_wrong_width_is_rejected_and_server_keeps_serving(self):
+        client = ml_utils.InferenceClient(self.socket_path)
+        
+        with self.assertRaisesRegex(ValueError, 'feature columns'):
+            client.predict_incident_category(np.zeros((1, 10), dtype=np.float32))
+        
+        prediction = client.predict_incident_category(feature_rows(1)[0])
+        self.assertIn('predicted_category', prediction)
+    
+    def test_server_batches_skip_the_in_process_coalescer(self):
+        client = ml_utils.InferenceClient(self.socket_path)
+        with mock.patch.object(ml_utils.model_registry, 'predict_incident_category', side_effect=AssertionError):
+            predictions = client.predict_incident_category(feature_rows(3))
+        self.assertEqual(len(predictions), 3)
+
+
+@skipUnless(MODEL_PATH.exists(), 'needs best_model.tflite')
+class MicroBatcherTests(SimpleTestCase):
+    def test_malformed_request_fails_its_batch_without_killing_the_batcher(self):
+        ml_utils.warm_up_model()
+        executor = ThreadPoolExecutor(max_workers=1)
+        
+        async def scenario():
+            batcher = MicroBatcher(None, executor, window=0.05)
+            try:
+                first = await asyncio.gather(
+                    batcher.submit(feature_rows(1), False),
+                    batcher.submit(np.zeros((1, 10), dtype=np.float32), False),
+                    return_exceptions=True,
+                )
+                second = await asyncio.wait_for(batcher.submit(feature_rows(2), False), 10)
+                return first, second
+            finally:
+                batcher.close()
+        
+        try:
+            first, second = asyncio.run(scenario())
+        finally:
+            executor.shutdown()
+        
+        self.assertIsInstance(first[0], ValueError)
+        self.assertIsInstance(first[1], ValueError)
+        self.assertEqual(len(second), 2)
+
+
+class InferenceClientFallbackTests(SimpleTestCase):
+    def test_predictions_fall_back_in_process_when_server_is_down(self):
+        client = ml_utils.InferenceClient('/nonexistent/inference.sock', retry_seconds=60)
+        expected = object()
+        
+        with mock.patch.object(ml_utils, 'inference_client', client), \
+                mock.patch.object(ml_utils.model_registry, 'predict_incident_category', return_value=expected) as local:
+            self.assertIs(ml_utils.predict_incident_category(feature_rows(1)[0]), expected)
+            self.assertIs(ml_utils.predict_incident_category(feature_rows(1)[0]), expected)
+        
+        self.assertEqual(local.call_count, 2)
+        # The server is skipped after the first failure
+        self.assertEqual(client.failures, 1)
+        self.assertFalse(client.available())
+        self.assertIsNotNone(client.last_error)
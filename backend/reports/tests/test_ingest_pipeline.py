@@ -0,0 +1,102 @@
+from django.test import SimpleTestCase, TestCase
+
+from reports import ingest_pipeline
+from reports.models import Report
+from reports.serializers import ReportSerializer
+
+
+class ExplodingStage(ingest_pipeline.Stage):
+    """Fails any chunk that contains a record titled "boom\""""
+    
+    name = 'explode'
+    
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+    
+    def process(self, records):
+        self.calls.append(len(records))
+        if any(record.get('title') == 'boom' for record in records):
+            raise ValueError('boom')
+
+
+class MarkStage(ingest_pipeline.Stage):
+    """Records which records reached it"""
+    
+    name = 'mark'
+    
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+    
+    def process(self, records):
+        self.seen.extend(record.get('title') for record in records)
+
+
+def report_data(title, **fields):
+    data = {
+        'title': title,
+        'incident_type': 'Theft',
+        'description': f'{title}: someone stole a cellphone at the market',
+        'latitude': 14.6,
+        'longitude': 121.0,
+    }
+    data.update(fields)
+    return data
+
+
+class StageIsolationTests(SimpleTestCase):
+    def run_pipeline(self, titles, threaded):
+        exploding, mark = ExplodingStage(), MarkStage()
+        pipeline = ingest_pipeline.IngestPipeline([exploding, mark], chunk_size=4, threaded=threaded)
+        records = [
+            record for chunk in pipeline.run(ingest_pipeline.records_from_data({'title': title} for title in titles))
+            for record in chunk
+        ]
+        return records, exploding, mark
+    
+    def assert_failure_isolated(self, threaded):
+        titles = ['a', 'b', 'boom', 'c', 'd', 'e']
+        records, exploding, mark = self.run_pipeline(titles, threaded)
+        
+        self.assertEqual([record.get('title') for record in records], titles)
+        failed = [record for record in records if record.failed]
+        self.assertEqual([record.get('title') for record in failed], ['boom'])
+        self.assertEqual(failed[0].failed_stage, 'explode')
+        self.assertEqual(str(failed[0].error), 'boom')
+        
+        # The failing chunk is retried one record at a time; the next chunk runs whole
+        self.assertEqual(exploding.calls, [4, 1, 1, 1, 1, 2])
+        self.assertEqual(mark.seen, ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(exploding.stats['failed'], 1)
+    
+    def test_failing_record_is_isolated_within_its_chunk(self):
+        self.assert_failure_isolated(threaded=False)
+    
+    def test_failing_record_is_isolated_in_threaded_pipeline(self):
+        self.assert_failure_isolated(threaded=True)
+
+
+class IngestPersistTests(TestCase):
+    def test_chunk_is_saved_without_failed_records(self):
+        pipeline = ingest_pipeline.IngestPipeline([
+            ingest_pipeline.ValidateStage(ReportSerializer),
+            ExplodingStage(),
+            ingest_pipeline.PersistStage(),
+        ], chunk_size=10)
+        data = [
+            report_data('Stolen wallet'),
+            report_data('Missing coordinates', latitude=None),
+            report_data('boom'),
+            report_data('Stolen bicycle'),
+        ]
+        
+        records = pipeline.process(ingest_pipeline.records_from_data(data))
+        
+        self.assertEqual([record.failed_stage for record in records], [None, 'validate', 'explode', None])
+        self.assertEqual(
+            sorted(Report.objects.values_list('title', flat=True)), ['Stolen bicycle', 'Stolen wallet']
+        )
+        self.assertEqual(records[0].report.title, 'Stolen wallet')
+        self.assertIsNone(records[2].report)
+        self.assertEqual(pipeline.get_stats()['failed'], 2)
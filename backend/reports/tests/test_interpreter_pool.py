@@ -0,0 +1,81 @@
+import threading
+import time
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.test import SimpleTestCase
+
+import ml_utils
+
+MODEL_PATH = Path(ml_utils.__file__).parent / 'best_model.tflite'
+
+
+class InterpreterPoolTests(SimpleTestCase):
+    def test_checkout_times_out_when_pool_is_exhausted(self):
+        pool = ml_utils.InterpreterPool(object, max_size=1)
+        interpreter = pool.checkout()
+        
+        with self.assertRaises(TimeoutError):
+            pool.checkout(timeout=0.05)
+        
+        pool.checkin(interpreter)
+        self.assertIs(pool.checkout(timeout=0.05), interpreter)
+        stats = pool.get_stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+    
+    def test_waiting_checkout_gets_interpreter_checked_in(self):
+        pool = ml_utils.InterpreterPool(object, max_size=1)
+        interpreter = pool.checkout()
+        leased = []
+        
+        waiter = threading.Thread(target=lambda: leased.append(pool.checkout(timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+        pool.checkin(interpreter)
+        waiter.join()
+        
+        self.assertEqual(leased, [interpreter])
+    
+    def test_failed_factory_frees_its_slot(self):
+        calls = []
+        
+        def factory():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError('could not create interpreter')
+            return object()
+        
+        pool = ml_utils.InterpreterPool(factory, max_size=1)
+        with self.assertRaises(RuntimeError):
+            pool.checkout()
+        
+        with pool.lease(timeout=0.05) as interpreter:
+            self.assertIsNotNone(interpreter)
+        self.assertEqual(pool.get_stats()['created'], 1)
+
+
+@skipUnless(ml_utils.TFLITE_AVAILABLE and MODEL_PATH.exists(), 'needs tflite-runtime or tensorflow and best_model.tflite')
+class LoadedModelMemoryTests(SimpleTestCase):
+    def load(self, xnnpack):
+        ml_utils.load_runtime()
+        with mock.patch.object(ml_utils, 'INTERPRETER_XNNPACK', xnnpack):
+            model = ml_utils.LoadedModel(ml_utils.ModelSource(MODEL_PATH), pool_size=2, num_threads=1)
+            model.invoke(np.zeros((4, ml_utils.FEATURE_VECTOR_SIZE), dtype=np.float32))
+        return model
+    
+    def test_xnnpack_copies_are_counted_per_interpreter(self):
+        model = self.load(xnnpack=True)
+        stats = model.get_memory_stats()
+        
+        # One interpreter for single rows, one for the batch of 4
+        self.assertTrue(stats['xnnpack'])
+        self.assertAlmostEqual(stats['estimated_xnnpack_mb'], 2 * model.source.size / (1024 * 1024))
+        self.assertEqual(model.memory_bytes(), model.source.size + model.tensor_bytes() + 2 * model.source.size)
+    
+    def test_no_xnnpack_memory_without_delegates(self):
+        stats = self.load(xnnpack=False).get_memory_stats()
+        
+        self.assertFalse(stats['xnnpack'])
+        self.assertEqual(stats['estimated_xnnpack_mb'], 0)
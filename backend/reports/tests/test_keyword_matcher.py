@@ -0,0 +1,39 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+import ml_utils
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    TEXTS = [
+        '',
+        'someone stole my cellphone, a robbery and another robbery near the market',
+        'nanakaw ang cellphone ko sa palengke, tulong po, emergency',
+        'drugs drug drugsdrugs shabu shabushabu',
+        'the suspect assaulted and harassed the victim urgently asking for help!!!',
+        'ooooo aaaa abababab',
+    ]
+    
+    def assert_matches_str_count(self, keywords, text):
+        counts = ml_utils.KeywordMatcher(keywords).count(text)
+        self.assertEqual(counts.tolist(), [text.count(keyword) for keyword in keywords], text)
+    
+    def test_feature_keywords_match_str_count(self):
+        for text in self.TEXTS:
+            self.assert_matches_str_count(ml_utils.FEATURE_KEYWORDS, text)
+    
+    def test_prefix_and_self_overlapping_keywords_match_str_count(self):
+        keywords = ['drug', 'drugs', 'oo', 'ooo', 'abab', 'a', 'aa']
+        for text in self.TEXTS:
+            self.assert_matches_str_count(keywords, text)
+    
+    def test_random_texts_match_str_count(self):
+        rng = np.random.default_rng(0)
+        vocabulary = ml_utils.FEATURE_KEYWORDS + ['a', ' ', 'ing', 'x']
+        for _ in range(200):
+            text = ''.join(rng.choice(vocabulary, size=rng.integers(1, 30)))
+            self.assert_matches_str_count(ml_utils.FEATURE_KEYWORDS, text)
+    
+    def test_word_boundary_counts_whole_words(self):
+        matcher = ml_utils.KeywordMatcher(['drug', 'drugs'], word_boundary=True)
+        self.assertEqual(matcher.count('drug drugs drugstore').tolist(), [1, 1])
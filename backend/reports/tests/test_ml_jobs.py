@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reports import ingest_pipeline, ml_jobs
+from reports.models import Report
+
+
+def predict(stage, records):
+    if any(record.report.title == 'boom' for record in records):
+        raise ValueError('model failed')
+    for record in records:
+        record.prediction = {'predicted_category': 'Accident', 'confidence': 0.9, 'model_version': 'test'}
+
+
+class BatchJobAPITests(TransactionTestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='secret', is_admin=True
+        )
+        self.resident = User.objects.create_user(username='resident', email='resident@example.com', password='secret')
+        self.client = APIClient()
+        
+        for title in ['Stolen wallet', 'boom', 'Stolen bicycle']:
+            Report.objects.create(
+                title=title, incident_type='Theft', description=f'{title} at the market', latitude=14.6, longitude=121.0
+            )
+        Report.objects.create(
+            title='Already scored', incident_type='Theft', description='Scored before', latitude=14.6, longitude=121.0,
+            ml_processed=True,
+        )
+    
+    def submit(self, **data):
+        # Jobs are run in the test thread instead of the job executor
+        with mock.patch.object(ml_jobs._executor, 'submit') as submit:
+            response = self.client.post(reverse('batch_process_reports'), data, format='json')
+        return response, submit
+    
+    def test_job_reports_status_and_counts(self):
+        self.client.force_authenticate(self.admin)
+        response, submit = self.submit()
+        
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['job_id']
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertTrue(response.data['status_url'].endswith(reverse('batch_job_status', args=[job_id])))
+        submit.assert_called_once_with(ml_jobs.run_batch_job, job_id)
+        
+        with mock.patch.object(ingest_pipeline.FeatureStage, 'process'), \
+                mock.patch.object(ingest_pipeline.PredictStage, 'process', predict):
+            ml_jobs.run_batch_job(job_id)
+        
+        data = self.client.get(reverse('batch_job_status', args=[job_id])).data
+        self.assertEqual(data['status'], 'completed')
+        self.assertEqual((data['total'], data['processed'], data['failed']), (3, 2, 1))
+        self.assertEqual(data['progress'], 1.0)
+        self.assertIsNone(data['eta_seconds'])
+        self.assertEqual(data['recent_errors'], [
+            {'id': Report.objects.get(title='boom').pk, 'error': 'model failed'}
+        ])
+    
+    def test_limit_caps_the_job(self):
+        self.client.force_authenticate(self.admin)
+        response, _ = self.submit(limit=1)
+        
+        with mock.patch.object(ingest_pipeline.FeatureStage, 'process'), \
+                mock.patch.object(ingest_pipeline.PredictStage, 'process', predict):
+            ml_jobs.run_batch_job(response.data['job_id'])
+        
+        data = self.client.get(reverse('batch_job_status', args=[response.data['job_id']])).data
+        self.assertEqual((data['total'], data['processed'], data['failed']), (1, 1, 0))
+    
+    def test_jobs_are_admin_only(self):
+        self.client.force_authenticate(self.admin)
+        job_id = self.submit()[0].data['job_id']
+        
+        self.client.force_authenticate(self.resident)
+        response, submit = self.submit()
+        self.assertEqual(response.status_code, 403)
+        submit.assert_not_called()
+        self.assertEqual(self.client.get(reverse('batch_job_status', args=[job_id])).status_code, 403)
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from reports import ingest_pipeline, ml_queue
+from reports.models import MLProcessingTask, Report
+
+
+def create_report(title='Stolen cellphone'):
+    return Report.objects.create(
+        title=title, incident_type='Theft', description=f'{title} at the market', latitude=14.6, longitude=121.0
+    )
+
+
+class MLQueueTests(TestCase):
+    def setUp(self):
+        self.reports = [create_report(f'Report {i}') for i in range(3)]
+        ml_queue.enqueue_reports([report.pk for report in self.reports])
+    
+    def test_claim_marks_tasks_processing(self):
+        tasks = ml_queue._claim_tasks(2)
+        
+        self.assertEqual([task.report_id for task in tasks], [report.pk for report in self.reports[:2]])
+        for task in MLProcessingTask.objects.filter(id__in=[task.id for task in tasks]):
+            self.assertEqual(task.status, 'processing')
+            self.assertEqual(task.attempts, 1)
+            self.assertIsNotNone(task.started_at)
+        
+        # Claimed tasks are not handed out again
+        self.assertEqual([task.report_id for task in ml_queue._claim_tasks(10)], [self.reports[2].pk])
+        self.assertEqual(ml_queue._claim_tasks(10), [])
+    
+    def test_finish_deletes_tasks(self):
+        tasks = ml_queue._claim_tasks(10)
+        ml_queue._finish_tasks(tasks)
+        
+        self.assertFalse(MLProcessingTask.objects.exists())
+    
+    def test_finish_keeps_tasks_requeued_while_processing(self):
+        tasks = ml_queue._claim_tasks(10)
+        ml_queue.enqueue_reports([self.reports[0].pk])
+        ml_queue._finish_tasks(tasks)
+        
+        task = MLProcessingTask.objects.get()
+        self.assertEqual(task.report_id, self.reports[0].pk)
+        self.assertEqual(task.status, 'pending')
+    
+    def test_failed_task_is_retried_until_max_attempts(self):
+        tasks = ml_queue._claim_tasks(10)
+        ml_queue._fail_task(tasks[0], ValueError('model failed'))
+        ml_queue._finish_tasks(tasks[1:])
+        
+        for attempt in range(2, ml_queue.MAX_ATTEMPTS + 1):
+            task, = ml_queue._claim_tasks(10)
+            self.assertEqual(task.attempts, attempt)
+            ml_queue._fail_task(task, ValueError('model failed'))
+        
+        task = MLProcessingTask.objects.get()
+        self.assertEqual(task.report_id, self.reports[0].pk)
+        self.assertEqual(task.status, 'failed')
+        self.assertEqual(task.last_error, 'model failed')
+        self.assertEqual(ml_queue._claim_tasks(10), [])
+    
+    def test_stuck_task_is_reclaimed(self):
+        tasks = ml_queue._claim_tasks(1)
+        self.assertEqual(len(tasks), 1)
+        MLProcessingTask.objects.filter(id=tasks[0].id).update(
+            started_at=timezone.now() - ml_queue.STALE_AFTER - timedelta(minutes=1)
+        )
+        
+        reclaimed = [task for task in ml_queue._claim_tasks(10) if task.id == tasks[0].id]
+        self.assertEqual(len(reclaimed), 1)
+        self.assertEqual(reclaimed[0].attempts, 2)
+    
+    def test_process_next_batch_isolates_failed_reports(self):
+        failing = self.reports[1]
+        
+        def score(reports):
+            return [report for report in reports if report.pk != failing.pk], [(failing, ValueError('bad text'))]
+        
+        with mock.patch.object(ml_queue, 'score_reports_safely', side_effect=score):
+            self.assertEqual(ml_queue.process_next_batch(10), (2, 1))
+        
+        task = MLProcessingTask.objects.get()
+        self.assertEqual(task.report_id, failing.pk)
+        self.assertEqual(task.status, 'pending')
+        self.assertEqual(task.last_error, 'bad text')
+    
+    def test_worker_drains_queue(self):
+        worker = ml_queue.MLQueueWorker(batch_size=2)
+        
+        with mock.patch.object(ml_queue.ml_utils, 'is_model_ready', return_value=True), \
+                mock.patch.object(ml_queue, 'score_reports_safely', side_effect=lambda reports: (reports, [])):
+            self.assertEqual(worker.drain(), 3)
+        
+        self.assertFalse(MLProcessingTask.objects.exists())
+        stats = worker.get_stats()
+        self.assertEqual((stats['processed'], stats['failed'], stats['batches']), (3, 0, 2))
+
+
+class MLQueuePriorityTests(TestCase):
+    def score(self, confidence):
+        prediction = {'predicted_category': 'Accident', 'confidence': confidence, 'model_version': 'test'}
+        
+        def predict(stage, records):
+            for record in records:
+                record.prediction = dict(prediction)
+        
+        with mock.patch.object(ingest_pipeline.FeatureStage, 'process'), \
+                mock.patch.object(ingest_pipeline.PredictStage, 'process', predict):
+            self.assertEqual(ml_queue.process_next_batch(10), (2, 0))
+    
+    def test_priority_set_by_a_person_is_kept(self):
+        left_default, set_by_admin = create_report('Left at default'), create_report('Set by admin')
+        Report.objects.filter(pk=set_by_admin.pk).update(priority='Medium', risk_level='Medium')
+        
+        ml_queue.enqueue_reports([left_default.pk, set_by_admin.pk])
+        self.score(0.95)
+        
+        left_default.refresh_from_db()
+        set_by_admin.refresh_from_db()
+        self.assertEqual((left_default.priority, left_default.risk_level), ('High', 'High'))
+        self.assertEqual((set_by_admin.priority, set_by_admin.risk_level), ('Medium', 'Medium'))
+        self.assertEqual((set_by_admin.ml_priority, set_by_admin.ml_risk_level), ('High', 'High'))
+        
+        # A later prediction still replaces the previous suggestion, but not the admin's value
+        ml_queue.enqueue_reports([left_default.pk, set_by_admin.pk])
+        self.score(0.1)
+        
+        left_default.refresh_from_db()
+        set_by_admin.refresh_from_db()
+        self.assertEqual((left_default.priority, left_default.ml_priority), ('Low', 'Low'))
+        self.assertEqual((set_by_admin.priority, set_by_admin.ml_priority), ('Medium', 'Low'))
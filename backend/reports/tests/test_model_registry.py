@@ -0,0 +1,63 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+import ml_utils
+
+MODEL_PATH = Path(ml_utils.__file__).parent / 'best_model.tflite'
+
+
+@skipUnless(ml_utils.TFLITE_AVAILABLE and MODEL_PATH.exists(), 'needs tflite-runtime or tensorflow and best_model.tflite')
+class ModelRegistryEvictionTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        models = {}
+        for name in ('general', 'tagalog', 'english'):
+            shutil.copy(MODEL_PATH, Path(directory.name) / f'{name}.tflite')
+            models[name] = {'path': f'{name}.tflite'}
+        models['tagalog']['languages'] = ['tagalog']
+        (Path(directory.name) / 'manifest.json').write_text(json.dumps({'default': 'general', 'models': models}))
+        
+        self.registry = ml_utils.ModelRegistry(directory.name, memory_budget_mb=1024)
+    
+    def loaded(self):
+        return sorted(name for name in self.registry.names() if self.registry.get_manager(name).model_loaded)
+    
+    def test_least_recently_used_model_is_evicted_over_budget(self):
+        self.assertTrue(self.registry.acquire('general').model_loaded)
+        # Room for two models at a time
+        self.registry.memory_budget = int(self.registry.get_manager('general').memory_bytes() * 2.5)
+        
+        self.registry.acquire('tagalog')
+        self.assertEqual(self.loaded(), ['general', 'tagalog'])
+        
+        self.registry.acquire('english')
+        self.assertEqual(self.loaded(), ['english', 'tagalog'])
+        
+        # Using tagalog makes english the least recently used one
+        self.registry.acquire('tagalog')
+        self.registry.acquire('general')
+        self.assertEqual(self.loaded(), ['general', 'tagalog'])
+        
+        stats = self.registry.get_stats()
+        self.assertEqual(self.registry.evictions, 2)
+        self.assertEqual(stats['models']['general']['evictions'], 1)
+        self.assertEqual(stats['models']['general']['loads'], 2)
+        self.assertEqual(stats['models']['english']['evictions'], 1)
+    
+    def test_model_in_use_is_kept_even_over_budget(self):
+        self.registry.memory_budget = 1
+        
+        self.registry.acquire('general')
+        self.registry.acquire('tagalog')
+        
+        self.assertEqual(self.loaded(), ['tagalog'])
+    
+    def test_language_selects_model(self):
+        self.assertEqual(self.registry.model_for_language('tagalog'), 'tagalog')
+        self.assertEqual(self.registry.model_for_language('english'), 'general')
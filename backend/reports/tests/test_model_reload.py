@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest import skipUnless
+
+import numpy as np
+from django.test import SimpleTestCase
+
+import ml_utils
+
+MODEL_PATH = Path(ml_utils.__file__).parent / 'best_model.tflite'
+
+
+@skipUnless(ml_utils.TFLITE_AVAILABLE and MODEL_PATH.exists(), 'needs tflite-runtime or tensorflow and best_model.tflite')
+class HotReloadTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model_path = Path(shutil.copy(MODEL_PATH, Path(directory.name) / 'model.tflite'))
+        self.manager = ml_utils.MLModelManager(model_path=self.model_path, pool_size=1, num_threads=1)
+        self.assertTrue(self.manager.ensure_loaded())
+        self.rows = np.random.default_rng(0).exponential(size=(3, ml_utils.FEATURE_VECTOR_SIZE)).astype(np.float32)
+    
+    def replace_model_file(self, content):
+        # Replaced by rename, as a deploy would, so the mapped old file is untouched
+        temp_path = self.model_path.with_name('model.tflite.tmp')
+        temp_path.write_bytes(content)
+        temp_path.replace(self.model_path)
+    
+    def test_prediction_in_flight_finishes_on_its_version(self):
+        old_model = self.manager._active
+        entered, release = threading.Event(), threading.Event()
+        invoke = old_model.invoke
+        
+        def blocking_invoke(batch):
+            entered.set()
+            release.wait(10)
+            return invoke(batch)
+        
+        old_model.invoke = blocking_invoke
+        results = []
+        worker = threading.Thread(
+            target=lambda: results.append(self.manager.predict_incident_category(self.rows))
+        )
+        worker.start()
+        self.assertTrue(entered.wait(10))
+        
+        # Swap the model while the prediction is blocked inside the old version
+        # Same weights, different content, so the reload sees a new version
+        self.replace_model_file(MODEL_PATH.read_bytes() + b'\0')
+        entry = self.manager.reload_model()
+        self.assertEqual(entry['status'], 'reloaded')
+        self.assertEqual(entry['previous_version'], old_model.version)
+        self.assertNotEqual(self.manager.model_version, old_model.version)
+        
+        release.set()
+        worker.join(10)
+        
+        in_flight, = results
+        self.assertEqual({prediction['model_version'] for prediction in in_flight}, {old_model.version})
+        after = self.manager.predict_incident_category(self.rows)
+        self.assertEqual({prediction['model_version'] for prediction in after}, {self.manager.model_version})
+        self.assertEqual(
+            [prediction['predicted_category'] for prediction in in_flight],
+            [prediction['predicted_category'] for prediction in after],
+        )
+    
+    def test_failed_reload_keeps_the_active_version(self):
+        version = self.manager.model_version
+        self.replace_model_file(b'not a model')
+        
+        entry = self.manager.reload_model()
+        
+        self.assertEqual(entry['status'], 'failed')
+        self.assertEqual(self.manager.model_version, version)
+        self.assertEqual(len(self.manager.predict_incident_category(self.rows)), 3)
+    
+    def test_unchanged_content_is_not_reloaded(self):
+        model = self.manager._active
+        self.replace_model_file(MODEL_PATH.read_bytes())
+        
+        self.assertEqual(self.manager.reload_model()['status'], 'unchanged')
+        self.assertIs(self.manager._active, model)
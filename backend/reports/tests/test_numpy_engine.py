@@ -0,0 +1,61 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.test import SimpleTestCase
+
+import ml_utils
+
+MODEL_PATH = Path(ml_utils.__file__).parent / 'best_model.tflite'
+
+
+@skipUnless(ml_utils.TFLITE_AVAILABLE and MODEL_PATH.exists(), 'needs tflite-runtime or tensorflow and best_model.tflite')
+class NumpyEngineTests(SimpleTestCase):
+    def test_converted_model_matches_tflite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            npz_path = ml_utils.convert_tflite_to_numpy(MODEL_PATH, Path(directory) / 'model.npz')
+            parity = ml_utils.check_numpy_parity(MODEL_PATH, npz_path, rows=128)
+        
+        self.assertEqual(parity['rows'], 128)
+        self.assertLess(parity['max_abs_diff'], 1e-5)
+        self.assertEqual(parity['argmax_agreement'], 1.0)
+    
+    def test_numpy_engine_predicts_like_tflite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            npz_path = ml_utils.convert_tflite_to_numpy(MODEL_PATH, Path(directory) / 'model.npz')
+            reference = ml_utils.LoadedModel(ml_utils.ModelSource(MODEL_PATH, use_mmap=False), 1, 1)
+            candidate = ml_utils.NumpyModel(ml_utils.ModelSource(npz_path, use_mmap=False))
+        
+        manager = ml_utils.MLModelManager(pool_size=1, num_threads=1)
+        features = ml_utils.extract_text_features_batch([
+            ('Stolen cellphone', 'Someone stole my cellphone at the market', 'Theft', ''),
+            ('Nanakaw', 'Ninakaw ang selpon ko sa palengke', 'Theft', 'stolen the cellphone my at market'),
+            ('', '', '', ''),
+        ])
+        np.testing.assert_allclose(
+            manager._predict_with(candidate, features), manager._predict_with(reference, features), atol=1e-5
+        )
+    
+    def test_version_is_that_of_the_source_tflite(self):
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(ml_utils, 'INFERENCE_ENGINE', 'numpy'):
+            tflite_path = Path(shutil.copy(MODEL_PATH, Path(directory) / 'model.tflite'))
+            ml_utils.convert_tflite_to_numpy(tflite_path)
+            
+            manager = ml_utils.MLModelManager(model_path=tflite_path, pool_size=1, num_threads=1)
+            self.assertTrue(manager.load_model())
+            self.assertEqual(manager._active.engine, 'numpy')
+            self.assertEqual(manager.model_version, ml_utils.ModelSource(MODEL_PATH, use_mmap=False).version)
+            
+            # The .tflite is replaced but not converted again: the stale .npz is refused
+            with open(tflite_path, 'ab') as f:
+                f.write(b'\0')
+            new_version = ml_utils.ModelSource(tflite_path, use_mmap=False).version
+            with self.assertRaisesRegex(ValueError, 'convert_ml_model'):
+                ml_utils.NumpyModel(ml_utils.ModelSource(tflite_path.with_suffix('.npz'), use_mmap=False), tflite_path)
+            self.assertFalse(ml_utils.MLModelManager(model_path=tflite_path).load_model())
+            
+            ml_utils.convert_tflite_to_numpy(tflite_path)
+            self.assertEqual(manager.reload_model()['status'], 'reloaded')
+            self.assertEqual(manager.model_version, new_version)
@@ -0,0 +1,68 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+import ml_utils
+
+
+def record_in_child(metrics):
+    metrics.observe('extract', 0.002)
+    metrics.observe('extract', 0.2)
+    metrics.increment('reports_classified', 5)
+    metrics.flush()
+
+
+class PipelineMetricsTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.metrics = ml_utils.PipelineMetrics(self.directory, flush_seconds=3600)
+    
+    def test_totals_are_merged_across_processes(self):
+        self.metrics.observe('extract', 0.002)
+        self.metrics.increment('reports_classified', 1)
+        
+        # The forked worker starts from zero and writes its own file
+        child = multiprocessing.get_context('fork').Process(target=record_in_child, args=(self.metrics,))
+        child.start()
+        child.join(30)
+        self.assertEqual(child.exitcode, 0)
+        
+        collected = self.metrics.collect()
+        self.assertEqual(collected['workers'], 2)
+        self.assertEqual(collected['counters'], {'reports_classified': 6})
+        extract = collected['stages']['extract']
+        self.assertEqual(extract['count'], 3)
+        self.assertAlmostEqual(extract['sum'], 0.204)
+        self.assertEqual(sum(extract['counts']), 3)
+        
+        summary = self.metrics.summarize(collected)
+        self.assertEqual(summary['stages']['extract']['count'], 3)
+        self.assertLessEqual(summary['stages']['extract']['p50_ms'], 3)
+        self.assertGreaterEqual(summary['stages']['extract']['p99_ms'], 200)
+        
+        text = self.metrics.render_prometheus(collected)
+        self.assertIn('reportit_ml_stage_seconds_count{stage="extract"} 3', text)
+        self.assertIn('reportit_ml_events_total{event="reports_classified"} 6', text)
+    
+    def test_files_of_exited_workers_expire(self):
+        exited = os.path.join(self.directory, 'otherhost-1.json')
+        with open(exited, 'w') as f:
+            json.dump({'stages': {}, 'counters': {'reports_classified': 10}}, f)
+        old = time.time() - ml_utils.METRICS_MAX_AGE - 60
+        os.utime(exited, (old, old))
+        
+        self.metrics.increment('reports_classified', 1)
+        collected = self.metrics.collect()
+        
+        self.assertEqual(collected['workers'], 1)
+        self.assertEqual(collected['counters'], {'reports_classified': 1})
+        
+        # A recent file of another worker is merged
+        os.utime(exited)
+        self.assertEqual(self.metrics.collect()['counters'], {'reports_classified': 11})
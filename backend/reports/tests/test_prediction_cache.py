@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+import ml_utils
+
+ROW = ('Stolen cellphone', 'Someone stole my cellphone at the market', 'Theft', '')
+
+
+class PredictionCacheKeyTests(SimpleTestCase):
+    def test_key_ignores_case(self):
+        upper = tuple(value.upper() for value in ROW)
+        self.assertEqual(ml_utils.PredictionCache.make_key(*ROW, 'v1'), ml_utils.PredictionCache.make_key(*upper, 'v1'))
+    
+    def test_key_depends_on_content_model_version_and_extractor(self):
+        key = ml_utils.PredictionCache.make_key(*ROW, 'v1')
+        
+        self.assertNotEqual(key, ml_utils.PredictionCache.make_key(*ROW, 'v2'))
+        self.assertNotEqual(key, ml_utils.PredictionCache.make_key('Stolen wallet', *ROW[1:], 'v1'))
+        with mock.patch.object(ml_utils, 'feature_extractor_tag', return_value='other-extractor'):
+            self.assertNotEqual(key, ml_utils.PredictionCache.make_key(*ROW, 'v1'))
+
+
+class LocalCacheBackendTests(SimpleTestCase):
+    def test_entries_expire_after_ttl(self):
+        backend = ml_utils.LocalCacheBackend(max_entries=10, ttl=60)
+        with mock.patch.object(ml_utils.time, 'monotonic', return_value=1000.0):
+            backend.set_many({'a': 1})
+        
+        with mock.patch.object(ml_utils.time, 'monotonic', return_value=1059.0):
+            self.assertEqual(backend.get_many(['a']), {'a': 1})
+        with mock.patch.object(ml_utils.time, 'monotonic', return_value=1061.0):
+            self.assertEqual(backend.get_many(['a']), {})
+        self.assertEqual(len(backend), 0)
+    
+    def test_least_recently_used_entry_is_evicted(self):
+        backend = ml_utils.LocalCacheBackend(max_entries=2, ttl=60)
+        backend.set_many({'a': 1, 'b': 2})
+        backend.get_many(['a'])
+        backend.set_many({'c': 3})
+        
+        self.assertEqual(backend.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+    
+    def test_hits_and_misses_are_counted(self):
+        cache = ml_utils.PredictionCache(ml_utils.LocalCacheBackend(max_entries=10, ttl=60))
+        cache.set_many({'a': 1})
+        cache.get_many(['a', 'b'])
+        
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+
+import ml_utils
+
+
+def echo_predict(rows, return_probabilities=False):
+    """Stand-in model: one prediction per row, carrying the row's first value"""
+    time.sleep(0.001)
+    return [{'value': float(row[0]), 'rows_in_batch': len(rows)} for row in rows]
+
+
+class PredictionCoalescerTests(SimpleTestCase):
+    def test_concurrent_callers_get_their_own_results(self):
+        coalescer = ml_utils.PredictionCoalescer(echo_predict, window=0.005, max_batch=64)
+        errors = []
+        
+        def caller(thread):
+            for i in range(50):
+                value = thread * 1000 + i
+                rows = np.full((1, 4), value, dtype=np.float32)
+                result = coalescer.predict(rows)
+                if len(result) != 1 or result[0]['value'] != value:
+                    errors.append((value, result))
+        
+        threads = [threading.Thread(target=caller, args=(thread,)) for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        stats = coalescer.get_stats()
+        self.assertEqual(stats['requests'], 400)
+        self.assertEqual(stats['batch_size_histogram']['count'], stats['batches'])
+        self.assertAlmostEqual(stats['batch_size_histogram']['mean'] * stats['batches'], 400)
+    
+    def test_multi_row_requests_keep_their_rows(self):
+        coalescer = ml_utils.PredictionCoalescer(echo_predict, window=0.005, max_batch=64)
+        results = {}
+        
+        def caller(thread):
+            rows = np.arange(thread * 10, thread * 10 + 3, dtype=np.float32).reshape(3, 1)
+            results[thread] = [result['value'] for result in coalescer.predict(rows)]
+        
+        threads = [threading.Thread(target=caller, args=(thread,)) for thread in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(results, {thread: [thread * 10, thread * 10 + 1, thread * 10 + 2] for thread in range(6)})
+    
+    def test_error_reaches_every_caller_of_the_batch(self):
+        def failing_predict(rows, return_probabilities=False):
+            raise ValueError('model failed')
+        
+        coalescer = ml_utils.PredictionCoalescer(failing_predict, window=0.005, max_batch=64)
+        errors = []
+        
+        def caller():
+            try:
+                coalescer.predict(np.zeros((1, 4), dtype=np.float32))
+            except ValueError as e:
+                errors.append(str(e))
+        
+        threads = [threading.Thread(target=caller) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, ['model failed'] * 4)
+    
+    def test_rows_of_the_wrong_width_are_rejected_before_queueing(self):
+        coalescer = ml_utils.PredictionCoalescer(echo_predict, window=0.05, max_batch=64, input_width=4)
+        
+        with self.assertRaises(ValueError):
+            coalescer.predict(np.zeros((1, 10), dtype=np.float32))
+        with self.assertRaises(ValueError):
+            coalescer.predict(np.zeros(4, dtype=np.float32))
+        self.assertEqual(coalescer.get_stats()['requests'], 0)
+    
+    def test_mismatched_widths_in_one_batch_fail_every_caller(self):
+        release = threading.Event()
+        
+        def blocking_predict(rows, return_probabilities=False):
+            release.wait(5)
+            return echo_predict(rows, return_probabilities)
+        
+        # Without an input width, mismatched rows reach the same batch
+        coalescer = ml_utils.PredictionCoalescer(blocking_predict, window=1.0, max_batch=64)
+        outcomes = {}
+        
+        def caller(width):
+            try:
+                outcomes[width] = coalescer.predict(np.zeros((1, width), dtype=np.float32))
+            except ValueError as e:
+                outcomes[width] = e
+        
+        # The first caller runs alone and holds the model while the others queue up
+        threads = [threading.Thread(target=caller, args=(width,)) for width in (4, 5, 10)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive())
+        
+        self.assertEqual(len(outcomes[4]), 1)
+        self.assertIsInstance(outcomes[5], ValueError)
+        self.assertIsInstance(outcomes[10], ValueError)
@@ -0,0 +1,51 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from reports import ingest_pipeline
+from reports.models import Report
+
+
+def create_report(title):
+    return Report.objects.create(
+        title=title, incident_type='Theft', description=f'{title} at the market', latitude=14.6, longitude=121.0
+    )
+
+
+class CheckpointTests(TransactionTestCase):
+    def run_command(self, checkpoint, failing=()):
+        def predict(stage, records):
+            if any(record.report.title in failing for record in records):
+                raise ValueError('model failed')
+            for record in records:
+                record.prediction = {'predicted_category': 'Accident', 'confidence': 0.9, 'model_version': 'test'}
+        
+        with mock.patch('ml_utils.is_model_ready', return_value=True), \
+                mock.patch.object(ingest_pipeline.FeatureStage, 'process'), \
+                mock.patch.object(ingest_pipeline.PredictStage, 'process', predict):
+            call_command(
+                'run_ai_categorization', checkpoint=str(checkpoint), chunk_size=2, stdout=StringIO(), stderr=StringIO()
+            )
+        return json.loads(checkpoint.read_text())
+    
+    def test_failed_reports_are_retried_on_resume(self):
+        reports = [create_report(f'Report {i}') for i in range(5)]
+        
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Path(directory) / 'checkpoint.json'
+            state = self.run_command(checkpoint, failing={'Report 1'})
+            
+            # The checkpoint moves past the failed report but records it
+            self.assertEqual(state['last_id'], reports[-1].pk)
+            self.assertEqual(state['failed_ids'], [reports[1].pk])
+            self.assertEqual(list(Report.objects.filter(ml_processed=False)), [reports[1]])
+            
+            state = self.run_command(checkpoint)
+        
+        self.assertEqual(state['failed_ids'], [])
+        self.assertFalse(Report.objects.filter(ml_processed=False).exists())
@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reports import similarity_index
+from reports.models import Report
+
+
+def create_report(title, description, barangay):
+    return Report.objects.create(
+        title=title, incident_type='Theft', description=description, barangay=barangay, latitude=14.6, longitude=121.0
+    )
+
+
+class SimilarEndpointTests(TestCase):
+    def setUp(self):
+        self.index = similarity_index.SimilarityIndex()
+        mock.patch.object(similarity_index, 'similarity_index', self.index).start()
+        self.addCleanup(mock.patch.stopall)
+        
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='secret', is_admin=True
+        )
+        self.resident = User.objects.create_user(
+            username='resident', email='resident@example.com', password='secret', barangay='San Roque'
+        )
+        self.client = APIClient()
+        
+        theft = 'Someone snatched my cellphone and wallet near the public market entrance'
+        self.report = create_report('Cellphone snatched', theft, 'San Roque')
+        self.same_barangay = create_report('Snatched cellphone', theft + ' this morning', 'San Roque')
+        self.no_barangay = create_report('Cellphone snatching', 'My cellphone and wallet were snatched at the market', '')
+        self.other_barangay = create_report('Wallet snatched', theft + ' last night', 'Santo Nino')
+        self.unrelated = create_report(
+            'Loud karaoke', 'The neighbours sing karaoke past midnight every single day!!!', 'San Roque'
+        )
+    
+    def get(self, **params):
+        return self.client.get(reverse('report-similar', args=[self.report.pk]), params)
+    
+    def ids(self, response):
+        return [similar['id'] for similar in response.data['similar']]
+    
+    def test_most_similar_reports_come_first(self):
+        self.index.ensure_built()
+        self.client.force_authenticate(self.admin)
+        
+        response = self.get(min_similarity=-1)
+        
+        self.assertEqual(response.status_code, 200)
+        ids = self.ids(response)
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(ids[-1], self.unrelated.pk)
+        scores = [similar['similarity'] for similar in response.data['similar']]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        
+        self.assertEqual(len(self.ids(self.get(min_similarity=-1, k=2))), 2)
+        self.assertNotIn(self.unrelated.pk, self.ids(self.get()))
+    
+    def test_residents_only_see_their_barangay(self):
+        self.index.ensure_built()
+        self.client.force_authenticate(self.resident)
+        
+        self.assertEqual(
+            set(self.ids(self.get(min_similarity=-1))), {self.same_barangay.pk, self.no_barangay.pk, self.unrelated.pk}
+        )
+        # Another barangay cannot be requested
+        self.assertEqual(self.ids(self.get(min_similarity=-1, scope_barangay='Santo Nino')), [])
+    
+    def test_admins_can_scope_to_a_barangay(self):
+        self.index.ensure_built()
+        self.client.force_authenticate(self.admin)
+        
+        self.assertEqual(self.ids(self.get(min_similarity=-1, scope_barangay='Santo Nino')), [self.other_barangay.pk])
+    
+    def test_deleted_reports_are_left_out(self):
+        self.index.ensure_built()
+        self.client.force_authenticate(self.admin)
+        
+        self.same_barangay.delete()
+        
+        self.assertNotIn(self.same_barangay.pk, self.ids(self.get(min_similarity=-1)))
+    
+    def test_invalid_parameters_are_rejected(self):
+        self.client.force_authenticate(self.admin)
+        
+        self.assertEqual(self.get(k='many').status_code, 400)
+        self.assertEqual(self.get(min_similarity='high').status_code, 400)
+    
+    def test_unavailable_while_the_index_is_built(self):
+        self.client.force_authenticate(self.admin)
+        
+        with mock.patch.object(self.index, 'start_build') as start_build:
+            response = self.get()
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '10')
+        start_build.assert_called_once_with()
@@ -0,0 +1,55 @@
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+
+import ml_utils
+import text_normalization
+from reports import translation_memory
+from reports.models import TranslationMemory
+
+TAGALOG = ('Nanakaw', 'Ninakaw ang selpon ko sa palengke kanina')
+ENGLISH = ('Stolen cellphone', 'Someone stole my cellphone at the market')
+
+
+class TranslationMemoryTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.metrics = ml_utils.PipelineMetrics(directory.name, flush_seconds=3600)
+        self.translate = mock.patch.object(
+            ml_utils, 'translate_report_text', wraps=ml_utils.translate_report_text
+        ).start()
+        mock.patch.object(ml_utils, 'get_pipeline_metrics', return_value=self.metrics).start()
+        self.addCleanup(mock.patch.stopall)
+    
+    def counters(self):
+        counters = self.metrics.snapshot()['counters']
+        return counters.get('translation_memory_hits', 0), counters.get('translation_memory_misses', 0)
+    
+    def test_stored_translations_are_reused(self):
+        first = translation_memory.translate_reports([TAGALOG, ENGLISH, TAGALOG])
+        
+        # The repeated text is translated once
+        self.assertEqual(self.translate.call_count, 2)
+        self.assertEqual(first[0], first[2])
+        self.assertTrue(first[0][1])
+        self.assertFalse(first[1][1])
+        self.assertEqual(TranslationMemory.objects.count(), 2)
+        self.assertEqual(self.counters(), (1, 2))
+        
+        second = translation_memory.translate_reports([ENGLISH, TAGALOG])
+        
+        self.assertEqual(self.translate.call_count, 2)
+        self.assertEqual(second, [first[1], first[0]])
+        self.assertEqual(self.counters(), (3, 2))
+    
+    def test_entries_of_another_translator_version_are_recomputed(self):
+        translation_memory.translate_report(*TAGALOG)
+        
+        with mock.patch.object(text_normalization, 'TRANSLATOR_VERSION', text_normalization.TRANSLATOR_VERSION + 1):
+            translation_memory.translate_report(*TAGALOG)
+            entry = TranslationMemory.objects.get()
+            self.assertEqual(entry.translator_version, text_normalization.TRANSLATOR_VERSION)
+        
+        self.assertEqual(self.translate.call_count, 2)
@@ -0,0 +1,111 @@
+"""
+Persistent translation memory for report text
+
+Translations (TranslationMemory) are keyed by a digest of the original title
+and description and tagged with the translator version, so a report is only
+normalized and translated once: re-processing, batch scoring and backfills
+read the stored result, and stale entries are recomputed after the
+translator changes.
+"""
+import hashlib
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+import ml_utils
+import text_normalization
+from .models import TranslationMemory
+
+# Texts looked up per query
+TRANSLATION_MEMORY_CHUNK_SIZE = 500
+
+
+def text_hash(title, description):
+    """Digest of the text a translation is computed from"""
+    return hashlib.sha256(json.dumps([title or '', description or '']).encode('utf-8')).hexdigest()
+
+
+def _save_translations(computed, stored):
+    """Create or update the stored translations of digests"""
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    
+    for digest, (translated_text, is_tagalog) in computed.items():
+        entry = stored.get(digest)
+        if entry is None:
+            to_create.append(TranslationMemory(
+                text_hash=digest,
+                translator_version=text_normalization.TRANSLATOR_VERSION,
+                translated_text=translated_text,
+                is_tagalog=is_tagalog,
+                updated_at=now,
+            ))
+        else:
+            entry.translator_version = text_normalization.TRANSLATOR_VERSION
+            entry.translated_text = translated_text
+            entry.is_tagalog = is_tagalog
+            entry.updated_at = now
+            to_update.append(entry)
+    
+    with transaction.atomic():
+        # Another worker may have stored the same translation concurrently
+        TranslationMemory.objects.bulk_create(to_create, ignore_conflicts=True)
+        TranslationMemory.objects.bulk_update(to_update, ['translator_version', 'translated_text', 'is_tagalog', 'updated_at'])
+
+
+def _translate_chunk(texts):
+    digests = [text_hash(title, description) for title, description in texts]
+    stored = {
+        entry.text_hash: entry
+        for entry in TranslationMemory.objects.filter(text_hash__in=set(digests))
+    }
+    
+    results = {
+        digest: (entry.translated_text, entry.is_tagalog)
+        for digest, entry in stored.items()
+        if entry.translator_version == text_normalization.TRANSLATOR_VERSION
+    }
+    
+    computed = {}
+    for digest, (title, description) in zip(digests, texts):
+        if digest not in results and digest not in computed:
+            computed[digest] = ml_utils.translate_report_text(title, description)
+    
+    metrics = ml_utils.get_pipeline_metrics()
+    metrics.increment('translation_memory_hits', len(texts) - len(computed))
+    metrics.increment('translation_memory_misses', len(computed))
+    
+    if computed:
+        _save_translations(computed, stored)
+        results.update(computed)
+    
+    return [results[digest] for digest in digests]
+
+
+def translate_reports(texts):
+    """
+    Get the translation of many reports, translating and storing missing or stale ones
+    
+    Args:
+        texts (iterable): (title, description) pairs
+    
+    Returns:
+        list: (translated_text, is_tagalog) tuples in the order of texts
+    """
+    texts = [tuple(text) for text in texts]
+    results = []
+    for start in range(0, len(texts), TRANSLATION_MEMORY_CHUNK_SIZE):
+        results.extend(_translate_chunk(texts[start:start + TRANSLATION_MEMORY_CHUNK_SIZE]))
+    return results
+
+
+def translate_report(title, description):
+    """
+    Get the translation of a single report
+    
+    Returns:
+        tuple: (translated_text, is_tagalog)
+    """
+    return translate_reports([(title, description)])[0]
@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     ReportViewSet, CategoryViewSet, analytics_stats, ml_model_metrics,
-    process_report_ml, batch_process_reports
+    process_report_ml, batch_process_reports, batch_job_status, ml_model_reload,
+    ml_metrics_scrape
 )
 
 router = DefaultRouter()
@@ -13,6 +14,9 @@ urlpatterns = [
     path('', include(router.urls)),
     path('analytics/stats/', analytics_stats, name='analytics_stats'),
     path('ml/metrics/', ml_model_metrics, name='ml_model_metrics'),
+    path('ml/metrics/scrape/', ml_metrics_scrape, name='ml_metrics_scrape'),
+    path('ml/model/reload/', ml_model_reload, name='ml_model_reload'),
     path('ml/process-report/', process_report_ml, name='process_report_ml'),
     path('ml/batch-process/', batch_process_reports, name='batch_process_reports'),
+    path('ml/batch-process/<int:job_id>/', batch_job_status, name='batch_job_status'),
 ]
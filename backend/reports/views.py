@@ -1,16 +1,21 @@
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, authentication_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from django.utils import timezone
 from django.db.models import Q, Count
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.http import HttpResponse
+from django.conf import settings
+import hmac
 import json
 import os
 from pathlib import Path
 
-from .models import Report, Category, ReportAction
-from .serializers import ReportSerializer, ReportListSerializer, CategorySerializer
+from .models import Report, Category, ReportAction, MLBatchJob
+from .serializers import ReportSerializer, ReportListSerializer, CategorySerializer, MLBatchJobSerializer
+from . import duplicate_index, ingest_pipeline, ml_jobs, ml_queue, similarity_index
 import ml_utils
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -26,6 +31,47 @@ class CategoryViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]  # Add admin check in production
         return [permission() for permission in permission_classes]
 
+def scope_reports_for_user(queryset, user):
+    """Limit non-admin users to reports of their barangay (and reports without one)"""
+    if not getattr(user, 'is_admin', False):
+        user_barangay = getattr(user, 'barangay', '')
+        if user_barangay:
+            queryset = queryset.filter(Q(barangay=user_barangay) | Q(barangay=''))
+    return queryset
+
+
+def parse_duplicate_options(params):
+    """Read the radius_km, hours, min_similarity and limit duplicate search parameters"""
+    options = {}
+    for param, option, cast in (
+        ('radius_km', 'radius_km', float), ('hours', 'window_hours', float),
+        ('min_similarity', 'min_similarity', float), ('limit', 'limit', int),
+    ):
+        value = params.get(param)
+        if value not in (None, ''):
+            try:
+                options[option] = cast(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid {param}: {value}")
+    return options
+
+
+def serialize_duplicates(results):
+    """Convert DuplicateIndex.find_duplicates results to response dicts"""
+    return [{
+        'id': result['report'].id,
+        'title': result['report'].title,
+        'incident_type': result['report'].incident_type,
+        'barangay': result['report'].barangay,
+        'status': result['report'].status,
+        'created_at': result['report'].created_at,
+        'similarity': max(result['jaccard'], result['cosine']),
+        'jaccard': result['jaccard'],
+        'cosine': result['cosine'],
+        'distance_km': result['distance_km'],
+        'hours_apart': result['hours_apart'],
+    } for result in results]
+
 class ReportViewSet(viewsets.ModelViewSet):
     queryset = Report.objects.all().select_related('submitted_by', 'verified_by').prefetch_related('actions')
     serializer_class = ReportSerializer
@@ -38,13 +84,8 @@ class ReportViewSet(viewsets.ModelViewSet):
         return ReportSerializer
 
     def get_queryset(self):
-        queryset = self.queryset
-        
         # Filter by barangay if user is not admin
-        if not getattr(self.request.user, 'is_admin', False):
-            user_barangay = getattr(self.request.user, 'barangay', '')
-            if user_barangay:
-                queryset = queryset.filter(Q(barangay=user_barangay) | Q(barangay=''))
+        queryset = scope_reports_for_user(self.queryset, self.request.user)
         
         # Filter parameters
         barangay = self.request.query_params.get('barangay')
@@ -61,11 +102,16 @@ class ReportViewSet(viewsets.ModelViewSet):
         return queryset
 
     def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        
-        # Create the report
-        report = serializer.save()
+        # Validate and create the report; it is classified in the background
+        pipeline = ingest_pipeline.IngestPipeline([
+            ingest_pipeline.ValidateStage(self.get_serializer_class(), self.get_serializer_context()),
+            ingest_pipeline.PersistStage(),
+        ])
+        record, = pipeline.process([ingest_pipeline.IngestRecord(data=request.data)])
+        if record.failed:
+            raise record.error
+        serializer = record.serializer
+        report = record.report
         
         # Handle auto-verification for admin-created reports
         if report.status == 'Verified' and request.user.is_authenticated:
@@ -84,6 +130,9 @@ class ReportViewSet(viewsets.ModelViewSet):
             notes=notes
         )
         
+        # Classify the report in the background
+        ml_queue.enqueue_reports([report.pk])
+        
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
@@ -156,6 +205,97 @@ class ReportViewSet(viewsets.ModelViewSet):
         
         return Response({'status': 'Status updated'})
 
+    @action(detail=True, methods=['get'])
+    def duplicates(self, request, pk=None):
+        """
+        Find likely duplicates of a report: similar text, reported nearby and around the same time
+        
+        Optional query parameters: radius_km, hours, min_similarity, limit
+        """
+        report = self.get_object()
+        try:
+            options = parse_duplicate_options(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            results = duplicate_index.get_duplicate_index().find_duplicates(
+                report.title, report.description, report.latitude, report.longitude, report.created_at,
+                exclude_id=report.pk,
+                queryset=scope_reports_for_user(Report.objects.all(), request.user),
+                wait=False,
+                **options
+            )
+        except duplicate_index.IndexNotReady:
+            return Response(
+                {'error': 'Duplicate index is being built, try again shortly'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '10'}
+            )
+        return Response({
+            'report_id': report.pk,
+            'count': len(results),
+            'duplicates': serialize_duplicates(results),
+        })
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Find the k reports most similar to a report (cosine similarity of feature vectors)
+        
+        Optional query parameters: k (default 10, at most 50),
+        min_similarity (default SIMILAR_REPORTS_MIN_SIMILARITY) and
+        scope_barangay to only return reports of one barangay ("barangay"
+        already filters the report looked up). Non-admin users only get
+        reports of their own barangay.
+        """
+        report = self.get_object()
+        try:
+            k = min(int(request.query_params.get('k', 10)), 50)
+        except ValueError:
+            return Response({'error': 'k must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        min_similarity = request.query_params.get('min_similarity')
+        if min_similarity not in (None, ''):
+            try:
+                min_similarity = float(min_similarity)
+            except ValueError:
+                return Response({'error': 'min_similarity must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            min_similarity = None
+        
+        barangays = None
+        if not getattr(request.user, 'is_admin', False) and getattr(request.user, 'barangay', ''):
+            barangays = [request.user.barangay, '']
+        requested_barangay = request.query_params.get('scope_barangay')
+        if requested_barangay:
+            barangays = [b for b in (barangays or [requested_barangay]) if b == requested_barangay]
+        
+        try:
+            neighbours = similarity_index.get_similarity_index().find_similar(
+                report.pk, k, barangays, min_similarity, wait=False
+            )
+        except similarity_index.IndexNotReady:
+            return Response(
+                {'error': 'Similarity index is being built, try again shortly'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '10'}
+            )
+        except KeyError:
+            return Response({'error': 'Report is not indexed yet'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        reports = Report.objects.in_bulk([report_id for report_id, _ in neighbours])
+        return Response({
+            'report_id': report.pk,
+            'count': len(neighbours),
+            'similar': [{
+                'id': report_id,
+                'title': reports[report_id].title,
+                'incident_type': reports[report_id].incident_type,
+                'barangay': reports[report_id].barangay,
+                'status': reports[report_id].status,
+                'created_at': reports[report_id].created_at,
+                'similarity': score,
+            } for report_id, score in neighbours if report_id in reports],
+        })
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def analytics_stats(request):
@@ -212,7 +352,20 @@ def ml_model_metrics(request):
             'model_ready': model_status.get('model_ready', False),
             'model_loaded': model_status.get('model_loaded', False),
             'categories_count': model_status.get('categories_count', 0),
-            'tflite_available': model_status.get('tflite_available', False)
+            'tflite_available': model_status.get('tflite_available', False),
+            'interpreter_pool': model_status.get('interpreter_pool'),
+            'runtime_import_seconds': model_status.get('runtime_import_seconds'),
+            'model_load_seconds': model_status.get('model_load_seconds'),
+            'prediction_cache': model_status.get('prediction_cache'),
+            'reload': model_status.get('reload'),
+            'registry': model_status.get('registry'),
+            'memory': model_status.get('memory'),
+            'coalescing': model_status.get('coalescing'),
+            'shadow': model_status.get('shadow'),
+            'duplicate_index': duplicate_index.get_duplicate_index().get_stats(),
+            'similarity_index': similarity_index.get_similarity_index().get_stats(),
+            'pipeline': ml_utils.get_pipeline_metrics().summarize(),
+            'processing_queue': ml_queue.get_queue_stats()
         }
         
         # Try to load metrics from JSON file
@@ -223,7 +376,7 @@ def ml_model_metrics(request):
             try:
                 with open(metrics_file, 'r') as f:
                     metrics_data = json.load(f)
-            except (json.JSONError, IOError) as e:
+            except (json.JSONDecodeError, IOError) as e:
                 print(f"Error reading metrics file: {e}")
         
         # Calculate real-time stats from reports if ML fields exist
@@ -258,13 +411,18 @@ def ml_model_metrics(request):
         # Combine data with fallback values
         combined_metrics = {
             'model_status': simplified_model_status,
-            'accuracy': metrics_data.get('model_accuracy', 0.847),
+            # Measured by `manage.py evaluate_ml_model`; None until it has been run
+            'accuracy': metrics_data.get('model_accuracy'),
             'last_updated': metrics_data.get('last_updated'),
             'performance_metrics': metrics_data.get('performance_metrics', {}),
+            'per_class_metrics': metrics_data.get('per_class_metrics', {}),
+            'throughput': metrics_data.get('throughput'),
+            'latency_by_batch_size': metrics_data.get('latency_by_batch_size', {}),
+            'evaluated_model_version': metrics_data.get('model_version'),
             'real_time_stats': real_time_stats,
             'categories': ml_utils.get_incident_categories(),
             'health_status': 'healthy' if simplified_model_status.get('model_ready') else 'error',
-            'model_name': 'best_model.tflite',
+            'model_name': metrics_data.get('model_name', 'best_model.tflite'),
             'categories_count': len(ml_utils.get_incident_categories())
         }
         
@@ -282,97 +440,78 @@ def ml_model_metrics(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@ml_utils.get_pipeline_metrics().timed('process_report')
 def process_report_ml(request):
     """
     Process a single report with ML analysis including translation and duplicate detection
+    
+    Optional query parameters:
+    - include_features=float32|float16 (or true for float32): add the feature
+      vector, base64-encoded with its dtype and shape
+    - include_probabilities=true: add all_probabilities and top_5_predictions
     """
+    metrics = ml_utils.get_pipeline_metrics()
+    
+    include_features = request.query_params.get('include_features', '').lower()
+    if include_features in ('true', '1'):
+        include_features = 'float32'
+    elif include_features in ('', 'false', '0'):
+        include_features = None
+    if include_features and include_features not in ml_utils.FEATURE_VECTOR_DTYPES:
+        return Response({
+            'error': f"include_features must be one of: {', '.join(ml_utils.FEATURE_VECTOR_DTYPES)}",
+            'ml_processed': False
+        }, status=status.HTTP_400_BAD_REQUEST)
+    include_probabilities = request.query_params.get('include_probabilities', '').lower() in ('true', '1')
+    
     try:
         data = request.data
-        title = data.get('title', '')
-        description = data.get('description', '')
-        incident_type = data.get('incident_type', '')
-        
-        # Combine text for processing
-        full_text = f"{title} {description}".strip()
-        
-        # Simple language detection for Tagalog
-        tagalog_patterns = ['ang', 'ng', 'sa', 'ay', 'at', 'na', 'mga', 'hindi', 'oo']
-        is_tagalog = any(word in full_text.lower() for word in tagalog_patterns)
-        
-        # Basic translation (in production, use proper translation service)
-        translated_text = full_text
-        if is_tagalog:
-            # Simple word replacements
-            replacements = {
-                'nakaw': 'theft', 'pagnanakaw': 'theft', 'away': 'fight',
-                'aksidente': 'accident', 'bangga': 'accident', 'patay': 'death',
-                'droga': 'drugs', 'shabu': 'drugs', 'holdap': 'robbery'
-            }
-            for tagalog, english in replacements.items():
-                translated_text = translated_text.replace(tagalog, english)
-        
-        # Generate feature vector using real text processing
-        import numpy as np
-        features = extract_text_features(title, description, incident_type, translated_text)
-        
-        # Get ML prediction
-        try:
-            prediction_result = ml_utils.predict_incident_category(features, return_probabilities=True)
-            predicted_category = prediction_result['predicted_category']
-            confidence = prediction_result['confidence']
-        except Exception as ml_error:
-            print(f"ML prediction error: {ml_error}")
-            # Fallback to rule-based prediction
-            predicted_category = incident_type or 'Others'
-            confidence = 0.5
-        
-        # Determine priority and risk level
-        high_priority_categories = ['Assault/Harassment', 'Missing Person', 'Drugs Addiction']
-        high_risk_categories = ['Assault/Harassment', 'Missing Person', 'Drugs Addiction', 'Theft']
-        
-        if predicted_category in high_priority_categories or confidence > 0.8:
-            priority = 'high'
-        elif confidence > 0.6:
-            priority = 'medium'
-        else:
-            priority = 'low'
-            
-        if predicted_category in high_risk_categories or confidence > 0.8:
-            risk_level = 'high'
-        elif confidence > 0.6:
-            risk_level = 'medium'
-        else:
-            risk_level = 'low'
-        
-        # Check for duplicates (simplified)
-        duplicates = []
-        if 'check_duplicates' in data and data['check_duplicates']:
-            similar_reports = Report.objects.filter(
-                incident_type__icontains=predicted_category[:10]
-            )[:5]  # Limit for performance
-            duplicates = [{
-                'id': r.id,
-                'title': r.title,
-                'similarity': 0.7 + (hash(r.title) % 20) / 100  # Mock similarity
-            } for r in similar_reports]
-        
+        stages = [
+            ingest_pipeline.ValidateStage(),
+            # Detect Tagalog and translate known words (stored, so re-processing is a lookup)
+            ingest_pipeline.TranslateStage(),
+            # Served from the prediction cache when the same report was processed before
+            ingest_pipeline.FeatureStage(),
+            # Falls back to the submitted incident type when the model fails
+            ingest_pipeline.PredictStage(return_probabilities=include_probabilities, fallback=True),
+        ]
+        if data.get('check_duplicates'):
+            # Similar reports nearby in the last few days (skipped while the index is being built)
+            stages.append(ingest_pipeline.DedupeStage(
+                queryset=scope_reports_for_user(Report.objects.all(), request.user), limit=5, wait=False
+            ))
+        
+        record, = ingest_pipeline.IngestPipeline(stages).process([ingest_pipeline.IngestRecord(data=data)])
+        if record.failed:
+            raise record.error
+        
+        prediction = record.prediction
+        confidence = prediction['confidence']
         result = {
-            'ml_predicted_category': predicted_category,
+            'ml_predicted_category': prediction['predicted_category'],
             'ml_confidence': float(confidence),
-            'priority': priority,
-            'risk_level': risk_level,
-            'processed_text': translated_text,
-            'was_translated': is_tagalog,
-            'original_language': 'tagalog' if is_tagalog else 'english',
-            'duplicates': duplicates,
-            'feature_vector': features.tolist(),
+            'ml_model_version': prediction.get('model_version'),
+            'priority': record.priority,
+            'risk_level': record.risk_level,
+            'processed_text': record.translated_text,
+            'was_translated': record.is_tagalog,
+            'original_language': 'tagalog' if record.is_tagalog else 'english',
+            'duplicates': serialize_duplicates(record.duplicates or []),
+            'duplicates_checked': record.duplicates is not None,
             'ml_processed': True,
             'confidence_percentage': f"{confidence * 100:.1f}%"
         }
         
+        if include_features:
+            result['feature_vector'] = ml_utils.encode_feature_vector(record.features, include_features)
+        if include_probabilities:
+            result['all_probabilities'] = prediction.get('all_probabilities')
+            result['top_5_predictions'] = prediction.get('top_5_predictions')
+        
         return Response(result)
         
     except Exception as e:
+        metrics.increment('process_report_errors')
         return Response({
             'error': str(e),
             'ml_processed': False
@@ -381,84 +520,95 @@ def process_report_ml(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])  # Temporarily allow for testing
 def batch_process_reports(request):
     """
-    Process multiple unprocessed reports with ML analysis
+    Submit a background job that processes reports with ML analysis (admin only)
+    
+    Returns the job id immediately; poll batch_job_status for progress.
     """
+    if not getattr(request.user, 'is_admin', False):
+        return Response({'error': 'Admin access required', 'success': False}, status=status.HTTP_403_FORBIDDEN)
+    
     try:
-        # Get unprocessed reports
-        unprocessed_reports = Report.objects.filter(ml_processed=False)
-        
-        results = []
-        processed_count = 0
-        
-        for report in unprocessed_reports[:50]:  # Limit batch size
-            try:
-                # Process with ML
-                full_text = f"{report.title} {report.description}"
-                
-                # Generate mock features
-                import numpy as np
-                features = np.random.rand(544).astype(np.float32)
-                
-                # Get prediction
-                try:
-                    prediction_result = ml_utils.predict_incident_category(features, return_probabilities=True)
-                    predicted_category = prediction_result['predicted_category']
-                    confidence = prediction_result['confidence']
-                except:
-                    predicted_category = report.incident_type or 'Others'
-                    confidence = 0.5
-                
-                # Update report with ML data
-                report.ml_predicted_category = predicted_category
-                report.ml_confidence = confidence
-                report.ml_processed = True
-                report.ml_processed_at = timezone.now()
-                
-                # Set priority and risk level
-                high_priority_categories = ['Assault/Harassment', 'Missing Person', 'Drugs Addiction']
-                if predicted_category in high_priority_categories or confidence > 0.8:
-                    report.priority = 'high'
-                    report.risk_level = 'high'
-                elif confidence > 0.6:
-                    report.priority = 'medium'
-                    report.risk_level = 'medium'
-                else:
-                    report.priority = 'low'
-                    report.risk_level = 'low'
-                
-                report.save()
-                processed_count += 1
-                
-                results.append({
-                    'id': report.id,
-                    'title': report.title,
-                    'predicted_category': predicted_category,
-                    'confidence': confidence,
-                    'priority': report.priority,
-                    'success': True
-                })
-                
-            except Exception as e:
-                results.append({
-                    'id': report.id,
-                    'title': report.title,
-                    'error': str(e),
-                    'success': False
-                })
+        limit = request.data.get('limit')
+        job = ml_jobs.submit_batch_job(
+            user=request.user,
+            reprocess=str(request.data.get('reprocess', '')).lower() in ('true', '1'),
+            barangay=request.data.get('barangay', ''),
+            limit=int(limit) if limit not in (None, '') else None,
+        )
         
-        return Response({
-            'processed_count': processed_count,
-            'total_unprocessed': unprocessed_reports.count(),
-            'results': results,
-            'success': True
-        })
+        data = MLBatchJobSerializer(job).data
+        data['status_url'] = request.build_absolute_uri(reverse('batch_job_status', args=[job.pk]))
+        data['success'] = True
+        return Response(data, status=status.HTTP_202_ACCEPTED)
         
-    except Exception as e:
+    except (TypeError, ValueError) as e:
         return Response({
             'error': str(e),
             'success': False
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_job_status(request, job_id):
+    """
+    Get progress of an ML batch job: processed/failed counts, rate and ETA (admin only)
+    """
+    if not getattr(request.user, 'is_admin', False):
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    
+    job = get_object_or_404(MLBatchJob, pk=job_id)
+    return Response(MLBatchJobSerializer(job).data)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def ml_model_reload(request):
+    """
+    Get the active model version and reload history (GET), or reload
+    best_model.tflite without downtime (POST, admin only)
+    
+    Pass wait=true to block until the new version is loaded and warmed up.
+    """
+    if not getattr(request.user, 'is_admin', False):
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    
+    manager = ml_utils.get_model_manager()
+    if request.method == 'GET':
+        return Response(manager.get_reload_status())
+    
+    wait = str(request.data.get('wait', '')).lower() in ('true', '1')
+    result = manager.reload_model(wait=wait)
+    
+    if result['status'] == 'failed':
+        return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if result['status'] in ('started', 'in_progress'):
+        return Response(result, status=status.HTTP_202_ACCEPTED)
+    return Response(result)
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def ml_metrics_scrape(request):
+    """
+    ML pipeline latency histograms and counters, merged across workers, in
+    the Prometheus text format
+    
+    Requires the ML_METRICS_SCRAPE_TOKEN in an X-Metrics-Token header, or a
+    request from localhost when no token is configured.
+    """
+    token = getattr(settings, 'ML_METRICS_SCRAPE_TOKEN', '')
+    if token:
+        allowed = hmac.compare_digest(request.headers.get('X-Metrics-Token', ''), token)
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1')
+    if not allowed:
+        return Response({'error': 'Not allowed to scrape metrics'}, status=status.HTTP_403_FORBIDDEN)
+    
+    return HttpResponse(
+        ml_utils.get_pipeline_metrics().render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,154 @@
+"""
+Normalization, language detection and Tagalog-to-English translation of report text
+
+Detection works on word tokens: a text counts as Tagalog when enough of its
+words are Tagalog function words or lexicon entries. (Substring checks such
+as "ng" in text match almost every English sentence.) Translation replaces
+whole lexicon words and phrases in a single pass of one compiled regex.
+
+Everything here is deterministic and framework-agnostic; see
+reports.translation_memory for the database cache of translated reports.
+"""
+import os
+import re
+import unicodedata
+
+# Bump whenever a change here changes the translated text, so stored
+# translations are recomputed
+TRANSLATOR_VERSION = 1
+
+# Fraction of a text's words that must be Tagalog for the text to be treated as Tagalog
+TAGALOG_MIN_RATIO = float(os.environ.get("ML_TAGALOG_MIN_RATIO", 0.2))
+
+# Tagalog words that mark a text as Tagalog but are not translated
+TAGALOG_FUNCTION_WORDS = frozenset([
+    "ako", "ikaw", "ka", "siya", "kami", "tayo", "kayo", "sila", "ko", "mo",
+    "niya", "namin", "natin", "ninyo", "nila", "akin", "iyo", "kanya", "amin",
+    "atin", "inyo", "kanila", "ang", "ng", "sa", "si", "ni", "kay", "mga",
+    "ay", "at", "na", "pa", "po", "opo", "ho", "hindi", "oo", "wala", "may",
+    "meron", "mayroon", "kung", "kapag", "pag", "para", "dahil", "kasi",
+    "pero", "ngunit", "nang", "lang", "lamang", "din", "rin", "daw", "raw",
+    "ba", "nga", "naman", "pala", "yung", "iyong", "ito", "iyan", "iyon",
+    "dito", "diyan", "doon", "nito", "niyan", "noon", "sino", "ano", "saan",
+    "kailan", "bakit", "paano", "ilan", "lahat", "isang", "dalawang",
+])
+
+# Tagalog words and phrases translated to English (whole words only)
+TAGALOG_LEXICON = {
+    # Theft and robbery
+    "nakaw": "theft", "nanakaw": "stolen", "ninakaw": "stolen", "pagnanakaw": "theft",
+    "magnanakaw": "thief", "nagnakaw": "stole", "holdap": "robbery", "hinoldap": "robbed",
+    "inagaw": "snatched", "agaw": "snatch", "dukot": "pickpocket",
+    "dinukot": "pickpocketed", "akyat bahay": "burglary",
+    # Violence and harassment
+    "away": "fight", "nag-away": "fought", "suntok": "punch", "sinuntok": "punched",
+    "sampal": "slap", "sinampal": "slapped", "bugbog": "beating", "binugbog": "beaten",
+    "saksak": "stab", "sinaksak": "stabbed", "baril": "gun", "binaril": "shot",
+    "pananakit": "assault", "sinaktan": "hurt", "banta": "threat", "pinagbantaan": "threatened",
+    "minura": "cursed at", "mura": "curse", "bastos": "rude", "hinipuan": "groped",
+    "patay": "death", "pinatay": "killed",
+    # Accidents and damage
+    "aksidente": "accident", "bangga": "accident", "nabangga": "hit", "sunog": "fire",
+    "nasunog": "burned", "sira": "damage", "sinira": "destroyed", "nasira": "damaged",
+    "basag": "broken", "binasag": "smashed",
+    # Drugs
+    "droga": "drugs", "shabu": "drugs", "adik": "addict", "tulak": "pusher",
+    # Missing persons and lost items
+    "nawawala": "missing", "nawala": "lost", "nawalan": "lost", "nawawalang tao": "missing person",
+    "naligaw": "lost", "hinahanap": "searching for",
+    # Fraud and debt
+    "manloloko": "scammer", "niloko": "scammed", "panloloko": "fraud", "utang": "debt",
+    "hindi nagbayad": "did not pay", "sahod": "wages",
+    # Disturbances and animals
+    "ingay": "noise", "maingay": "noisy", "lasing": "drunk", "gulo": "trouble",
+    "nanggugulo": "causing trouble", "aso": "dog", "kinagat": "bitten", "kagat": "bite",
+    # People, places and things
+    "pera": "money", "kotse": "car", "bahay": "house", "tao": "person", "bata": "child",
+    "lalaki": "man", "babae": "woman", "matanda": "elderly", "kapitbahay": "neighbor",
+    "kalye": "street", "daan": "road", "tindahan": "store", "palengke": "market",
+    "selpon": "cellphone", "pitaka": "wallet", "motor": "motorcycle",
+    # Time
+    "kagabi": "last night", "kahapon": "yesterday", "kanina": "earlier", "ngayon": "now",
+    "gabi": "night", "umaga": "morning", "tanghali": "noon", "hapon": "afternoon",
+    # Requests
+    "tulong": "help", "tulungan": "help", "saklolo": "help", "pulis": "police",
+}
+
+# Tagalog words that are also common English words, so they don't count
+# towards detecting Tagalog
+ENGLISH_HOMOGRAPHS = frozenset(["at", "may", "pag", "na", "pa", "ho", "ba", "din", "away", "motor"])
+
+# Word tokens: runs of letters (including ñ and accented letters), optionally hyphenated
+_TOKEN_RE = re.compile(r"[^\W\d_]+(?:-[^\W\d_]+)*")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Apply Unicode NFKC normalization and collapse whitespace"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+def tokenize(text):
+    """Split text into lower-case word tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+# Single words that identify Tagalog (lexicon phrases are matched word by word)
+_TAGALOG_TOKENS = (
+    TAGALOG_FUNCTION_WORDS | frozenset(word for entry in TAGALOG_LEXICON for word in entry.split())
+) - ENGLISH_HOMOGRAPHS
+
+
+def tagalog_ratio(text):
+    """Get the fraction of the words in text that are Tagalog"""
+    tokens = tokenize(text)
+    if not tokens:
+        return 0.0
+    return sum(token in _TAGALOG_TOKENS for token in tokens) / len(tokens)
+
+
+def detect_language(text):
+    """
+    Detect whether text is Tagalog (including Taglish) or English
+    
+    Returns:
+        str: "tagalog" or "english"
+    """
+    return "tagalog" if tagalog_ratio(text) >= TAGALOG_MIN_RATIO else "english"
+
+
+class LexiconTranslator:
+    """
+    Replace whole words and phrases of a lexicon in one pass over a text
+    
+    All entries are compiled into one case-insensitive alternation, longest
+    first, so phrases win over the words they contain.
+    """
+    
+    def __init__(self, lexicon):
+        self.lexicon = {source.lower(): target for source, target in lexicon.items()}
+        alternatives = sorted(self.lexicon, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"(?<![\w-])(?:" + "|".join(re.escape(source) for source in alternatives) + r")(?![\w-])",
+            re.IGNORECASE,
+        )
+    
+    def translate(self, text):
+        """Translate every lexicon entry in text, keeping everything else as is"""
+        return self._pattern.sub(lambda match: self.lexicon[match.group(0).lower()], text)
+
+
+_translator = LexiconTranslator(TAGALOG_LEXICON)
+
+
+def translate_report(title, description):
+    """
+    Normalize a report's title and description and translate Tagalog words to English
+    
+    Returns:
+        tuple: (translated_text, is_tagalog)
+    """
+    full_text = normalize_text(f"{title or ''} {description or ''}")
+    is_tagalog = detect_language(full_text) == "tagalog"
+    return (_translator.translate(full_text) if is_tagalog else full_text), is_tagalog
@@ -183,6 +183,18 @@ class HybridApiClient {
     });
   }
 
+  // params: radius_km, hours, min_similarity, limit
+  async getReportDuplicates(id, params = {}) {
+    const queryString = new URLSearchParams(params).toString();
+    return await this.request(`/reports/${id}/duplicates/${queryString ? `?${queryString}` : ''}`);
+  }
+
+  // params: k, min_similarity, scope_barangay
+  async getSimilarReports(id, params = {}) {
+    const queryString = new URLSearchParams(params).toString();
+    return await this.request(`/reports/${id}/similar/${queryString ? `?${queryString}` : ''}`);
+  }
+
   // Categories methods
   async getCategories() {
     return await this.request('/categories/');
@@ -205,16 +217,43 @@ class HybridApiClient {
     return await this.request('/ml/metrics/');
   }
 
-  async processReportML(reportData) {
-    return await this.request('/ml/process-report/', {
+  // options.includeFeatures: 'float32' or 'float16' to receive the encoded
+  // feature vector (see decodeFeatureVector); options.includeProbabilities:
+  // true to receive all_probabilities and top_5_predictions
+  async processReportML(reportData, options = {}) {
+    const params = {};
+    if (options.includeFeatures) {
+      params.include_features = options.includeFeatures === true ? 'float32' : options.includeFeatures;
+    }
+    if (options.includeProbabilities) {
+      params.include_probabilities = 'true';
+    }
+    const queryString = new URLSearchParams(params).toString();
+    return await this.request(`/ml/process-report/${queryString ? `?${queryString}` : ''}`, {
       method: 'POST',
       body: JSON.stringify(reportData),
     });
   }
 
-  async batchProcessReports() {
+  async batchProcessReports(options = {}) {
     return await this.request('/ml/batch-process/', {
       method: 'POST',
+      body: JSON.stringify(options),
+    });
+  }
+
+  async getBatchJobStatus(jobId) {
+    return await this.request(`/ml/batch-process/${jobId}/`);
+  }
+
+  async getModelReloadStatus() {
+    return await this.request('/ml/model/reload/');
+  }
+
+  async reloadModel(options = {}) {
+    return await this.request('/ml/model/reload/', {
+      method: 'POST',
+      body: JSON.stringify(options),
     });
   }
 
@@ -224,6 +263,44 @@ class HybridApiClient {
   }
 }
 
+// Decode a base64 feature vector from processReportML into a Float32Array
+export function decodeFeatureVector(encoded) {
+  const binary = atob(encoded.data);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  const view = new DataView(bytes.buffer);
+
+  if (encoded.dtype === 'float32') {
+    const values = new Float32Array(bytes.length / 4);
+    for (let i = 0; i < values.length; i++) {
+      values[i] = view.getFloat32(i * 4, true);
+    }
+    return values;
+  }
+
+  if (encoded.dtype === 'float16') {
+    const values = new Float32Array(bytes.length / 2);
+    for (let i = 0; i < values.length; i++) {
+      const half = view.getUint16(i * 2, true);
+      const sign = half & 0x8000 ? -1 : 1;
+      const exponent = (half >> 10) & 0x1f;
+      const fraction = half & 0x3ff;
+      if (exponent === 0) {
+        values[i] = sign * 2 ** -14 * (fraction / 1024);
+      } else if (exponent === 0x1f) {
+        values[i] = fraction ? NaN : sign * Infinity;
+      } else {
+        values[i] = sign * 2 ** (exponent - 15) * (1 + fraction / 1024);
+      }
+    }
+    return values;
+  }
+
+  throw new Error(`Unsupported feature vector dtype: ${encoded.dtype}`);
+}
+
 // Create a singleton instance
 export const apiClient = new HybridApiClient();
 export default apiClient;